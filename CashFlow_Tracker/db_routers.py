@@ -0,0 +1,152 @@
+"""
+Database routing: user-keyed shards and the read replica.
+
+ShardRouter keeps each user's categories and transactions on their shard
+(see CashFlow_Tracker/sharding.py) and leaves everything on the primary to
+ReplicaRouter.
+
+Reads only go to the replica inside ``read_from_replica()`` or a view wrapped
+with ``@use_replica``; everything else, and every write, stays on the primary.
+A request that changes data gets a short-lived cookie so the next requests of
+that browser read from the primary until the replica has caught up.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+from .sharding import SHARDED_APPS, get_current_shard, shard_for_user
+
+PRIMARY_STICKY_COOKIE = 'cashflow_primary'
+
+_read_database = ContextVar('cashflow_read_database', default=None)
+
+
+def get_replica_alias(request=None):
+    """The replica alias to read from, or None when unset or the request must see its own writes"""
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    if not alias:
+        return None
+    if request is not None and request.COOKIES.get(PRIMARY_STICKY_COOKIE):
+        return None
+    return alias
+
+
+@contextmanager
+def read_from_replica(request=None):
+    """Route ORM reads in this block to the replica"""
+    alias = get_replica_alias(request)
+    if alias is None:
+        yield None
+        return
+    token = _read_database.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_database.reset(token)
+
+
+def use_replica(view_func):
+    """Serve a read-only view from the replica; place it below @login_required so auth reads hit the primary"""
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            with read_from_replica(request):
+                return await view_func(request, *args, **kwargs)
+    else:
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            with read_from_replica(request):
+                return view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+
+class ShardRouter:
+    """Route categories and transactions to the shard of the user they belong to"""
+
+    def _user_shard(self, model, hints):
+        if model._meta.app_label not in SHARDED_APPS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            if isinstance(instance, get_user_model()):
+                user_id = instance.pk
+            else:
+                user_id = getattr(instance, 'user_id', None)
+            if user_id is not None:
+                return shard_for_user(user_id)
+        return get_current_shard()
+
+    def db_for_read(self, model, **hints):
+        alias = self._user_shard(model, hints)
+        if alias is None:
+            instance = hints.get('instance')
+            # Related users and other primary rows are read from the primary, not a shard's copy
+            if instance is not None and instance._state.db in settings.SHARD_DATABASES:
+                return DEFAULT_DB_ALIAS if instance._state.db != DEFAULT_DB_ALIAS else None
+            return None
+        # Data on the primary may still be served by the read replica
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_write(self, model, **hints):
+        return self._user_shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        User = get_user_model()
+        # Every shard holds a copy of the rows of the users assigned to it
+        if isinstance(obj1, User) or isinstance(obj2, User):
+            return True
+        if obj1._meta.app_label in SHARDED_APPS and obj2._meta.app_label in SHARDED_APPS:
+            return obj1._state.db == obj2._state.db
+        return None
+
+
+class ReplicaRouter:
+    """Send reads to the replica only when a view or block asked for it"""
+
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        # Never fall back to the alias an instance was read from, which may be the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primary and replica hold the same rows
+        databases = {DEFAULT_DB_ALIAS, getattr(settings, 'REPLICA_DATABASE', None)}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives the schema through replication
+        if db == getattr(settings, 'REPLICA_DATABASE', None):
+            return False
+        return None
+
+
+class PrimaryStickinessMiddleware:
+    """Pin a browser to the primary for a few seconds after it changed data"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REPLICA_DATABASE', None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and response.status_code < 400:
+            response.set_cookie(
+                PRIMARY_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
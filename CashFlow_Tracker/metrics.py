@@ -0,0 +1,360 @@
+"""
+Per-request instrumentation for CashFlow Tracker.
+
+Records wall time, database queries, database time, cache hits/misses and
+response size for every view, aggregates them into in-process histograms
+and exports them in the Prometheus text format together with the database
+connection pool statistics. Each worker process keeps
+its own registry, so scrape every worker (or sum them) to get totals.
+"""
+
+import hmac
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import PyMemcacheCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+# psycopg_pool statistics exported as cashflow_db_pool_<name>; counters are cumulative per process
+POOL_STATS = {
+    'pool_min': ('gauge', 'Configured minimum pool size.'),
+    'pool_max': ('gauge', 'Configured maximum pool size.'),
+    'pool_size': ('gauge', 'Connections currently managed by the pool.'),
+    'pool_available': ('gauge', 'Idle connections ready to be handed out.'),
+    'requests_waiting': ('gauge', 'Requests currently waiting for a connection.'),
+    'requests_num': ('counter', 'Connection requests made to the pool.'),
+    'requests_queued': ('counter', 'Connection requests that had to wait.'),
+    'requests_wait_ms': ('counter', 'Total time spent waiting for a connection, in milliseconds.'),
+    'requests_errors': ('counter', 'Connection requests that failed or timed out.'),
+    'connections_num': ('counter', 'Connection attempts made to the server.'),
+    'connections_ms': ('counter', 'Total time spent connecting to the server, in milliseconds.'),
+    'connections_errors': ('counter', 'Failed connection attempts.'),
+    'connections_lost': ('counter', 'Connections found broken by the pool.'),
+    'returns_bad': ('counter', 'Connections returned in a bad state.'),
+}
+
+_current_request = ContextVar('cashflow_request_metrics', default=None)
+_counting_lookups = ContextVar('cashflow_counting_cache_lookups', default=True)
+# Execute wrappers of the current request, re-installed on worker threads' connections
+_execute_wrappers = ContextVar('cashflow_execute_wrappers', default=())
+_MISSING = object()
+
+
+class Histogram:
+    """Prometheus-style histogram with fixed upper bounds"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for upper_bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield upper_bound, total
+
+
+class MetricsRegistry:
+    """Thread-safe in-process store of per-view histograms and counters"""
+
+    HISTOGRAMS = {
+        'cashflow_request_duration_seconds': ('Wall time spent handling the request.', DURATION_BUCKETS),
+        'cashflow_request_db_queries': ('Database queries executed per request.', QUERY_COUNT_BUCKETS),
+        'cashflow_request_db_duration_seconds': ('Time spent in database queries per request.', DURATION_BUCKETS),
+        'cashflow_response_size_bytes': ('Size of the response body.', SIZE_BUCKETS),
+    }
+    COUNTERS = {
+        'cashflow_cache_hits_total': 'Cache lookups that found a value.',
+        'cashflow_cache_misses_total': 'Cache lookups that found nothing.',
+        'cashflow_query_budget_exceeded_total': 'Requests that ran more queries than the view budget.',
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {name: {} for name in self.HISTOGRAMS}
+            self._counters = {name: {} for name in self.COUNTERS}
+
+    def observe(self, name, view, value):
+        with self._lock:
+            histogram = self._histograms[name].get(view)
+            if histogram is None:
+                histogram = self._histograms[name][view] = Histogram(self.HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+    def increment(self, name, view, amount=1):
+        if not amount:
+            return
+        with self._lock:
+            self._counters[name][view] = self._counters[name].get(view, 0) + amount
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, (help_text, _buckets) in self.HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for view, histogram in sorted(self._histograms[name].items()):
+                    label = _escape_label(view)
+                    for upper_bound, total in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{view="{label}",le="{upper_bound}"}} {total}')
+                    lines.append(f'{name}_sum{{view="{label}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{view="{label}"}} {histogram.count}')
+            for name, help_text in self.COUNTERS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for view, value in sorted(self._counters[name].items()):
+                    lines.append(f'{name}{{view="{_escape_label(view)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestMetrics:
+    """Counters collected while a single request is being handled"""
+
+    __slots__ = ('queries', 'db_time', 'cache_hits', 'cache_misses', '_lock')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed as a database execute wrapper on every connection, including async views' worker threads
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.queries += 1
+                self.db_time += time.perf_counter() - start
+
+
+@contextmanager
+def request_execute_wrapper(wrapper):
+    """Install ``wrapper`` on this thread's connections and on those of the request's worker threads"""
+    token = _execute_wrappers.set((*_execute_wrappers.get(), wrapper))
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(wrapper))
+            yield
+    finally:
+        _execute_wrappers.reset(token)
+
+
+@contextmanager
+def inherited_execute_wrappers():
+    """Re-install the current request's execute wrappers on a worker thread's own connections"""
+    with ExitStack() as stack:
+        for wrapper in _execute_wrappers.get():
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+def record_cache_lookup(hit, count=1):
+    """Count ``count`` cache lookups against the request currently being handled"""
+    request_metrics = _current_request.get()
+    if request_metrics is None or not _counting_lookups.get():
+        return
+    with request_metrics._lock:
+        if hit:
+            request_metrics.cache_hits += count
+        else:
+            request_metrics.cache_misses += count
+
+
+@contextmanager
+def _uncounted():
+    """Backend methods built on get() (e.g. BaseCache.get_many) must not count a lookup twice"""
+    token = _counting_lookups.set(False)
+    try:
+        yield
+    finally:
+        _counting_lookups.reset(token)
+
+
+class InstrumentedCacheMixin:
+    """Reports the hits and misses of every cache read to the request metrics"""
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        record_cache_lookup(value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        with _uncounted():
+            found = super().get_many(keys, version)
+        record_cache_lookup(True, len(found))
+        record_cache_lookup(False, len(keys) - len(found))
+        return found
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        with _uncounted():
+            value = super().get(key, _MISSING, version)
+            if value is _MISSING:
+                value = super().get_or_set(key, default, timeout, version)
+                hit = False
+            else:
+                hit = True
+        record_cache_lookup(hit)
+        return value
+
+    def has_key(self, key, version=None):
+        with _uncounted():
+            found = super().has_key(key, version)
+        record_cache_lookup(found)
+        return found
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    """LocMemCache that reports hits and misses to the request metrics"""
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    """RedisCache that reports hits and misses to the request metrics"""
+
+
+class InstrumentedPyMemcacheCache(InstrumentedCacheMixin, PyMemcacheCache):
+    """PyMemcacheCache that reports hits and misses to the request metrics"""
+
+
+def get_query_budget(view_name):
+    budgets = getattr(settings, 'METRICS_QUERY_BUDGETS', {})
+    return budgets.get(view_name, getattr(settings, 'METRICS_DEFAULT_QUERY_BUDGET', None))
+
+
+class RequestMetricsMiddleware:
+    """Record per-view timings, query counts and cache usage for every request"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_metrics = RequestMetrics()
+        token = _current_request.set(request_metrics)
+        start = time.perf_counter()
+        try:
+            with request_execute_wrapper(request_metrics):
+                response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        duration = time.perf_counter() - start
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = resolver_match.view_name if resolver_match else UNRESOLVED_VIEW
+
+        registry.observe('cashflow_request_duration_seconds', view_name, duration)
+        registry.observe('cashflow_request_db_queries', view_name, request_metrics.queries)
+        registry.observe('cashflow_request_db_duration_seconds', view_name, request_metrics.db_time)
+        registry.increment('cashflow_cache_hits_total', view_name, request_metrics.cache_hits)
+        registry.increment('cashflow_cache_misses_total', view_name, request_metrics.cache_misses)
+        if not response.streaming:
+            registry.observe('cashflow_response_size_bytes', view_name, len(response.content))
+
+        budget = get_query_budget(view_name)
+        if budget is not None and request_metrics.queries > budget:
+            registry.increment('cashflow_query_budget_exceeded_total', view_name)
+            logger.warning(
+                'View %s ran %d queries (budget %d) in %.1f ms for %s',
+                view_name, request_metrics.queries, budget, duration * 1000, request.path,
+            )
+
+        return response
+
+
+def get_pool_stats():
+    """psycopg_pool statistics for every database alias that has a pool configured"""
+    stats = {}
+    for alias in connections:
+        if not connections.settings[alias].get('OPTIONS', {}).get('pool'):
+            continue
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+def render_pool_stats():
+    pool_stats = get_pool_stats()
+    if not pool_stats:
+        return ''
+    lines = []
+    for key, (metric_type, help_text) in POOL_STATS.items():
+        name = f'cashflow_db_pool_{key}'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for alias, stats in sorted(pool_stats.items()):
+            # psycopg_pool leaves counters out until they are first incremented
+            lines.append(f'{name}{{database="{_escape_label(alias)}"}} {stats.get(key, 0)}')
+    return '\n'.join(lines) + '\n'
+
+
+def render_metrics():
+    return registry.render() + render_pool_stats()
+
+
+def _has_metrics_token(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return False
+    auth_header = request.headers.get('Authorization', '')
+    return hmac.compare_digest(auth_header, f'Bearer {token}')
+
+
+@staff_member_required
+def _staff_metrics_view(request):
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, for staff users or scrapers holding METRICS_TOKEN"""
+    if _has_metrics_token(request):
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    return _staff_metrics_view(request)
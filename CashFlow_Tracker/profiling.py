@@ -0,0 +1,196 @@
+"""
+On-demand request profiling for staff users.
+
+Send ``X-Profile: 1`` or add ``?_profile=1`` to any request made as a staff
+user and it runs under cProfile while every SQL query is captured with its
+duration and the project code that issued it. The report is written to
+PROFILING_DIR and listed at /profiles/. Where the filesystem is read-only
+(serverless deployments), set PROFILING_INLINE or pass ``_profile=inline``
+and the report is returned in place of the normal response.
+"""
+
+import io
+import logging
+import re
+import time
+import traceback
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+
+from .metrics import request_execute_wrapper
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = '_profile'
+REPORT_NAME_RE = re.compile(r'^[\w-]+\.(txt|prof)$')
+TOP_FUNCTIONS = 40
+STACK_DEPTH = 3
+
+
+class QueryCapture:
+    """Database execute wrapper that records SQL, timings and the calling project code"""
+
+    def __init__(self):
+        self.queries = []
+        self._project_root = str(Path(settings.BASE_DIR).resolve())
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries.append((duration, sql, self._origin()))
+
+    def _origin(self):
+        frames = [
+            frame for frame in traceback.extract_stack()[:-2]
+            if frame.filename.startswith(self._project_root)
+            and 'site-packages' not in frame.filename
+            and not frame.filename.endswith('profiling.py')
+        ]
+        return [f'{Path(frame.filename).relative_to(self._project_root)}:{frame.lineno} in {frame.name}'
+                for frame in frames[-STACK_DEPTH:]]
+
+
+def profile_requested(request):
+    if not getattr(settings, 'PROFILING_ENABLED', False):
+        return None
+    flag = request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+    if not flag or flag == '0':
+        return None
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_staff:
+        return None
+    return flag
+
+
+def build_report(request, response, profiler, capture, duration):
+    import pstats
+
+    resolver_match = getattr(request, 'resolver_match', None)
+    sql_time = sum(query_duration for query_duration, _sql, _origin in capture.queries)
+    out = io.StringIO()
+    out.write(f'{request.method} {request.get_full_path()}\n')
+    out.write(f'View: {resolver_match.view_name if resolver_match else "-"}\n')
+    out.write(f'User: {request.user.username} (id {request.user.id})\n')
+    out.write(f'Time: {timezone.now().isoformat()}\n')
+    out.write(f'Status: {response.status_code}\n')
+    out.write(f'Wall time: {duration * 1000:.1f} ms\n')
+    out.write(f'SQL: {len(capture.queries)} queries, {sql_time * 1000:.1f} ms\n')
+
+    repeated = Counter(sql for _duration, sql, _origin in capture.queries)
+    duplicates = [(count, sql) for sql, count in repeated.most_common() if count > 1]
+    if duplicates:
+        out.write('\n== Repeated queries ==\n')
+        for count, sql in duplicates:
+            out.write(f'{count:>4}x {sql}\n')
+
+    out.write('\n== Queries (slowest first) ==\n')
+    for query_duration, sql, origin in sorted(capture.queries, key=lambda query: query[0], reverse=True):
+        out.write(f'{query_duration * 1000:8.2f} ms  {sql}\n')
+        for frame in origin:
+            out.write(f'             at {frame}\n')
+
+    out.write(f'\n== Top {TOP_FUNCTIONS} functions by cumulative time ==\n')
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    return out.getvalue()
+
+
+def get_profiling_dir():
+    return Path(getattr(settings, 'PROFILING_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+def save_report(request, report, profiler):
+    """Write the text report and raw stats; returns the report file name"""
+    resolver_match = getattr(request, 'resolver_match', None)
+    view_name = re.sub(r'[^\w-]', '-', resolver_match.view_name if resolver_match else 'unresolved')
+    stem = f"{timezone.now().strftime('%Y%m%d-%H%M%S')}-{view_name}-{uuid.uuid4().hex[:8]}"
+    directory = get_profiling_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f'{stem}.txt').write_text(report, encoding='utf-8')
+    profiler.dump_stats(directory / f'{stem}.prof')
+    return f'{stem}.txt'
+
+
+class ProfilingMiddleware:
+    """Profile requests from staff users that ask for it"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        flag = profile_requested(request)
+        if flag is None:
+            return self.get_response(request)
+
+        # Imported here so regular requests and cold starts never pay for the profiler
+        import cProfile
+
+        capture = QueryCapture()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with request_execute_wrapper(capture):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        report = build_report(request, response, profiler, capture, duration)
+        if flag == 'inline' or getattr(settings, 'PROFILING_INLINE', False):
+            return HttpResponse(report, content_type='text/plain; charset=utf-8')
+
+        try:
+            name = save_report(request, report, profiler)
+        except OSError:
+            logger.exception('Could not store profile report, returning it inline')
+            return HttpResponse(report, content_type='text/plain; charset=utf-8')
+        response['X-Profile-Report'] = name
+        return response
+
+
+@staff_member_required
+def profile_list(request):
+    """List stored profile reports, newest first"""
+    directory = get_profiling_dir()
+    reports = []
+    if directory.is_dir():
+        for path in sorted(directory.glob('*.txt'), reverse=True):
+            with path.open(encoding='utf-8') as report:
+                summary = [report.readline().strip() for _ in range(7)]
+            reports.append({
+                'name': path.name,
+                'stats_name': path.with_suffix('.prof').name,
+                'request': summary[0],
+                'wall_time': summary[5].partition(': ')[2],
+                'sql': summary[6].partition(': ')[2],
+                'created_at': datetime.fromtimestamp(path.stat().st_mtime, tz=timezone.get_current_timezone()),
+            })
+    return render(request, 'profiling/profile_list.html', {'reports': reports})
+
+
+@staff_member_required
+def profile_detail(request, name):
+    """Show a stored text report, or download the raw .prof stats"""
+    if not REPORT_NAME_RE.match(name):
+        raise Http404
+    path = get_profiling_dir() / name
+    if not path.is_file():
+        raise Http404
+    if path.suffix == '.prof':
+        return FileResponse(path.open('rb'), as_attachment=True, filename=name)
+    return HttpResponse(path.read_text(encoding='utf-8'), content_type='text/plain; charset=utf-8')
@@ -14,10 +14,16 @@ import os
 from pathlib import Path
 
 from django.core.exceptions import ImproperlyConfigured
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# "production" drops dev-only apps and trims the cold start; Vercel sets VERCEL=1
+DJANGO_PROFILE = os.environ.get('DJANGO_PROFILE', 'production' if os.environ.get('VERCEL') else 'development')
+PRODUCTION = DJANGO_PROFILE == 'production'
+
+# Load environment variables from .env file (production reads the real environment only)
+if not PRODUCTION:
+    from dotenv import load_dotenv
+
+    load_dotenv()
 
 
 def get_env_variable(var_name, default=None):
@@ -56,20 +62,29 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'django_extensions',
     'accounts',
     'categories',
     'transactions',
+    'jobs',
 ]
 
+if not PRODUCTION:
+    INSTALLED_APPS.insert(INSTALLED_APPS.index('accounts'), 'django_extensions')
+
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
 MIDDLEWARE = [
+    'CashFlow_Tracker.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'CashFlow_Tracker.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'CashFlow_Tracker.db_routers.PrimaryStickinessMiddleware',
+    'CashFlow_Tracker.sharding.ShardMiddleware',
+    'CashFlow_Tracker.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,8 +106,23 @@ TEMPLATES = [
     },
 ]
 
+if PRODUCTION:
+    # Parse each template once per process; nothing edits templates on a deployed instance
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'CashFlow_Tracker.wsgi.application'
 
+# Serve the async dashboard and chart views (use with CashFlow_Tracker.asgi)
+ASYNC_VIEWS = get_env_variable('ASYNC_VIEWS', 'false').lower() == 'true'
+# Queries those views may run at once per process; keep it below DB_POOL_MAX_SIZE (and the PgBouncer pool)
+ASYNC_QUERY_CONCURRENCY = int(get_env_variable('ASYNC_QUERY_CONCURRENCY', '3'))
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -104,21 +134,91 @@ WSGI_APPLICATION = 'CashFlow_Tracker.wsgi.application'
 #    }
 # }
 
+DB_ENGINE = get_env_variable('DB_ENGINE')
+
+# psycopg 3 connection pool kept per process (one per serverless instance)
+DB_POOL = get_env_variable('DB_POOL', 'false').lower() == 'true'
+# Behind PgBouncer in transaction mode: no server-side cursors or prepared statements
+DB_PGBOUNCER = get_env_variable('DB_PGBOUNCER', 'false').lower() == 'true'
+
+DATABASE_OPTIONS = {
+    'sslmode': 'require',
+} if not DEBUG else {}
+
+if DB_POOL:
+    if 'postgresql' not in DB_ENGINE:
+        raise ImproperlyConfigured('DB_POOL requires the PostgreSQL backend with psycopg 3')
+    DATABASE_OPTIONS['pool'] = {
+        'min_size': int(get_env_variable('DB_POOL_MIN_SIZE', '1')),
+        'max_size': int(get_env_variable('DB_POOL_MAX_SIZE', '4')),
+        'timeout': float(get_env_variable('DB_POOL_TIMEOUT', '10')),
+        # Drop idle connections before the database or a frozen instance does
+        'max_idle': float(get_env_variable('DB_POOL_MAX_IDLE', '120')),
+        'max_lifetime': float(get_env_variable('DB_POOL_MAX_LIFETIME', '1800')),
+    }
+
+if DB_PGBOUNCER:
+    DATABASE_OPTIONS['prepare_threshold'] = None
+
 DATABASES = {
     'default': {
-        'ENGINE': get_env_variable('DB_ENGINE'),
+        'ENGINE': DB_ENGINE,
         'NAME': get_env_variable('DB_NAME'),
         'USER': get_env_variable('DB_USER'),
         'PASSWORD': get_env_variable('DB_PASSWORD'),
         'HOST': get_env_variable('DB_HOST'),
         'PORT': get_env_variable('DB_PORT', '5432'),
-        'OPTIONS': {
-            'sslmode': 'require',
-        } if not DEBUG else {},
-        'CONN_MAX_AGE': int(get_env_variable('DB_CONN_MAX_AGE', '60')),
+        'OPTIONS': DATABASE_OPTIONS,
+        # The pool owns connection reuse; Django refuses persistent connections alongside it
+        'CONN_MAX_AGE': 0 if DB_POOL else int(get_env_variable('DB_CONN_MAX_AGE', '60')),
+        # Pooled connections are checked on checkout; they may have died while the instance was frozen
+        'CONN_HEALTH_CHECKS': DB_POOL,
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
     }
 }
 
+# Optional read replica for the reporting views (dashboard, charts, lists)
+REPLICA_DATABASE = None
+if get_env_variable('DB_REPLICA_HOST', '') or get_env_variable('DB_REPLICA_NAME', ''):
+    REPLICA_DATABASE = 'replica'
+    DATABASES[REPLICA_DATABASE] = {
+        **DATABASES['default'],
+        'NAME': get_env_variable('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': get_env_variable('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': get_env_variable('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': get_env_variable('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': get_env_variable('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'OPTIONS': dict(DATABASE_OPTIONS),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# User-keyed shards for categories and transactions: DB_SHARDS=shard_1,shard_2 reads
+# DB_SHARD_1_NAME/HOST/PORT/USER/PASSWORD (falling back to the primary's values)
+SHARD_DATABASES = ['default']
+for shard_alias in filter(None, get_env_variable('DB_SHARDS', '').split(',')):
+    shard_prefix = f'DB_{shard_alias.upper()}_'
+    DATABASES[shard_alias] = {
+        **DATABASES['default'],
+        'NAME': get_env_variable(f'{shard_prefix}NAME', DATABASES['default']['NAME']),
+        'USER': get_env_variable(f'{shard_prefix}USER', DATABASES['default']['USER']),
+        'PASSWORD': get_env_variable(f'{shard_prefix}PASSWORD', DATABASES['default']['PASSWORD']),
+        'HOST': get_env_variable(f'{shard_prefix}HOST', DATABASES['default']['HOST']),
+        'PORT': get_env_variable(f'{shard_prefix}PORT', DATABASES['default']['PORT']),
+        'OPTIONS': dict(DATABASE_OPTIONS),
+    }
+    SHARD_DATABASES.append(shard_alias)
+
+# Shards new users are spread over (by user id)
+SHARD_NEW_USERS = list(filter(None, get_env_variable('DB_SHARD_NEW_USERS', '').split(','))) or SHARD_DATABASES
+
+DATABASE_ROUTERS = [
+    'CashFlow_Tracker.db_routers.ShardRouter',
+    'CashFlow_Tracker.db_routers.ReplicaRouter',
+]
+
+# Seconds a browser keeps reading from the primary after a write; keep above the replica lag
+REPLICA_STICKY_SECONDS = int(get_env_variable('DB_REPLICA_STICKY_SECONDS', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -158,6 +258,22 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [Path.joinpath(BASE_DIR, 'statics')]
 STATIC_ROOT = Path.joinpath(BASE_DIR, 'staticfiles_build', 'static')
 
+# Vendored libraries live in statics/vendor (python manage.py vendor_static), page styles and
+# scripts in statics/css and statics/js. Production minifies the latter and serves content-hashed
+# copies with gzip/Brotli siblings written by collectstatic; WhiteNoise marks the hashed files
+# immutable and caches them for a year.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'CashFlow_Tracker.storage.MinifiedManifestStaticFilesStorage' if PRODUCTION
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -167,7 +283,36 @@ LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
 
+# Cache shared by every process: redis://host:6379/0 (needs redis) or memcached://host:11211 (needs pymemcache).
+# Without it each process keeps its own LocMemCache, which another process cannot invalidate.
+CACHE_URL = get_env_variable('CACHE_URL', '')
+SHARED_CACHE_BACKENDS = {
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+SHARED_CACHE = bool(CACHE_URL)
+if SHARED_CACHE and CACHE_URL.partition('://')[0] not in SHARED_CACHE_BACKENDS:
+    raise ImproperlyConfigured(f'CACHE_URL must start with one of {", ".join(SHARED_CACHE_BACKENDS)}://')
+
 SESSION_COOKIE_AGE = int(get_env_variable('SESSION_COOKIE_AGE', '1209600'))
+# With a shared cache, production reads sessions from it and writes them through to the database
+SESSION_ENGINE = get_env_variable(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if PRODUCTION and SHARED_CACHE
+    else 'django.contrib.sessions.backends.db',
+)
+if SESSION_ENGINE.endswith(('.cache', '.cached_db')) and not SHARED_CACHE:
+    # A logout or password change would only clear the session in the process that handled it
+    raise ImproperlyConfigured(f'SESSION_ENGINE={SESSION_ENGINE} needs a shared cache (set CACHE_URL)')
+
+# With a shared cache the signed-in user is served from it (see accounts/backends.py). Sessions
+# created before the switch name ModelBackend, so it stays listed until they expire (until then
+# a failed login is checked by both).
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
 
 # Security settings
 if not DEBUG:
@@ -182,16 +327,93 @@ if not DEBUG:
     SECURE_HSTS_PRELOAD = True
 
 # Cache configuration
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'cashflow-tracker-cache',
-        'OPTIONS': {
-            'MAX_ENTRIES': int(get_env_variable('CACHE_MAX_ENTRIES', '1000')),
-            'CULL_FREQUENCY': int(get_env_variable('CACHE_CULL_FREQUENCY', '3')),
+if SHARED_CACHE:
+    scheme, _sep, address = CACHE_URL.partition('://')
+    CACHES = {
+        'default': {
+            'BACKEND': SHARED_CACHE_BACKENDS[scheme],
+            # redis-py takes the whole URL, pymemcache a host:port
+            'LOCATION': CACHE_URL if scheme.startswith('redis') else address,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'cashflow-tracker-cache',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(get_env_variable('CACHE_MAX_ENTRIES', '1000')),
+                'CULL_FREQUENCY': int(get_env_variable('CACHE_CULL_FREQUENCY', '3')),
+            }
         }
     }
-}
 
 # Cache timeout settings
 CACHE_TTL = int(get_env_variable('CACHE_TTL', '300'))  # 5 minutes default
+AUTH_USER_CACHE_TTL = int(get_env_variable('AUTH_USER_CACHE_TTL', '300'))
+
+# Background jobs (python manage.py run_worker)
+JOB_LOCK_TIMEOUT = int(get_env_variable('JOB_LOCK_TIMEOUT', '600'))  # seconds before a running job is requeued
+JOB_RETRY_DELAY = int(get_env_variable('JOB_RETRY_DELAY', '30'))  # seconds, doubled on every retry
+# Queue a warm_dashboard_cache job after each transaction write. Off by default: turn it on only where a
+# run_worker process is deployed, or the jobs pile up unprocessed. Needs a shared cache as well
+WARM_DASHBOARD_AFTER_WRITE = SHARED_CACHE and get_env_variable('WARM_DASHBOARD_AFTER_WRITE', 'false').lower() == 'true'
+
+# Expenses more than ANOMALY_STDDEV_THRESHOLD standard deviations above their category's
+# mean are flagged, once the category has ANOMALY_MIN_COUNT transactions
+ANOMALY_STDDEV_THRESHOLD = float(get_env_variable('ANOMALY_STDDEV_THRESHOLD', '3'))
+ANOMALY_MIN_COUNT = int(get_env_variable('ANOMALY_MIN_COUNT', '10'))
+
+# gzip/Brotli response compression (see CashFlow_Tracker/compression.py)
+COMPRESSION_ENABLED = get_env_variable('COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_MIN_SIZE = int(get_env_variable('COMPRESSION_MIN_SIZE', '1024'))  # bytes
+# Pages that reflect submitted input next to a CSRF token are never compressed (BREACH)
+COMPRESSION_EXCLUDED_URL_NAMES = ['login', 'register']
+
+# Request metrics (exported in Prometheus format at /metrics/)
+METRICS_ENABLED = get_env_variable('METRICS_ENABLED', 'false').lower() == 'true'
+METRICS_TOKEN = get_env_variable('METRICS_TOKEN', '')
+METRICS_DEFAULT_QUERY_BUDGET = int(get_env_variable('METRICS_DEFAULT_QUERY_BUDGET', '20'))
+
+# Maximum queries per request before a warning is logged, by URL name
+METRICS_QUERY_BUDGETS = {
+    # accounts
+    'login': 5,
+    'logout': 5,
+    'register': 6,
+    'dashboard': 15,
+    'get_cashflow_data': 3,
+    'get_cashflow_forecast': 6,
+    # transactions
+    'transaction_list': 8,
+    'transaction_create': 8,
+    'transaction_edit': 8,
+    'transaction_delete': 6,
+    'get_categories_by_type': 3,
+    'transaction_form_bootstrap': 4,
+    'transaction_analytics': 4,
+    'transaction_report': 4,
+    'transaction_report_data': 4,
+    # categories
+    'category_list': 6,
+    'category_create': 6,
+    'category_edit': 6,
+    'category_delete': 6,
+    'category_api_list': 3,
+    'category_create_ajax': 5,
+    # jobs
+    'job_status': 3,
+}
+
+if METRICS_ENABLED:
+    CACHES['default']['BACKEND'] = {
+        'django.core.cache.backends.locmem.LocMemCache': 'CashFlow_Tracker.metrics.InstrumentedLocMemCache',
+        'django.core.cache.backends.redis.RedisCache': 'CashFlow_Tracker.metrics.InstrumentedRedisCache',
+        'django.core.cache.backends.memcached.PyMemcacheCache': 'CashFlow_Tracker.metrics.InstrumentedPyMemcacheCache',
+    }[CACHES['default']['BACKEND']]
+
+# On-demand profiling for staff users (X-Profile header or ?_profile=1)
+PROFILING_ENABLED = get_env_variable('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILING_DIR = Path(get_env_variable('PROFILING_DIR', str(BASE_DIR / 'profiles')))
+# Vercel's filesystem is read-only, so reports are returned in the response there
+PROFILING_INLINE = get_env_variable('PROFILING_INLINE', 'true' if os.environ.get('VERCEL') else 'false').lower() == 'true'
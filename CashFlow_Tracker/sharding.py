@@ -0,0 +1,191 @@
+"""
+User-keyed sharding of transactions and categories.
+
+Users, sessions and the ``UserShard`` directory live on the primary
+(``default``). Each user's categories and transactions live on the database
+alias the directory assigns; users without an entry stay on ``default``. Every
+shard carries the full schema and a copy of each assigned user's row so the
+foreign keys to the user hold.
+
+``ShardMiddleware`` looks the signed-in user up once per request and pins
+unhinted queries to their shard; ``shard_for_user()`` and ``use_shard()``
+do the same outside requests (management commands, workers).
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+
+SHARDED_APPS = {'categories', 'transactions'}
+MOVE_RETRY_SECONDS = 30
+
+# (user id, alias) of the user whose data the current request or block works on
+_current_shard = ContextVar('cashflow_user_shard', default=None)
+
+
+def sharding_enabled():
+    return len(getattr(settings, 'SHARD_DATABASES', ())) > 1
+
+
+def get_current_shard():
+    current = _current_shard.get()
+    return current[1] if current else None
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+def get_shard_entry(user):
+    """(alias, status) from the directory; users without an entry live on default"""
+    from accounts.models import UserShard
+
+    entry = (
+        UserShard.objects.using(DEFAULT_DB_ALIAS)
+        .filter(user_id=_user_id(user))
+        .values_list('database', 'status')
+        .first()
+    )
+    return entry or (DEFAULT_DB_ALIAS, UserShard.STATUS_ACTIVE)
+
+
+def shard_for_user(user):
+    """Database alias that holds this user's (or user id's) transactions and categories"""
+    user_id = _user_id(user)
+    if user_id is None or not sharding_enabled():
+        return DEFAULT_DB_ALIAS
+    current = _current_shard.get()
+    if current and current[0] == user_id:
+        return current[1]
+    return get_shard_entry(user_id)[0]
+
+
+def shards_for_users(users):
+    """{user id: alias} for many users in one directory query"""
+    user_ids = [_user_id(user) for user in users]
+    shards = dict.fromkeys(user_ids, DEFAULT_DB_ALIAS)
+    if sharding_enabled():
+        from accounts.models import UserShard
+
+        shards.update(
+            UserShard.objects.using(DEFAULT_DB_ALIAS)
+            .filter(user_id__in=user_ids)
+            .values_list('user_id', 'database')
+        )
+    return shards
+
+
+def group_by_shard(users, shards=None):
+    """{alias: [users]} keeping the order of ``users``"""
+    shards = shards if shards is not None else shards_for_users(users)
+    groups = {}
+    for user in users:
+        groups.setdefault(shards[_user_id(user)], []).append(user)
+    return groups
+
+
+def for_user_shard(queryset, user):
+    """Point ``queryset`` at the user's shard; primary data is left to the other routers"""
+    alias = shard_for_user(user)
+    return queryset if alias == DEFAULT_DB_ALIAS else queryset.using(alias)
+
+
+@contextmanager
+def use_shard(user):
+    """Send unhinted queries on sharded models in this block to the user's shard"""
+    token = _current_shard.set((_user_id(user), shard_for_user(user)))
+    try:
+        yield _current_shard.get()[1]
+    finally:
+        _current_shard.reset(token)
+
+
+def copy_users_to_shard(users, alias):
+    """Insert (or leave) each user's row on a shard so foreign keys to it hold there"""
+    if alias == DEFAULT_DB_ALIAS or not users:
+        return
+    User = get_user_model()
+    fields = [field.attname for field in User._meta.concrete_fields]
+    User.objects.using(alias).bulk_create(
+        [User(**{name: getattr(user, name) for name in fields}) for user in users],
+        ignore_conflicts=True,
+    )
+
+
+def choose_shard(user_id):
+    shards = settings.SHARD_NEW_USERS
+    return shards[user_id % len(shards)]
+
+
+def _users_with_data(user_ids):
+    from categories.models import Category
+    from transactions.models import Transaction
+
+    user_ids_with_data = set()
+    for model in (Category, Transaction):
+        user_ids_with_data.update(
+            model.objects.using(DEFAULT_DB_ALIAS).filter(user_id__in=user_ids).values_list('user_id', flat=True).distinct()
+        )
+    return user_ids_with_data
+
+
+def assign_shards(users):
+    """Give users without a directory entry a shard; returns {user id: alias} for all of them"""
+    from accounts.models import UserShard
+
+    users = list(users)
+    if not sharding_enabled():
+        return dict.fromkeys((user.pk for user in users), DEFAULT_DB_ALIAS)
+
+    shards = dict(
+        UserShard.objects.using(DEFAULT_DB_ALIAS)
+        .filter(user_id__in=[user.pk for user in users])
+        .values_list('user_id', 'database')
+    )
+    new_users = [user for user in users if user.pk not in shards]
+    # Users from before sharding was enabled keep their existing data on the primary
+    with_data = _users_with_data([user.pk for user in new_users])
+    for user in new_users:
+        shards[user.pk] = DEFAULT_DB_ALIAS if user.pk in with_data else choose_shard(user.pk)
+    for alias, shard_users in group_by_shard(new_users, shards).items():
+        copy_users_to_shard(shard_users, alias)
+    UserShard.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+        [UserShard(user_id=user.pk, database=shards[user.pk]) for user in new_users],
+        ignore_conflicts=True,
+    )
+    return shards
+
+
+class ShardMiddleware:
+    """Pin the signed-in user's queries to their shard and hold writes while it is being moved"""
+
+    def __init__(self, get_response):
+        if not sharding_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from accounts.models import UserShard
+
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return self.get_response(request)
+
+        alias, status = get_shard_entry(user)
+        if status == UserShard.STATUS_MOVING and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response = HttpResponse(
+                'Your data is being moved to another server. Please try again in a moment.', status=503,
+            )
+            response['Retry-After'] = str(MOVE_RETRY_SECONDS)
+            return response
+
+        token = _current_shard.set((user.pk, alias))
+        try:
+            return self.get_response(request)
+        finally:
+            _current_shard.reset(token)
@@ -0,0 +1,112 @@
+"""
+Cold-start helpers for the WSGI/ASGI entry points.
+
+What shortens every cold start is keeping heavy modules (NumPy, analytics,
+reports) out of the import path. ``measure_cold_start()`` starts a fresh
+interpreter, imports an entry point and serves one request, which is what the
+``startup_report`` command and the cold-start test use.
+"""
+
+import inspect
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+# Runs in the child interpreter; prints phase timings as JSON on stdout
+PROBE_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1], fromlist=['application'])
+loaded = time.perf_counter()
+from accounts.benchmarks import benchmark_host
+from CashFlow_Tracker.startup import first_request
+status = first_request(module.application, benchmark_host(), sys.argv[2])
+done = time.perf_counter()
+print(json.dumps({
+    'import_ms': (loaded - start) * 1000,
+    'first_request_ms': (done - loaded) * 1000,
+    'total_ms': (done - start) * 1000,
+    'status': status,
+    'modules': len(sys.modules),
+}))
+'''
+
+
+def first_request(application, host, path):
+    """Send a single anonymous GET through a WSGI or ASGI application"""
+    if inspect.iscoroutinefunction(type(application).__call__):
+        return _first_asgi_request(application, host, path)
+
+    import io
+
+    status = []
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '443',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'https',
+    }
+    response = application(environ, lambda status_line, headers, exc_info=None: status.append(status_line))
+    response.close()
+    return int(status[0].split(' ', 1)[0])
+
+
+def _first_asgi_request(application, host, path):
+    import asyncio
+
+    status = []
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'https', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', host.encode())], 'client': ('127.0.0.1', 0), 'server': (host, 443),
+    }
+
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Django stops listening for a disconnect once the response is sent
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    asyncio.run(application(scope, receive, send))
+    return status[0]
+
+
+def measure_cold_start(entry_point='CashFlow_Tracker.wsgi', path='/login/', env=None, importtime=False):
+    """Time a cold start in a fresh interpreter; returns (phases, imports)"""
+    child_env = {**os.environ, **(env or {})}
+    child_env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), child_env.get('PYTHONPATH')]))
+    command = [sys.executable, *(['-X', 'importtime'] if importtime else []), '-c', PROBE_SCRIPT, entry_point, path]
+    result = subprocess.run(command, capture_output=True, text=True, env=child_env, cwd=settings.BASE_DIR)
+    if result.returncode != 0:
+        raise RuntimeError(f'Cold start probe failed:\n{result.stderr[-2000:]}')
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    return phases, parse_importtime(result.stderr) if importtime else []
+
+
+def parse_importtime(output):
+    """(module, self_us, cumulative_us, depth) for each line of ``-X importtime`` output"""
+    imports = []
+    for line in output.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return imports
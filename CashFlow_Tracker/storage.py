@@ -0,0 +1,181 @@
+"""
+Static files storage for production builds.
+
+``collectstatic`` minifies the project's own stylesheets and scripts
+(``statics/css`` and ``statics/js``) as it copies them, before WhiteNoise
+fingerprints and compresses them. Vendored libraries ship minified already.
+
+The minifiers only drop comments and layout whitespace. Both skip over
+string literals, and the JS one also over template and regular expression
+literals, so neither needs to understand the full grammar.
+"""
+
+import posixpath
+import re
+
+from django.core.files.base import ContentFile
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+_CSS_STRING = r'''(?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')'''
+_CSS_COMMENTS = re.compile(_CSS_STRING + r'|(?P<comment>/\*.*?\*/)', re.S)
+_CSS_WHITESPACE = re.compile(_CSS_STRING + r'|\s*(?P<punctuation>[{};,>])\s*|(?P<space>\s+)')
+
+
+def minify_css(text):
+    # Comments go first so the whitespace around them collapses in the second pass
+    text = _CSS_COMMENTS.sub(lambda match: match.group('string') or ' ', text)
+    return _CSS_WHITESPACE.sub(
+        lambda match: match.group('string') or match.group('punctuation') or ' ', text
+    ).strip()
+
+
+# A '/' after one of these (or after a keyword below) starts a regular expression, not a division
+_JS_REGEX_PRECEDERS = frozenset('(,=:[!&|?{};+-*%<>~^')
+_JS_REGEX_KEYWORDS = re.compile(r'(?:^|[^\w$])(?:return|typeof|instanceof|in|of|new|delete|void|throw|case|do|else|yield|await)$')
+
+
+def _skip_quoted(text, start, quote):
+    """Index just past the string literal opening at ``start``; an unterminated one ends at the newline"""
+    index = start + 1
+    while index < len(text):
+        char = text[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == quote:
+            return index + 1
+        if char == '\n':
+            return index
+        index += 1
+    return index
+
+
+def _skip_template(text, start):
+    """Index just past the template literal opening at ``start``, including nested ``${...}`` expressions"""
+    index = start + 1
+    while index < len(text):
+        char = text[index]
+        if char == '\\':
+            index += 2
+        elif char == '`':
+            return index + 1
+        elif text.startswith('${', index):
+            index = _skip_expression(text, index + 2)
+        else:
+            index += 1
+    return index
+
+
+def _skip_expression(text, index):
+    """Index just past the '}' closing a template substitution"""
+    depth = 0
+    while index < len(text):
+        char = text[index]
+        if char in '\'"':
+            index = _skip_quoted(text, index, char)
+        elif char == '`':
+            index = _skip_template(text, index)
+        elif char == '{':
+            depth += 1
+            index += 1
+        elif char == '}':
+            if not depth:
+                return index + 1
+            depth -= 1
+            index += 1
+        else:
+            index += 1
+    return index
+
+
+def _skip_regex(text, start):
+    """Index just past the closing '/' of the regular expression literal opening at ``start``"""
+    index = start + 1
+    in_class = False
+    while index < len(text):
+        char = text[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == '\n':
+            return index
+        if char == '[':
+            in_class = True
+        elif char == ']':
+            in_class = False
+        elif char == '/' and not in_class:
+            return index + 1
+        index += 1
+    return index
+
+
+def minify_js(text):
+    """
+    Drop comments, indentation and blank lines. Line breaks stay (automatic
+    semicolon insertion depends on them) and string, template and regular
+    expression literals are copied untouched, including their line breaks.
+    """
+    lines = []
+    line = []
+    previous = ''  # last character of code emitted, across lines
+    index = 0
+    while index < len(text):
+        char = text[index]
+        if char == '\n':
+            code = ''.join(line).strip()
+            if code:
+                lines.append(code)
+            line = []
+            index += 1
+        elif char in '\'"`':
+            end = _skip_template(text, index) if char == '`' else _skip_quoted(text, index, char)
+            line.append(text[index:end])
+            previous = char
+            index = end
+        elif text.startswith('//', index):
+            newline = text.find('\n', index)
+            index = len(text) if newline == -1 else newline
+        elif text.startswith('/*', index):
+            end = text.find('*/', index + 2)
+            end = len(text) if end == -1 else end + 2
+            # A comment spanning lines still separates statements
+            line.append('\n' if '\n' in text[index:end] else ' ')
+            index = end
+        elif char == '/' and (
+            not previous or previous in _JS_REGEX_PRECEDERS
+            or _JS_REGEX_KEYWORDS.search(''.join(line).rstrip())
+        ):
+            end = _skip_regex(text, index)
+            line.append(text[index:end])
+            previous = '/'
+            index = end
+        else:
+            line.append(char)
+            if not char.isspace():
+                previous = char
+            index += 1
+    code = ''.join(line).strip()
+    if code:
+        lines.append(code)
+    return '\n'.join(lines)
+
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+class MinifiedManifestStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """CompressedManifestStaticFilesStorage that minifies the project's CSS and JS bundles"""
+
+    minify_prefixes = ('css/', 'js/')
+
+    def _save(self, name, content):
+        minify = MINIFIERS.get(posixpath.splitext(name)[1])
+        # Hashed copies come through here again; the minifiers leave minified text unchanged
+        if minify and name.startswith(self.minify_prefixes) and '.min.' not in name:
+            # chunks() rewinds first; the manifest storage has already read the file to hash it
+            text = b''.join(content.chunks()).decode('utf-8')
+            content = ContentFile(minify(text).encode('utf-8'))
+        return super()._save(name, content)
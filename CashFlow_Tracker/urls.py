@@ -17,9 +17,16 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .metrics import metrics_view
+from .profiling import profile_detail, profile_list
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('accounts.urls')),
     path('categories/', include('categories.urls')),
     path('transactions/', include('transactions.urls')),
+    path('jobs/', include('jobs.urls')),
+    path('metrics/', metrics_view, name='metrics'),
+    path('profiles/', profile_list, name='profile_list'),
+    path('profiles/<str:name>', profile_detail, name='profile_detail'),
 ]
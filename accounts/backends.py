@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def _user_cache_key(user_id):
+    return f"auth_user_{user_id}"
+
+
+def invalidate_cached_user(user_id):
+    """Drop the cached user row; the next request loads it from the database again"""
+    cache.delete(_user_cache_key(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that serves the signed-in user from the cache.
+
+    AuthenticationMiddleware loads the user on every request; caching the row
+    saves that query. Saving or deleting the user drops the entry (see
+    accounts/signals.py), so profile and password changes, including the
+    session hash checked after a password change, apply on the next request.
+    Rows changed with QuerySet.update() stay cached until AUTH_USER_CACHE_TTL.
+
+    That only holds when every process reads the same cache, so without
+    SHARED_CACHE the user is loaded from the database like ModelBackend does.
+    """
+
+    def get_user(self, user_id):
+        if not settings.SHARED_CACHE:
+            return super().get_user(user_id)
+        key = _user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            try:
+                user = get_user_model()._default_manager.get(pk=user_id)
+            except get_user_model().DoesNotExist:
+                return None
+            cache.set(key, user, settings.AUTH_USER_CACHE_TTL)
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        if not settings.SHARED_CACHE:
+            return await super().aget_user(user_id)
+        key = _user_cache_key(user_id)
+        user = await cache.aget(key)
+        if user is None:
+            try:
+                user = await get_user_model()._default_manager.aget(pk=user_id)
+            except get_user_model().DoesNotExist:
+                return None
+            await cache.aset(key, user, settings.AUTH_USER_CACHE_TTL)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,61 @@
+"""Helpers shared by the benchmark and load-test management commands"""
+
+import math
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db.models import Count
+
+User = get_user_model()
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize_latencies(latencies):
+    """p50/p95/p99/mean in milliseconds for a list of durations in seconds"""
+    values = sorted(latency * 1000 for latency in latencies)
+    return {
+        'count': len(values),
+        'mean_ms': round(sum(values) / len(values), 3) if values else 0.0,
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+    }
+
+
+def benchmark_host():
+    """A host name accepted by ALLOWED_HOSTS for in-process requests"""
+    for host in settings.ALLOWED_HOSTS:
+        if host == '*':
+            return 'localhost'
+        if host.startswith('.'):
+            return f'www{host}'
+        if host:
+            return host
+    return 'localhost'
+
+
+def benchmark_user(username=None):
+    """The requested user, or the generated user with the most transactions"""
+    if username:
+        try:
+            return User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'User "{username}" does not exist')
+
+    user = (
+        User.objects.annotate(transaction_count=Count('transactions'))
+        .filter(transaction_count__gt=0)
+        .order_by('-transaction_count')
+        .first()
+    )
+    if user is None:
+        raise CommandError('No user with transactions found; run generate_synthetic_data first')
+    return user
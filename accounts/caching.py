@@ -0,0 +1,28 @@
+import time
+
+from django.core.cache import cache
+
+
+def _data_version_key(user_id):
+    return f"data_version_{user_id}"
+
+
+def get_data_version(user_id):
+    """Return the current data version for a user's transactions and categories"""
+    key = _data_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never repeats an old version
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(user_id):
+    """Invalidate everything keyed by the user's data version"""
+    key = _data_version_key(user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+        return cache.get(key)
@@ -57,3 +57,28 @@ class CustomUserCreationForm(UserCreationForm):
         if commit:
             user.save()
         return user
+
+
+class CurrencySettingsForm(forms.ModelForm):
+    class Meta:
+        model = CustomUser
+        fields = ('base_currency',)
+        widgets = {
+            'base_currency': forms.Select(attrs={'class': 'form-select'}),
+        }
+        labels = {
+            'base_currency': 'สกุลเงินหลัก',
+        }
+        help_texts = {
+            'base_currency': 'ยอดรวมบนแดชบอร์ด กราฟ และรายงานจะแปลงเป็นสกุลเงินนี้ตามอัตราแลกเปลี่ยนของวันที่ทำรายการ',
+        }
+
+    def clean_base_currency(self):
+        from transactions.currency import PIVOT_CURRENCY
+        from transactions.models import ExchangeRate
+
+        currency = self.cleaned_data['base_currency']
+        # Every total divides by the base currency's rate, so it needs at least one (as foreign transactions do)
+        if currency != PIVOT_CURRENCY and not ExchangeRate.objects.filter(currency=currency).exists():
+            raise forms.ValidationError('ยังไม่มีอัตราแลกเปลี่ยนของสกุลเงินนี้')
+        return currency
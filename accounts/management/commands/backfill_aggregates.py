@@ -0,0 +1,349 @@
+import json
+import math
+import multiprocessing
+import os
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractMonth, TruncMonth
+from django.utils import timezone
+
+from accounts.caching import bump_data_version, get_data_version
+from accounts.views import (
+    _cashflow_buckets, _cashflow_totals, compute_dashboard_stats, dashboard_stats_cache_key, get_dashboard_stats,
+)
+from CashFlow_Tracker.sharding import group_by_shard, use_shard
+from categories.models import Budget, CategoryStats
+from transactions.currency import PIVOT_CURRENCY, converted_amount, converted_cents, group_by_base_currency
+from transactions.models import Transaction
+
+User = get_user_model()
+
+INCOME = Q(transaction_type='income')
+EXPENSE = Q(transaction_type='expense')
+# Mismatches printed per chunk; the rest are only counted
+MAX_REPORTED_PER_CHUNK = 20
+
+
+def recompute_aggregates(user_ids, alias, today, year, currency=PIVOT_CURRENCY):
+    """
+    {user id: {field: value}} for many users with two GROUP BY queries.
+
+    This is the bulk definition of the numbers get_dashboard_stats and the
+    yearly get_cashflow_data chart show, in ``currency`` (the users' base
+    currency); users without transactions are absent.
+    """
+    transactions = Transaction.objects.using(alias).filter(user_id__in=user_ids).order_by()
+    month_start = today.replace(day=1)
+    amount = converted_amount(currency)
+    numbers = {}
+    for row in transactions.values('user_id').annotate(
+        total_income=Sum(amount, filter=INCOME),
+        total_expenses=Sum(amount, filter=EXPENSE),
+        month_income=Sum(amount, filter=INCOME & Q(date__gte=month_start)),
+        month_expenses=Sum(amount, filter=EXPENSE & Q(date__gte=month_start)),
+        total_transactions=Count('pk'),
+        income_transactions=Count('pk', filter=INCOME),
+        expense_transactions=Count('pk', filter=EXPENSE),
+        categories_used=Count('category', distinct=True),
+    ):
+        income, expenses = row['total_income'] or 0, row['total_expenses'] or 0
+        numbers[row['user_id']] = {
+            'total_income': income,
+            'total_expenses': expenses,
+            'net_balance': income - expenses,
+            'current_month_balance': (row['month_income'] or 0) - (row['month_expenses'] or 0),
+            'total_transactions': row['total_transactions'],
+            'income_transactions': row['income_transactions'],
+            'expense_transactions': row['expense_transactions'],
+            'categories_used': row['categories_used'],
+        }
+    for row in transactions.filter(date__year=year).values('user_id', month=ExtractMonth('date')).annotate(
+        income=Sum(amount, filter=INCOME),
+        expenses=Sum(amount, filter=EXPENSE),
+    ):
+        user_numbers = numbers.setdefault(row['user_id'], {})
+        user_numbers[f"cashflow_{row['month']:02d}_income"] = row['income'] or 0
+        user_numbers[f"cashflow_{row['month']:02d}_expenses"] = row['expenses'] or 0
+    return numbers
+
+
+def budget_differences(user_ids, alias):
+    """{user id: [(budget pk, field, recomputed spent, stored spent)]} for budgets whose spent is off"""
+    budgets = list(
+        Budget.objects.using(alias).filter(user_id__in=user_ids)
+        .values_list('pk', 'user_id', 'category_id', 'month', 'spent')
+    )
+    if not budgets:
+        return {}
+    spent = {}
+    # The same per-row rounding to cents in the user's base currency as the transaction signals
+    for currency, currency_user_ids in group_by_base_currency({budget[1] for budget in budgets}).items():
+        spent.update(
+            ((row['category_id'], row['month']), row['total'])
+            for row in Transaction.objects.using(alias).filter(
+                user_id__in=currency_user_ids, category_id__in={budget[2] for budget in budgets},
+            ).order_by().values('category_id', month=TruncMonth('date')).annotate(total=Sum(converted_cents(currency)))
+        )
+    found = {}
+    for pk, user_id, category_id, month, stored in budgets:
+        expected = spent.get((category_id, month)) or 0
+        if Decimal(expected) != stored:
+            found.setdefault(user_id, []).append((pk, f'budget_{category_id}_{month:%Y-%m}_spent', expected, stored))
+    return found
+
+
+def stats_differences(user_ids, alias):
+    """{user id: [(field, recomputed, stored)]} for category stats that drifted from the transactions"""
+    expected = CategoryStats.objects.using(alias).recompute(user_ids)
+    stored = {
+        category_id: (user_id, count, mean, m2)
+        for category_id, user_id, count, mean, m2 in CategoryStats.objects.using(alias).filter(user_id__in=user_ids)
+        .values_list('category_id', 'user_id', 'count', 'mean', 'm2')
+    }
+    found = {}
+    for category_id in expected.keys() | stored.keys():
+        user_id, *numbers = expected.get(category_id) or (stored[category_id][0], 0, 0.0, 0.0)
+        _user_id, *current = stored.get(category_id) or (user_id, 0, 0.0, 0.0)
+        for name, value, stored_value in zip(('count', 'mean', 'm2'), numbers, current):
+            # Running float updates differ from a fresh aggregate in the last digits
+            if not math.isclose(value, stored_value, rel_tol=1e-6, abs_tol=0.01):
+                found.setdefault(user_id, []).append((f'stats_{category_id}_{name}', value, stored_value))
+    return found
+
+
+def flatten_dashboard_stats(stats):
+    """The fields of a get_dashboard_stats() dict that recompute_aggregates() also produces"""
+    return {
+        'total_income': stats['total_income'],
+        'total_expenses': stats['total_expenses'],
+        'net_balance': stats['net_balance'],
+        'current_month_balance': stats['current_month_balance'],
+        **stats['stats'],
+    }
+
+
+def view_cashflow(user, year, today):
+    """Monthly income and expenses as the yearly cash flow chart computes them"""
+    transactions = Transaction.objects.for_user(user)
+    numbers = {}
+    buckets = _cashflow_buckets('year', year, today)
+    bucket_totals = _cashflow_totals(transactions, [filters for _label, filters in buckets], user.base_currency)
+    for month, totals in enumerate(bucket_totals, start=1):
+        numbers[f'cashflow_{month:02d}_income'] = totals['income'] or 0
+        numbers[f'cashflow_{month:02d}_expenses'] = totals['expenses'] or 0
+    return numbers
+
+
+def differences(expected, found, source):
+    """(source, field, expected, found) for every field present in ``found`` that differs"""
+    return [
+        (source, field, expected.get(field, 0), value)
+        for field, value in found.items()
+        if Decimal(expected.get(field, 0)) != Decimal(value)
+    ]
+
+
+def check_users(user_ids, options):
+    """Recompute a chunk of users and compare with the views, the cache, budgets and category stats; returns a summary dict"""
+    today = timezone.now().date()
+    suffix = f"dashboard_{today.strftime('%Y%m%d')}"
+    users = list(User.objects.filter(pk__in=user_ids).order_by('pk'))
+    expected = {}
+    stale_budgets = {}
+    stale_stats = {}
+    for alias, shard_users in group_by_shard(users).items():
+        shard_user_ids = [user.pk for user in shard_users]
+        by_currency = {}
+        for user in shard_users:
+            by_currency.setdefault(user.base_currency, []).append(user.pk)
+        for currency, currency_user_ids in by_currency.items():
+            expected.update(recompute_aggregates(currency_user_ids, alias, today, options['year'], currency))
+        stale_budgets.update(budget_differences(shard_user_ids, alias))
+        stats = stats_differences(shard_user_ids, alias)
+        stale_stats.update(stats)
+        if options['repair'] and stats:
+            CategoryStats.objects.using(alias).rebuild(list(stats))
+
+    mismatches = []
+    repaired = 0
+    for user in users:
+        numbers = expected.get(user.pk, {})
+        found = []
+        with use_shard(user):
+            if options['verify_views']:
+                found += differences(numbers, flatten_dashboard_stats(compute_dashboard_stats(user)), 'views')
+                found += differences(numbers, view_cashflow(user, options['year'], today), 'views')
+            if options['check_cache']:
+                cached = cache.get(dashboard_stats_cache_key(user.pk, suffix, get_data_version(user.pk)))
+                if cached is not None:
+                    found += differences(numbers, flatten_dashboard_stats(cached), 'cache')
+                stale_cache = any(source == 'cache' for source, *_rest in found)
+                if options['repair'] and stale_cache:
+                    # Drops the stale stats and every fragment keyed by the old version
+                    bump_data_version(user.pk)
+                    repaired += 1
+                if options['warm'] or (options['repair'] and stale_cache):
+                    get_dashboard_stats(user, suffix)
+            budgets = stale_budgets.get(user.pk, [])
+            found += [('budget', field, expected_spent, stored) for _pk, field, expected_spent, stored in budgets]
+            if options['repair'] and budgets:
+                Budget.objects.for_user(user).filter(pk__in=[pk for pk, *_rest in budgets]).recalculate_spent()
+                repaired += len(budgets)
+            stats = stale_stats.get(user.pk, [])
+            found += [('stats', field, expected_value, stored) for field, expected_value, stored in stats]
+            if options['repair'] and stats:
+                # Rebuilt per shard above
+                repaired += len(stats)
+        mismatches.extend((user.pk, user.username, *difference) for difference in found)
+
+    return {
+        'last_user_id': user_ids[-1],
+        'checked': len(users),
+        'mismatches': mismatches,
+        'repaired': repaired,
+    }
+
+
+def _check_worker(args):
+    # The process keeps its own connection open for all the chunks it is given
+    return check_users(*args)
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute every user\'s dashboard and cash flow aggregates and budget spending in chunks, compare them '
+        'with what the views, the cache and the budgets hold, and report mismatches; resumable from a checkpoint file'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes, each with one DB connection')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Users recomputed per GROUP BY query')
+        parser.add_argument('--year', type=int, default=None, help='Year of the cash flow chart (default this year)')
+        parser.add_argument('--checkpoint', default='backfill_aggregates.checkpoint.json',
+                            help='File recording progress; an unfinished run resumes from it')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--skip-views', dest='verify_views', action='store_false',
+                            help='Only compare with cached values (skips the per-user view queries)')
+        parser.add_argument('--repair', action='store_true',
+                            help='Refill cached stats and recalculate budget spending and category stats that disagree with the recomputed values')
+        parser.add_argument('--warm', action='store_true',
+                            help='Fill the dashboard stats cache for every user (needs a shared cache)')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--workers and --chunk-size must be positive')
+        # A per-process cache here is not the one the web workers read, so there is nothing to compare or fill
+        if options['warm'] and not settings.SHARED_CACHE:
+            raise CommandError('--warm needs a cache shared with the web processes (set CACHE_URL)')
+        if not settings.SHARED_CACHE:
+            self.stdout.write('No shared cache (CACHE_URL): skipping the cached stats comparison')
+
+        state = self.load_checkpoint(options)
+        # Only plain values are passed on to worker processes
+        check_options = {
+            'year': state['year'],
+            'verify_views': options['verify_views'],
+            'repair': options['repair'],
+            'warm': options['warm'],
+            'check_cache': settings.SHARED_CACHE,
+        }
+        remaining = User.objects.filter(pk__gt=state['last_user_id']).count()
+        self.stdout.write(
+            f"Checking {remaining} user(s) after id {state['last_user_id']} for {state['year']} "
+            f"with {options['workers']} worker(s)"
+        )
+
+        if options['workers'] == 1:
+            pool = None
+        else:
+            # Child processes must open their own connections
+            connections.close_all()
+            pool = multiprocessing.Pool(options['workers'])
+
+        started = time.perf_counter()
+        checked = 0
+        # Enough chunks per round to keep every worker busy
+        batch_size = options['chunk_size'] * options['workers'] * 4
+        try:
+            while True:
+                user_ids = list(
+                    User.objects.filter(pk__gt=state['last_user_id']).order_by('pk')
+                    .values_list('pk', flat=True)[:batch_size]
+                )
+                if not user_ids:
+                    break
+                chunks = [user_ids[i:i + options['chunk_size']] for i in range(0, len(user_ids), options['chunk_size'])]
+                if pool is None:
+                    results = (check_users(chunk, check_options) for chunk in chunks)
+                else:
+                    # imap keeps chunk order, so the checkpoint never skips an unfinished chunk
+                    results = pool.imap(_check_worker, [(chunk, check_options) for chunk in chunks])
+
+                for result in results:
+                    self.report(result['mismatches'])
+                    state['last_user_id'] = result['last_user_id']
+                    state['checked'] += result['checked']
+                    state['repaired'] += result['repaired']
+                    state['mismatched_user_ids'] = sorted(
+                        set(state['mismatched_user_ids']) | {user_id for user_id, *_rest in result['mismatches']}
+                    )
+                    self.save_checkpoint(options['checkpoint'], state)
+                    checked += result['checked']
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f'  {state["checked"]} user(s) checked ({checked / elapsed:,.0f} users/s)')
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        state['finished'] = True
+        self.save_checkpoint(options['checkpoint'], state)
+        summary = (
+            f"Checked {state['checked']} user(s) in {time.perf_counter() - started:.1f}s: "
+            f"{len(state['mismatched_user_ids'])} with mismatches, "
+            f"{state['repaired']} cache entries, budgets and category stats repaired"
+        )
+        if state['mismatched_user_ids']:
+            self.stdout.write(self.style.WARNING(summary))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def load_checkpoint(self, options):
+        year = options['year'] or timezone.now().year
+        fresh = {'year': year, 'last_user_id': 0, 'checked': 0, 'repaired': 0, 'mismatched_user_ids': [],
+                 'finished': False}
+        path = options['checkpoint']
+        if options['restart'] or not os.path.exists(path):
+            return fresh
+        with open(path, encoding='utf-8') as checkpoint:
+            state = json.load(checkpoint)
+        if state.get('finished'):
+            self.stdout.write(f'{path} records a finished run; starting over')
+            return fresh
+        if options['year'] and options['year'] != state['year']:
+            raise CommandError(f"{path} is a run for {state['year']}; use --restart to check {options['year']}")
+        self.stdout.write(f"Resuming from {path} after user id {state['last_user_id']}")
+        return state
+
+    def save_checkpoint(self, path, state):
+        # Write then rename, so an interrupted run never leaves a truncated checkpoint
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as checkpoint:
+            json.dump({**state, 'updated_at': timezone.now().isoformat()}, checkpoint)
+        os.replace(f'{path}.tmp', path)
+
+    def report(self, mismatches):
+        for user_id, username, source, field, expected, found in mismatches[:MAX_REPORTED_PER_CHUNK]:
+            self.stdout.write(self.style.WARNING(
+                f'  user {user_id} ({username}) {field}: recomputed {expected}, {source} {found}'
+            ))
+        if len(mismatches) > MAX_REPORTED_PER_CHUNK:
+            self.stdout.write(self.style.WARNING(
+                f'  ... and {len(mismatches) - MAX_REPORTED_PER_CHUNK} more mismatch(es) in this chunk'
+            ))
@@ -0,0 +1,217 @@
+import json
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.benchmarks import benchmark_host, benchmark_user, summarize_latencies
+from categories.models import Category
+from transactions.models import Transaction
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+BENCHMARK_DESCRIPTION = '[benchmark] transaction_create'
+
+
+def build_scenarios(user):
+    """Return (name, method, path, data) tuples covering the hot views"""
+    today = timezone.now().date()
+    expense_category = Category.objects.for_user(user).expense_categories().order_by('name').first()
+    transaction_count = Transaction.objects.for_user(user).count()
+    last_page = max(1, (transaction_count + 19) // 20)
+
+    scenarios = [('dashboard', 'get', reverse('dashboard'), None)]
+
+    for period in ('year', '6months', '3months', 'month', 'week'):
+        scenarios.append((f'cashflow_{period}', 'get', reverse('get_cashflow_data'), {'period': period}))
+
+    list_filters = [
+        ('all', {}),
+        ('expense', {'transaction_type': 'expense'}),
+        ('income_year', {'transaction_type': 'income', 'period': 'year'}),
+        ('month', {'period': 'month'}),
+        ('week', {'period': 'week'}),
+        ('search', {'search': 'ข้าว'}),
+        ('custom_range', {
+            'period': 'custom',
+            'date_from': (today - timedelta(days=180)).isoformat(),
+            'date_to': today.isoformat(),
+        }),
+        ('page_middle', {'page': max(1, last_page // 2)}),
+        ('page_last', {'page': last_page}),
+    ]
+    if expense_category:
+        list_filters.append(('category', {'category': expense_category.id}))
+        list_filters.append(('category_search_page_2', {'category': expense_category.id, 'search': 'ข้าว', 'page': 2}))
+    for name, params in list_filters:
+        scenarios.append((f'transaction_list_{name}', 'get', reverse('transaction_list'), params))
+
+    scenarios += [
+        ('category_api_list', 'get', reverse('category_api_list'), None),
+        ('category_api_list_expense', 'get', reverse('category_api_list'), {'type': 'expense'}),
+        ('get_categories_by_type', 'get', reverse('get_categories_by_type'), {'type': 'expense'}),
+        ('transaction_form_bootstrap', 'get', reverse('transaction_form_bootstrap'), None),
+    ]
+
+    if expense_category:
+        scenarios.append(('transaction_create', 'post', reverse('transaction_create'), {
+            'transaction_type': 'expense',
+            'category': expense_category.id,
+            'description': BENCHMARK_DESCRIPTION,
+            'amount': '99.00',
+            'currency': user.base_currency,
+            'date': today.isoformat(),
+            'notes': '',
+        }))
+
+    return scenarios
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot views against a generated dataset and compare with a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to benchmark as (default: user with most transactions)')
+        parser.add_argument('--generate', type=int, metavar='TRANSACTIONS',
+                            help='Generate a benchmark user with this many transactions first')
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per scenario')
+        parser.add_argument('--scenario', action='append', default=[],
+                            help='Only run scenarios whose name contains this text (repeatable)')
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON file')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed relative slowdown of p95 and peak memory before flagging (default 0.25)')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error on regressions')
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            call_command(
+                'generate_synthetic_data', users=1, transactions=options['generate'], years=3,
+                prefix='bench', seed=42, stdout=self.stdout,
+            )
+            options['user'] = options['user'] or 'bench0000000'
+
+        user = benchmark_user(options['user'])
+        client = Client(HTTP_HOST=benchmark_host())
+        client.force_login(user)
+
+        scenarios = build_scenarios(user)
+        if options['scenario']:
+            scenarios = [s for s in scenarios if any(part in s[0] for part in options['scenario'])]
+        if not scenarios:
+            raise CommandError('No scenarios selected')
+
+        self.stdout.write(
+            f"Benchmarking as {user.username} ({Transaction.objects.for_user(user).count()} transactions), "
+            f"{options['iterations']} iteration(s) per scenario{' with a cold cache' if options['cold'] else ''}"
+        )
+
+        results = {}
+        try:
+            for name, method, path, data in scenarios:
+                results[name] = self.run_scenario(client, method, path, data, options)
+                self.write_result(name, results[name])
+        finally:
+            Transaction.objects.for_user(user).filter(description=BENCHMARK_DESCRIPTION).delete()
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps({
+                'meta': {
+                    'database': connection.vendor,
+                    'user': user.username,
+                    'transactions': Transaction.objects.for_user(user).count(),
+                    'iterations': options['iterations'],
+                    'cold_cache': options['cold'],
+                },
+                'scenarios': results,
+            }, indent=2, ensure_ascii=False) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}'))
+            return
+
+        if baseline_path.exists():
+            regressions = self.compare(results, json.loads(baseline_path.read_text())['scenarios'], options['tolerance'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} performance regression(s) against {baseline_path}')
+        else:
+            self.stdout.write(f'No baseline at {baseline_path}; run with --save-baseline to create one')
+
+    def request(self, client, method, path, data):
+        response = getattr(client, method)(path, data, secure=True)
+        if response.status_code >= 400:
+            raise CommandError(f'{method.upper()} {path} returned {response.status_code}')
+        # A form POST that does not redirect re-rendered the form with errors and saved nothing
+        if method == 'post' and response.status_code != 302:
+            raise CommandError(f'{method.upper()} {path} did not redirect ({response.status_code}); the form was rejected')
+        return response
+
+    def run_scenario(self, client, method, path, data, options):
+        for _ in range(options['warmup']):
+            if options['cold']:
+                cache.clear()
+            self.request(client, method, path, data)
+
+        latencies = []
+        query_counts = []
+        for _ in range(options['iterations']):
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                self.request(client, method, path, data)
+                latencies.append(time.perf_counter() - start)
+            query_counts.append(len(queries))
+
+        # Measured separately because tracemalloc slows every allocation down
+        if options['cold']:
+            cache.clear()
+        tracemalloc.start()
+        try:
+            self.request(client, method, path, data)
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        result = summarize_latencies(latencies)
+        result['queries'] = max(query_counts)
+        result['peak_memory_kb'] = round(peak / 1024, 1)
+        return result
+
+    def write_result(self, name, result):
+        self.stdout.write(
+            f"  {name:<40} p50 {result['p50_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+            f"p99 {result['p99_ms']:>9.2f} ms  {result['queries']:>3} queries  "
+            f"{result['peak_memory_kb']:>9.1f} KB peak"
+        )
+
+    def compare(self, results, baseline, tolerance):
+        regressions = []
+        for name, result in results.items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            if result['queries'] > previous['queries']:
+                regressions.append(f"{name}: queries {previous['queries']} -> {result['queries']}")
+            for metric in ('p95_ms', 'peak_memory_kb'):
+                if previous[metric] and result[metric] > previous[metric] * (1 + tolerance):
+                    regressions.append(f'{name}: {metric} {previous[metric]} -> {result[metric]}')
+
+        if regressions:
+            self.stdout.write(self.style.WARNING(f'{len(regressions)} regression(s) against the baseline:'))
+            for regression in regressions:
+                self.stdout.write(self.style.WARNING(f'  {regression}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+        return regressions
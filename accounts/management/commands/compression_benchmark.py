@@ -0,0 +1,80 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from accounts.benchmarks import benchmark_host, benchmark_user
+from CashFlow_Tracker import compression
+
+
+def build_endpoints():
+    """(name, path, params) of the HTML pages and JSON APIs worth compressing"""
+    return [
+        ('dashboard', reverse('dashboard'), None),
+        ('transaction_list', reverse('transaction_list'), None),
+        ('transaction_form', reverse('transaction_create'), None),
+        ('get_cashflow_data', reverse('get_cashflow_data'), {'period': 'year'}),
+        ('category_api_list', reverse('category_api_list'), None),
+        ('get_categories_by_type', reverse('get_categories_by_type'), {'type': 'expense'}),
+        ('transaction_form_bootstrap', reverse('transaction_form_bootstrap'), None),
+    ]
+
+
+def cpu_ms(func, content, iterations):
+    """Mean CPU time of one func(content) call in milliseconds, and its output"""
+    start = time.process_time()
+    for _ in range(iterations):
+        result = func(content)
+    return (time.process_time() - start) / iterations * 1000, result
+
+
+class Command(BaseCommand):
+    help = 'Measure bytes saved and CPU time per response for gzip and Brotli on the main pages and APIs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to request as (default: user with most transactions)')
+        parser.add_argument('--iterations', type=int, default=50, help='Compressions per endpoint and coding')
+
+    def handle(self, *args, **options):
+        user = benchmark_user(options['user'])
+        client = Client(HTTP_HOST=benchmark_host())
+        client.force_login(user)
+        codings = {'gzip': lambda content: compression.compress(content, 'gzip')}
+        if compression.brotli is not None:
+            codings['br'] = lambda content: compression.compress(content, 'br')
+        else:
+            self.stdout.write(self.style.WARNING('Brotli is not installed; measuring gzip only'))
+
+        self.stdout.write(
+            f"{'endpoint':<28}{'identity':>10}" + ''.join(f'{coding:>10}{"saved":>7}{"cpu ms":>8}' for coding in codings)
+            + '  served as'
+        )
+        totals = dict.fromkeys(['identity', *codings], 0)
+        for name, path, params in build_endpoints():
+            # No Accept-Encoding: the middleware leaves the body as rendered
+            response = client.get(path, params or {})
+            content = response.content
+            totals['identity'] += len(content)
+            row = f'{name:<28}{len(content):>10}'
+            for coding, func in codings.items():
+                milliseconds, compressed = cpu_ms(func, content, options['iterations'])
+                totals[coding] += len(compressed)
+                row += f'{len(compressed):>10}{1 - len(compressed) / len(content):>7.0%}{milliseconds:>8.3f}'
+            self.stdout.write(f'{row}  {self.served_as(name, response)}')
+
+        summary = ', '.join(
+            f'{coding} {totals[coding]} bytes ({1 - totals[coding] / totals["identity"]:.0%} saved)' for coding in codings
+        )
+        self.stdout.write(self.style.SUCCESS(f"Total {totals['identity']} bytes uncompressed; {summary}"))
+
+    def served_as(self, name, response):
+        """What CompressionMiddleware sends a browser accepting gzip and br"""
+        if len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return 'identity (below COMPRESSION_MIN_SIZE)'
+        if name in settings.COMPRESSION_EXCLUDED_URL_NAMES:
+            return 'identity (excluded)'
+        carries_csrf_token = settings.CSRF_COOKIE_NAME in response.cookies
+        coding = compression.choose_encoding('gzip, br', carries_csrf_token)
+        return f'{coding} (CSRF token, padded)' if carries_csrf_token else coding
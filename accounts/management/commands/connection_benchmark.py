@@ -0,0 +1,92 @@
+import copy
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import load_backend
+
+from accounts.benchmarks import summarize_latencies
+
+DEFAULT_POOL = {'min_size': 1, 'max_size': 4}
+
+
+def make_connection(alias, pool):
+    """A standalone DatabaseWrapper for ``alias`` with or without a connection pool"""
+    settings_dict = copy.deepcopy(connections.settings[alias])
+    settings_dict['CONN_MAX_AGE'] = 0
+    settings_dict['OPTIONS'].pop('pool', None)
+    if pool:
+        settings_dict['OPTIONS']['pool'] = pool
+    backend = load_backend(settings_dict['ENGINE'])
+    # Pools are shared per alias, so the benchmark gets its own
+    return backend.DatabaseWrapper(settings_dict, f'{alias}-connection-benchmark-{"pool" if pool else "direct"}')
+
+
+def run_requests(alias, pool, iterations, query):
+    """Mimic requests: take a connection, run one query, release it; returns (seconds, connection)"""
+    connection = make_connection(alias, pool)
+    latencies = []
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(query)
+                cursor.fetchall()
+            # What request_finished does: closes, or hands the connection back to the pool
+            connection.close()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        connection.close()
+    return latencies, connection
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request connect overhead with and without the psycopg connection pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to connect to')
+        parser.add_argument('--iterations', type=int, default=200, help='Requests per thread and mode')
+        parser.add_argument('--threads', type=int, default=1, help='Concurrent threads per mode')
+        parser.add_argument('--query', default='SELECT 1', help='Query each simulated request runs')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        settings_dict = connections.settings[alias]
+        if connections[alias].vendor != 'postgresql':
+            raise CommandError('Connection pooling needs PostgreSQL with psycopg 3')
+        pool = settings_dict['OPTIONS'].get('pool') or DEFAULT_POOL
+        pool = dict(DEFAULT_POOL if pool is True else pool)
+        pool['max_size'] = max(pool.get('max_size', 1), options['threads'])
+
+        self.stdout.write(
+            f"{options['iterations']} request(s) on {options['threads']} thread(s) against "
+            f"{settings_dict['HOST'] or 'localhost'}:{settings_dict['PORT']}/{settings_dict['NAME']}"
+        )
+        results = {}
+        for mode, mode_pool in (('direct', None), ('pool', pool)):
+            with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+                runs = list(executor.map(
+                    lambda _index: run_requests(alias, mode_pool, options['iterations'], options['query']),
+                    range(options['threads']),
+                ))
+            latencies = [latency for run_latencies, _connection in runs for latency in run_latencies]
+            results[mode] = summarize_latencies(latencies)
+            if mode_pool:
+                connection = runs[0][1]
+                stats = connection.pool.get_stats()
+                connection.close_pool()
+                results[mode]['connections'] = stats.get('connections_num', 0)
+            else:
+                results[mode]['connections'] = len(latencies)
+            self.stdout.write(
+                f"  {mode:<7} p50 {results[mode]['p50_ms']:>8.3f} ms  p95 {results[mode]['p95_ms']:>8.3f} ms  "
+                f"p99 {results[mode]['p99_ms']:>8.3f} ms  mean {results[mode]['mean_ms']:>8.3f} ms  "
+                f"{results[mode]['connections']:>5} connection(s) opened"
+            )
+
+        saved = results['direct']['mean_ms'] - results['pool']['mean_ms']
+        self.stdout.write(self.style.SUCCESS(
+            f'Pooling saves {saved:.3f} ms per request '
+            f"({saved / results['direct']['mean_ms']:.0%} of the direct-connection time)"
+        ) if saved > 0 else self.style.WARNING('Pooling did not reduce per-request time'))
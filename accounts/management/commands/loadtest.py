@@ -0,0 +1,359 @@
+import asyncio
+import io
+import multiprocessing
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.middleware.csrf import CSRF_ALLOWED_CHARS
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from accounts.benchmarks import benchmark_host, summarize_latencies
+from categories.models import Category
+from transactions.models import Transaction
+
+User = get_user_model()
+
+LOADTEST_DESCRIPTION = '[loadtest]'
+EDIT_POOL_SIZE = 5
+CASHFLOW_PERIODS = ('year', '6months', '3months', 'month', 'week')
+
+
+def build_account(user, host):
+    """Session, CSRF token and ids a simulated user needs, as plain picklable data"""
+    client = Client(HTTP_HOST=host)
+    client.force_login(user)
+    categories = Category.objects.for_user(user)
+    expense_category = categories.expense_categories().values_list('id', flat=True).first()
+    if expense_category is None:
+        raise CommandError(f'User "{user.username}" has no expense categories')
+
+    # Edits only touch rows the load test owns, never the user's real data
+    today = timezone.now().date()
+    edit_pool = [
+        Transaction.objects.create(
+            user=user, category_id=expense_category, transaction_type='expense',
+            description=f'{LOADTEST_DESCRIPTION} edit {index}', amount=Decimal('10.00'),
+            currency=user.base_currency, date=today,
+        ).pk
+        for index in range(EDIT_POOL_SIZE)
+    ]
+    return {
+        'session': client.cookies[settings.SESSION_COOKIE_NAME].value,
+        'csrf': get_random_string(32, CSRF_ALLOWED_CHARS),
+        'expense_category': expense_category,
+        'currency': user.base_currency,
+        'category_ids': list(categories.values_list('id', flat=True)),
+        'pages': max(1, Transaction.objects.for_user(user).count() // 20),
+        'edit_pool': edit_pool,
+    }
+
+
+def is_error(action, status):
+    """Server and client errors, and writes that re-rendered their form instead of redirecting"""
+    return status >= 400 or (action in ('create', 'edit') and status != 302)
+
+
+def next_request(rng, account, mix):
+    """Pick the next (action, method, path, form data) for a simulated user"""
+    action = rng.choices(list(mix), weights=list(mix.values()))[0]
+    today = timezone.now().date()
+
+    if action == 'create':
+        return action, 'POST', reverse('transaction_create'), {
+            'transaction_type': 'expense',
+            'category': account['expense_category'],
+            'description': f'{LOADTEST_DESCRIPTION} create',
+            'amount': f'{rng.uniform(20, 500):.2f}',
+            'currency': account['currency'],
+            'date': (today - timedelta(days=rng.randint(0, 60))).isoformat(),
+            'notes': '',
+        }
+    if action == 'edit':
+        return action, 'POST', reverse('transaction_edit', args=[rng.choice(account['edit_pool'])]), {
+            'transaction_type': 'expense',
+            'category': account['expense_category'],
+            'description': f'{LOADTEST_DESCRIPTION} edit',
+            'amount': f'{rng.uniform(20, 500):.2f}',
+            'currency': account['currency'],
+            'date': today.isoformat(),
+            'notes': '',
+        }
+
+    page = rng.choices(
+        [
+            (reverse('dashboard'), {}),
+            (reverse('get_cashflow_data'), {'period': rng.choice(CASHFLOW_PERIODS)}),
+            (reverse('transaction_list'), {'page': rng.randint(1, account['pages'])}),
+            (reverse('transaction_list'), {'transaction_type': 'expense', 'period': 'month'}),
+            (reverse('transaction_list'), {'category': rng.choice(account['category_ids'])}),
+            (reverse('category_list'), {}),
+            (reverse('transaction_form_bootstrap'), {}),
+        ],
+        weights=[30, 20, 15, 10, 10, 5, 10],
+    )[0]
+    return action, 'GET', page[0] + ('?' + urlencode(page[1]) if page[1] else ''), None
+
+
+def call_wsgi(application, host, account, method, path, data):
+    """Run one request through the WSGI application; returns the status code"""
+    path, _, query_string = path.partition('?')
+    body = urlencode(data).encode() if data else b''
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '443',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': host,
+        'HTTP_ORIGIN': f'https://{host}',
+        'HTTP_COOKIE': f"{settings.SESSION_COOKIE_NAME}={account['session']}; "
+                       f"{settings.CSRF_COOKIE_NAME}={account['csrf']}",
+        'HTTP_X_CSRFTOKEN': account['csrf'],
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'https',
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    status = []
+
+    def start_response(status_line, headers, exc_info=None):
+        status.append(int(status_line.split(' ', 1)[0]))
+
+    response = application(environ, start_response)
+    try:
+        for _chunk in response:
+            pass
+    finally:
+        # Fires request_finished, which is what recycles DB connections
+        if hasattr(response, 'close'):
+            response.close()
+    return status[0]
+
+
+async def call_asgi(application, host, account, method, path, data):
+    """Run one request through the ASGI application; returns the status code"""
+    path, _, query_string = path.partition('?')
+    body = urlencode(data).encode() if data else b''
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'https',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string.encode(),
+        'root_path': '',
+        'headers': [
+            (b'host', host.encode()),
+            (b'origin', f'https://{host}'.encode()),
+            (b'cookie', f"{settings.SESSION_COOKIE_NAME}={account['session']}; "
+                        f"{settings.CSRF_COOKIE_NAME}={account['csrf']}".encode()),
+            (b'x-csrftoken', account['csrf'].encode()),
+            (b'content-type', b'application/x-www-form-urlencoded'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': (host, 443),
+    }
+    body_sent = False
+    status = []
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        # The client never disconnects; Django cancels this wait when the response is done
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+async def run_virtual_user_asgi(application, args):
+    """ASGI counterpart of run_virtual_user, sharing the event loop with the other users"""
+    host, account, mix, duration, think_time, seed = args
+    rng = random.Random(seed)
+    samples = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        action, method, path, data = next_request(rng, account, mix)
+        start = time.perf_counter()
+        try:
+            status = await call_asgi(application, host, account, method, path, data)
+        except Exception:
+            status = 599
+        samples.append((action, time.perf_counter() - start, status))
+        if think_time:
+            await asyncio.sleep(rng.expovariate(1 / think_time))
+    return samples
+
+
+def run_virtual_user(args):
+    """Send requests until the deadline; returns (action, seconds, status) samples"""
+    from CashFlow_Tracker.wsgi import application
+
+    host, account, mix, duration, think_time, seed = args
+    rng = random.Random(seed)
+    samples = []
+    deadline = time.perf_counter() + duration
+    try:
+        while time.perf_counter() < deadline:
+            action, method, path, data = next_request(rng, account, mix)
+            start = time.perf_counter()
+            try:
+                status = call_wsgi(application, host, account, method, path, data)
+            except Exception:
+                status = 599
+            samples.append((action, time.perf_counter() - start, status))
+            if think_time:
+                time.sleep(rng.expovariate(1 / think_time))
+    finally:
+        connections.close_all()
+    return samples
+
+
+def _run_virtual_users(batch):
+    # Runs one process worth of virtual users on threads
+    with ThreadPoolExecutor(max_workers=len(batch)) as executor:
+        return [sample for samples in executor.map(run_virtual_user, batch) for sample in samples]
+
+
+def _run_virtual_users_asgi(batch):
+    # Runs one process worth of virtual users as tasks on a single event loop
+    from CashFlow_Tracker.asgi import application
+
+    async def run_all():
+        results = await asyncio.gather(*[run_virtual_user_asgi(application, args) for args in batch])
+        return [sample for samples in results for sample in samples]
+
+    try:
+        return asyncio.run(run_all())
+    finally:
+        connections.close_all()
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        action, _, weight = part.partition('=')
+        if action not in ('browse', 'create', 'edit') or not weight:
+            raise CommandError(f'Invalid workload mix entry "{part}"')
+        mix[action] = float(weight)
+    return mix
+
+
+class Command(BaseCommand):
+    help = 'Run an in-process concurrent load test against the WSGI application'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,4,16',
+                            help='Comma separated numbers of simulated users to step through')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per concurrency step')
+        parser.add_argument('--accounts', type=int, default=8,
+                            help='Distinct accounts shared by the simulated users')
+        parser.add_argument('--mix', default='browse=80,create=12,edit=8',
+                            help='Workload weights for browse, create and edit')
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help='Mean pause between requests of one simulated user, in seconds')
+        parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi',
+                            help='Drive CashFlow_Tracker.wsgi or CashFlow_Tracker.asgi (set ASYNC_VIEWS=True '
+                                 'to serve the async dashboard and chart views)')
+        parser.add_argument('--mode', choices=('thread', 'process'), default='thread',
+                            help='Run simulated users in this process or spread over processes')
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                            help='Worker processes in process mode')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for the workload')
+
+    def handle(self, *args, **options):
+        try:
+            steps = [int(value) for value in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency must be a comma separated list of integers')
+        mix = parse_mix(options['mix'])
+
+        users = list(
+            User.objects.annotate(transaction_count=Count('transactions'))
+            .filter(transaction_count__gt=0)
+            .order_by('-transaction_count')[:options['accounts']]
+        )
+        if not users:
+            raise CommandError('No user with transactions found; run generate_synthetic_data first')
+
+        host = benchmark_host()
+        accounts = [build_account(user, host) for user in users]
+        self.stdout.write(
+            f"Load testing {len(accounts)} account(s) over {options['server'].upper()} in {options['mode']} mode, "
+            f"{options['duration']:.0f}s per step, mix {options['mix']}"
+        )
+        self.stdout.write(
+            f"  {'users':>5} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8}"
+        )
+
+        try:
+            for concurrency in steps:
+                args = [
+                    (host, accounts[index % len(accounts)], mix, options['duration'], options['think_time'],
+                     f"{options['seed']}-{concurrency}-{index}")
+                    for index in range(concurrency)
+                ]
+                started = time.perf_counter()
+                samples = self.run_step(args, options)
+                self.write_step(concurrency, samples, time.perf_counter() - started)
+        finally:
+            for alias in settings.SHARD_DATABASES:
+                Transaction.objects.using(alias).filter(description__startswith=LOADTEST_DESCRIPTION).delete()
+
+    def run_step(self, args, options):
+        run_batch = _run_virtual_users_asgi if options['server'] == 'asgi' else _run_virtual_users
+        if options['mode'] == 'thread':
+            return run_batch(args)
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        processes = max(1, min(options['processes'], len(args)))
+        batches = [args[index::processes] for index in range(processes)]
+        with multiprocessing.Pool(processes) as pool:
+            return [sample for samples in pool.map(run_batch, batches) for sample in samples]
+
+    def write_step(self, concurrency, samples, elapsed):
+        summary = summarize_latencies([latency for _action, latency, _status in samples])
+        errors = sum(1 for action, _latency, status in samples if is_error(action, status))
+        error_rate = errors / len(samples) * 100 if samples else 0.0
+        self.stdout.write(
+            f"  {concurrency:>5} {len(samples):>9} {len(samples) / elapsed:>9.1f} {summary['p50_ms']:>9.1f} "
+            f"{summary['p95_ms']:>9.1f} {summary['p99_ms']:>9.1f} {error_rate:>7.2f}%"
+        )
+        for action in ('browse', 'create', 'edit'):
+            latencies = [latency for name, latency, _status in samples if name == action]
+            if latencies:
+                action_summary = summarize_latencies(latencies)
+                self.stdout.write(
+                    f"        {action:<7} {len(latencies):>7} requests  p50 {action_summary['p50_ms']:.1f} ms  "
+                    f"p95 {action_summary['p95_ms']:.1f} ms"
+                )
@@ -0,0 +1,155 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction as db_transaction
+
+from accounts.caching import bump_data_version
+from accounts.models import UserShard
+from CashFlow_Tracker.sharding import copy_users_to_shard, get_shard_entry
+from categories.models import Budget, Category, CategoryStats
+from transactions.models import RecurringTransaction, Transaction
+
+User = get_user_model()
+
+# Ids per IN (...) when looking for clashes on the target, within SQLite's parameter limit
+CHECK_BATCH_SIZE = 500
+
+COPIED_MODELS = [Category, Budget, CategoryStats, RecurringTransaction, Transaction]
+
+
+@contextmanager
+def keep_timestamps(*models):
+    """Let bulk_create write the copied created_at/updated_at instead of now()"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = "Move a user's categories and transactions to another shard while the site stays up"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('target', help=f'Target database alias ({", ".join(settings.SHARD_DATABASES)})')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert')
+        parser.add_argument('--grace', type=float, default=5.0,
+                            help='Seconds to wait after blocking writes so in-flight requests finish')
+
+    def handle(self, *args, **options):
+        target = options['target']
+        if target not in settings.SHARD_DATABASES:
+            raise CommandError(f'Unknown shard "{target}"; configured: {", ".join(settings.SHARD_DATABASES)}')
+        try:
+            user = User.objects.using(DEFAULT_DB_ALIAS).get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'User "{options["username"]}" does not exist')
+
+        source, status = get_shard_entry(user)
+        if status == UserShard.STATUS_MOVING:
+            raise CommandError(f'User "{user.username}" is already being moved')
+        if source == target:
+            raise CommandError(f'User "{user.username}" is already on {target}')
+        if Category.objects.using(target).filter(user_id=user.pk).exists():
+            raise CommandError(f'{target} already holds categories of "{user.username}"; clean it up first')
+
+        # Reads keep working from the source; writes get a 503 until the directory flips
+        UserShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+            user=user, defaults={'database': source, 'status': UserShard.STATUS_MOVING},
+        )
+        self.stdout.write(f'Writes for {user.username} are paused; moving {source} -> {target}')
+        time.sleep(options['grace'])
+
+        try:
+            categories, transactions = self.copy(user, source, target, options['batch_size'])
+        except Exception:
+            self.discard_copy(user, target)
+            UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user=user).update(status=UserShard.STATUS_ACTIVE)
+            raise
+
+        UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user=user).update(
+            database=target, status=UserShard.STATUS_ACTIVE,
+        )
+        bump_data_version(user.pk)
+        self.stdout.write(f'Directory now points {user.username} at {target}; removing the old copy')
+
+        self.discard_copy(user, source)
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {categories} categories and {transactions} transactions of {user.username} to {target}'
+        ))
+
+    def copy(self, user, source, target, batch_size):
+        copy_users_to_shard([user], target)
+        source_categories = list(Category.objects.using(source).filter(user_id=user.pk))
+        source_transactions = Transaction.objects.using(source).filter(user_id=user.pk).order_by('pk')
+        self.check_free_ids(user, source, target)
+
+        # Rows keep their ids, so links, bookmarks and cached ids stay valid after the move
+        with keep_timestamps(Category, Budget, RecurringTransaction, Transaction), db_transaction.atomic(using=target):
+            Category.objects.using(target).bulk_create(source_categories, batch_size=batch_size)
+            for model in (Budget, CategoryStats, RecurringTransaction):
+                model.objects.using(target).bulk_create(
+                    list(model.objects.using(source).filter(user_id=user.pk)), batch_size=batch_size,
+                )
+
+            copied = 0
+            batch = []
+            for row in source_transactions.iterator(chunk_size=batch_size):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    Transaction.objects.using(target).bulk_create(batch)
+                    copied += len(batch)
+                    batch = []
+            if batch:
+                Transaction.objects.using(target).bulk_create(batch)
+                copied += len(batch)
+
+            expected = source_transactions.count()
+            if copied != expected:
+                raise CommandError(f'Copied {copied} transactions but the source has {expected}; aborting')
+            self.reset_sequences(target)
+        return len(source_categories), copied
+
+    def check_free_ids(self, user, source, target):
+        """Refuse the move when the target already uses one of the user's ids for another row"""
+        for model in COPIED_MODELS:
+            ids = list(model.objects.using(source).filter(user_id=user.pk).values_list('pk', flat=True))
+            taken = [
+                pk for start in range(0, len(ids), CHECK_BATCH_SIZE)
+                for pk in model.objects.using(target).filter(pk__in=ids[start:start + CHECK_BATCH_SIZE])
+                .values_list('pk', flat=True)
+            ][:5]
+            if taken:
+                raise CommandError(
+                    f'{target} already has {model._meta.verbose_name_plural} with ids {taken}; '
+                    f'shards need disjoint id ranges to move users between them'
+                )
+
+    def reset_sequences(self, alias):
+        """Move the target's id sequences past the copied ids (PostgreSQL; SQLite follows the max id itself)"""
+        connection = connections[alias]
+        statements = connection.ops.sequence_reset_sql(no_style(), COPIED_MODELS)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def discard_copy(self, user, alias):
+        # Through the ORM so cascades and signals run; the budgets and stats go with their categories
+        Transaction.objects.using(alias).filter(user_id=user.pk).delete()
+        RecurringTransaction.objects.using(alias).filter(user_id=user.pk).delete()
+        Category.objects.using(alias).filter(user_id=user.pk).delete()
+        if alias != DEFAULT_DB_ALIAS:
+            User.objects.using(alias).filter(pk=user.pk).delete()
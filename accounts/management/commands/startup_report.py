@@ -0,0 +1,93 @@
+import statistics
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from CashFlow_Tracker.startup import measure_cold_start
+
+ENTRY_POINTS = {
+    'wsgi': 'CashFlow_Tracker.wsgi',
+    'asgi': 'CashFlow_Tracker.asgi',
+}
+PROJECT_PACKAGES = {'CashFlow_Tracker', 'accounts', 'categories', 'transactions'}
+
+
+def import_group(module):
+    """Bucket a module by project app, Django component, third-party package or stdlib"""
+    parts = module.split('.')
+    if parts[0] in PROJECT_PACKAGES:
+        return f'app: {parts[0]}'
+    if parts[0] == 'django':
+        depth = 3 if len(parts) > 2 and parts[1] == 'contrib' else 2
+        return 'django: ' + '.'.join(parts[:depth])
+    if parts[0].lstrip('_') in sys.stdlib_module_names or parts[0] in sys.builtin_module_names:
+        return 'stdlib'
+    return f'third-party: {parts[0]}'
+
+
+class Command(BaseCommand):
+    help = 'Measure cold-start time of the WSGI/ASGI entry point and break import time down per module and app'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entry-point', choices=ENTRY_POINTS, default='wsgi', help='Entry point to import')
+        parser.add_argument('--profile', choices=('development', 'production', 'both'), default='both',
+                            help='DJANGO_PROFILE to start with (default: compare both)')
+        parser.add_argument('--path', default='/login/', help='Path of the first request')
+        parser.add_argument('--runs', type=int, default=5, help='Cold starts per profile; the median is reported')
+        parser.add_argument('--top', type=int, default=20, help='Number of slowest modules and groups to list')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1')
+        profiles = ('development', 'production') if options['profile'] == 'both' else (options['profile'],)
+        entry_point = ENTRY_POINTS[options['entry_point']]
+
+        summaries = {}
+        for profile in profiles:
+            env = {'DJANGO_PROFILE': profile}
+            try:
+                runs = [measure_cold_start(entry_point, options['path'], env)[0] for _ in range(options['runs'])]
+                _phases, imports = measure_cold_start(entry_point, options['path'], env, importtime=True)
+            except RuntimeError as exc:
+                raise CommandError(str(exc))
+            summaries[profile] = {
+                key: statistics.median(phases[key] for phases in runs)
+                for key in ('import_ms', 'first_request_ms', 'total_ms', 'modules')
+            }
+            self.write_imports(profile, imports, options['top'])
+
+        self.stdout.write(f'\nCold start of {entry_point} (median of {options["runs"]} run(s), first request {options["path"]})')
+        self.stdout.write(f'  {"profile":<12} {"import ms":>10} {"1st req ms":>11} {"total ms":>10} {"modules":>8}')
+        for profile, summary in summaries.items():
+            self.stdout.write(
+                f'  {profile:<12} {summary["import_ms"]:>10.1f} {summary["first_request_ms"]:>11.1f} '
+                f'{summary["total_ms"]:>10.1f} {summary["modules"]:>8.0f}'
+            )
+        if len(summaries) == 2:
+            development, production = summaries['development'], summaries['production']
+            self.stdout.write(
+                f"  production vs development: total {production['total_ms'] - development['total_ms']:+.1f} ms, "
+                f"first request {production['first_request_ms'] - development['first_request_ms']:+.1f} ms"
+            )
+
+    def write_imports(self, profile, imports, top):
+        total_us = sum(self_us for _module, self_us, _cumulative, _depth in imports)
+        groups = defaultdict(int)
+        for module, self_us, _cumulative, _depth in imports:
+            groups[import_group(module)] += self_us
+
+        self.stdout.write(f'\n[{profile}] {len(imports)} modules imported in {total_us / 1000:.1f} ms')
+        self.stdout.write('  By app / package (self time):')
+        for group, group_us in sorted(groups.items(), key=lambda item: item[1], reverse=True)[:top]:
+            self.stdout.write(f'    {group:<45} {group_us / 1000:>8.1f} ms  {group_us / total_us:>6.1%}')
+
+        self.stdout.write('  Slowest modules (self / cumulative):')
+        for module, self_us, cumulative_us, _depth in sorted(imports, key=lambda item: item[1], reverse=True)[:top]:
+            self.stdout.write(f'    {module:<45} {self_us / 1000:>8.1f} ms {cumulative_us / 1000:>8.1f} ms')
+
+        project = [entry for entry in imports if entry[0].split('.')[0] in PROJECT_PACKAGES]
+        if project:
+            self.stdout.write('  Project modules (cumulative):')
+            for module, _self_us, cumulative_us, _depth in sorted(project, key=lambda item: item[2], reverse=True):
+                self.stdout.write(f'    {module:<45} {cumulative_us / 1000:>8.1f} ms')
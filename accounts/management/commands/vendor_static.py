@@ -0,0 +1,96 @@
+import posixpath
+import re
+from pathlib import Path
+from urllib.parse import urljoin
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Pinned front-end libraries, by path under statics/ (what {% static %} resolves)
+VENDOR_ASSETS = {
+    'vendor/bootstrap/css/bootstrap.min.css':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'vendor/bootstrap/js/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/fontawesome/css/all.min.css':
+        'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css',
+    'vendor/chartjs/chart.umd.js':
+        'https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.js',
+}
+
+# Files a stylesheet or script pulls in (fonts, source maps); the manifest storage
+# rewrites these references, so collectstatic fails when one is missing
+SOURCE_MAP_PATTERN = re.compile(r'(?m)^/[/*]# sourceMappingURL=(?P<url>[-\w.]+)')
+REFERENCE_PATTERNS = {
+    '.css': (re.compile(r'''url\(\s*['"]?(?P<url>[^'")]+?)['"]?\s*\)'''), SOURCE_MAP_PATTERN),
+    '.js': (SOURCE_MAP_PATTERN,),
+}
+
+
+def referenced_files(name, content):
+    """Relative paths (without query or fragment) a vendored CSS/JS file references"""
+    text = content.decode('utf-8', errors='ignore')
+    found = []
+    for pattern in REFERENCE_PATTERNS.get(posixpath.splitext(name)[1], ()):
+        for match in pattern.finditer(text):
+            url = match.group('url').strip()
+            if url.startswith(('data:', '#', '/')) or '//' in url:
+                continue
+            path = re.split(r'[?#]', url)[0]
+            if path and path not in found:
+                found.append(path)
+    return found
+
+
+class Command(BaseCommand):
+    help = 'Download the pinned Bootstrap, Font Awesome and Chart.js files (with their fonts and source maps) into statics/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only verify the vendored files exist (used by build_files.sh)')
+        parser.add_argument('--force', action='store_true', help='Download again even if the file exists')
+
+    def handle(self, *args, **options):
+        root = Path(settings.STATICFILES_DIRS[0])
+
+        if options['check']:
+            missing = [name for name in self.expected_files(root) if not (root / name).exists()]
+            if missing:
+                raise CommandError(
+                    'Missing vendored static files (run "python manage.py vendor_static"): ' + ', '.join(missing)
+                )
+            self.stdout.write(self.style.SUCCESS(f'All vendored static files present in {root}'))
+            return
+
+        for name, url in VENDOR_ASSETS.items():
+            content = self.fetch(root / name, url, options['force'])
+            for reference in referenced_files(name, content):
+                self.fetch(
+                    root / posixpath.normpath(posixpath.join(posixpath.dirname(name), reference)),
+                    urljoin(url, reference),
+                    options['force'],
+                )
+        self.stdout.write(self.style.SUCCESS(f'Vendored {len(VENDOR_ASSETS)} libraries into {root / "vendor"}'))
+
+    def expected_files(self, root):
+        """Vendored paths, including whatever the already downloaded files reference"""
+        for name in VENDOR_ASSETS:
+            yield name
+            path = root / name
+            if path.exists():
+                for reference in referenced_files(name, path.read_bytes()):
+                    yield posixpath.normpath(posixpath.join(posixpath.dirname(name), reference))
+
+    def fetch(self, path, url, force):
+        if path.exists() and not force:
+            return path.read_bytes()
+        try:
+            with urlopen(url, timeout=30) as response:
+                content = response.read()
+        except OSError as exc:
+            raise CommandError(f'Could not download {url}: {exc}')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        self.stdout.write(f'  {path.relative_to(settings.BASE_DIR)} ({len(content) / 1024:.1f} KiB)')
+        return content
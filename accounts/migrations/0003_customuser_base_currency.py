@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_usershard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='base_currency',
+            field=models.CharField(choices=[('THB', 'บาท (THB)'), ('USD', 'ดอลลาร์สหรัฐ (USD)')], default='THB', max_length=3),
+        ),
+    ]
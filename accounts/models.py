@@ -1,10 +1,14 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from transactions.currency import CURRENCY_CHOICES, PIVOT_CURRENCY
+
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
     phone_number = models.CharField(max_length=15, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Dashboard and chart totals are converted to this currency
+    base_currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=PIVOT_CURRENCY)
 
     groups = models.ManyToManyField(
         'auth.Group',
@@ -20,3 +24,26 @@ class CustomUser(AbstractUser):
     # ให้กลับมาใช้ username เป็นตัวล็อกอินหลัก
     USERNAME_FIELD = 'username'
     REQUIRED_FIELDS = ['email']
+
+
+class UserShard(models.Model):
+    """Directory entry: the database holding a user's categories and transactions"""
+    STATUS_ACTIVE = 'active'
+    STATUS_MOVING = 'moving'
+    STATUS_CHOICES = [
+        (STATUS_ACTIVE, 'Active'),
+        (STATUS_MOVING, 'Moving'),
+    ]
+
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='shard')
+    database = models.CharField(max_length=100)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['database']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.database} ({self.status})"
@@ -0,0 +1,18 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from CashFlow_Tracker.sharding import assign_shards
+from .backends import invalidate_cached_user
+from .models import CustomUser
+
+@receiver(post_save, sender=CustomUser)
+def assign_shard_on_create(sender, instance, created, using, **kwargs):
+    """Place new users on a shard (copies of the user row saved on a shard are skipped)"""
+    if created and using == DEFAULT_DB_ALIAS:
+        assign_shards([instance])
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user_on_change(sender, instance, **kwargs):
+    """Profile, password and is_active changes must reach the next request (see CachedModelBackend)"""
+    invalidate_cached_user(instance.pk)
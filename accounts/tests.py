@@ -1,3 +1,586 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from inspect import iscoroutinefunction
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.caching import bump_data_version, get_data_version
+from accounts import views
+from accounts.backends import invalidate_cached_user
+from accounts.management.commands.loadtest import is_error
+from accounts.management.commands.vendor_static import VENDOR_ASSETS
+from accounts.models import UserShard
+from accounts.views import dashboard_stats_cache_key, get_dashboard_stats
+from categories.models import Category
+from CashFlow_Tracker.db_routers import PRIMARY_STICKY_COOKIE
+from CashFlow_Tracker.metrics import RequestMetrics, _current_request, registry, render_metrics, request_execute_wrapper
+from CashFlow_Tracker.sharding import copy_users_to_shard, shard_for_user
+from CashFlow_Tracker.startup import measure_cold_start
+from CashFlow_Tracker.storage import minify_css, minify_js
+from transactions.models import Transaction
+
+User = get_user_model()
+
+DEV_ONLY_MODULES = ('django_extensions', 'dotenv', 'cProfile', 'pstats')
+# Imported by the views that need them, never at startup
+LAZY_MODULES = ('numpy', 'transactions.analytics', 'transactions.reports')
+
+
+class ColdStartTests(SimpleTestCase):
+    """The production profile must keep the serverless cold start lean"""
+
+    def imported_modules(self, profile):
+        phases, imports = measure_cold_start(env={'DJANGO_PROFILE': profile}, importtime=True)
+        self.assertEqual(phases['status'], 200)
+        imported = {module for module, _self_us, _cumulative_us, _depth in imports}
+        return imported | {module.split('.')[0] for module in imported}
+
+    def test_production_skips_dev_only_modules(self):
+        production = self.imported_modules('production')
+        for module in DEV_ONLY_MODULES + LAZY_MODULES:
+            self.assertNotIn(module, production)
+
+        development = self.imported_modules('development')
+        self.assertLess(len(production), len(development))
+
+
+# The file cache stands in for Redis/Memcached: every process on the machine reads the same entries
+SHARED_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': os.path.join(tempfile.gettempdir(), 'cashflow-shared-cache-tests'),
+}}
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db', SHARED_CACHE=True, CACHES=SHARED_CACHES)
+class CachedSessionAndUserTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cached-user', password='secret-1')
+        self.client.login(username='cached-user', password='secret-1')
+        self.client.get(reverse('category_list'))
+
+    def test_session_and_user_come_from_the_cache(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('category_list'))
+        self.assertEqual(response.status_code, 200)
+        tables = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('django_session', tables)
+        self.assertNotIn('accounts_customuser', tables)
+
+    def test_password_change_ends_other_sessions(self):
+        self.user.set_password('secret-2')
+        self.user.save()
+        response = self.client.get(reverse('category_list'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_invalidation_reaches_other_processes(self):
+        # Another worker process changes the password and drops the cached user
+        User.objects.filter(pk=self.user.pk).update(password=make_password('secret-2'))
+        self.assertEqual(self.client.get(reverse('category_list')).status_code, 200)
+        worker = multiprocessing.get_context('fork').Process(target=invalidate_cached_user, args=(self.user.pk,))
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(self.client.get(reverse('category_list')).status_code, 302)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db', SHARED_CACHE=False)
+    def test_without_a_shared_cache_the_user_comes_from_the_database(self):
+        self.client.login(username='cached-user', password='secret-1')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('category_list'))
+        self.assertIn('accounts_customuser', ' '.join(query['sql'] for query in queries))
+
+
+class DashboardFragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='fragments', password='x')
+        Category.objects.create_defaults([self.user])
+        category = Category.objects.for_user(self.user).expense_categories().first()
+        self.transaction = Transaction.objects.create(
+            user=self.user, category=category, description='ค่ารถไฟ', amount='45.00', transaction_type='expense',
+            date=timezone.now().date(),
+        )
+        self.client.force_login(self.user)
+
+    def test_bumping_the_data_version_invalidates_the_fragment(self):
+        self.assertContains(self.client.get(reverse('dashboard')), 'ค่ารถไฟ')
+
+        # A queryset update sends no signal, so the cached fragment is still served
+        Transaction.objects.for_user(self.user).filter(pk=self.transaction.pk).update(description='ค่าแท็กซี่')
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'ค่ารถไฟ')
+        self.assertNotContains(response, 'ค่าแท็กซี่')
+
+        bump_data_version(self.user.id)
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'ค่าแท็กซี่')
+        self.assertNotContains(response, 'ค่ารถไฟ')
+
+
+METRICS_CACHES = {'default': {'BACKEND': 'CashFlow_Tracker.metrics.InstrumentedLocMemCache', 'LOCATION': 'metrics-tests'}}
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_TOKEN='scrape-token', CACHES=METRICS_CACHES)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.user = User.objects.create_user(username='metrics', password='x')
+        Category.objects.create_defaults([self.user])
+        self.client.force_login(self.user)
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode()
+
+    def test_prometheus_exposition_format(self):
+        self.client.get(reverse('category_list'))
+        metrics = self.scrape()
+        self.assertIn('# TYPE cashflow_request_duration_seconds histogram', metrics)
+        self.assertIn('cashflow_request_db_queries_bucket{view="category_list",le="+Inf"} 1', metrics)
+        self.assertIn('cashflow_request_db_queries_count{view="category_list"} 1', metrics)
+        self.assertRegex(metrics, r'cashflow_response_size_bytes_sum\{view="category_list"\} \d+')
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+    @override_settings(METRICS_QUERY_BUDGETS={'category_list': 1})
+    def test_exceeding_the_query_budget_logs_a_warning(self):
+        with self.assertLogs('CashFlow_Tracker.metrics', 'WARNING') as logs:
+            self.client.get(reverse('category_list'))
+        self.assertIn('View category_list ran', logs.output[0])
+        self.assertIn('cashflow_query_budget_exceeded_total{view="category_list"} 1', self.scrape())
+
+    def test_every_cache_read_is_counted(self):
+        request_metrics = RequestMetrics()
+        token = _current_request.set(request_metrics)
+        try:
+            cache.set('present', 1)
+            cache.get_many(['present', 'absent-1', 'absent-2'])
+            cache.get_or_set('created', 2)
+            cache.get_or_set('created', 3)
+            cache.has_key('present')
+            cache.get('absent-3')
+        finally:
+            _current_request.reset(token)
+        self.assertEqual((request_metrics.cache_hits, request_metrics.cache_misses), (3, 4))
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_INLINE=False)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.staff = User.objects.create_user(username='staff', email='staff@example.com', password='x', is_staff=True)
+        self.member = User.objects.create_user(username='member', email='member@example.com', password='x')
+
+    def test_staff_report_is_written_and_listed(self):
+        self.client.force_login(self.staff)
+        with self.settings(PROFILING_DIR=self.directory):
+            response = self.client.get(reverse('category_list'), HTTP_X_PROFILE='1')
+            name = response['X-Profile-Report']
+            self.assertTrue(os.path.isfile(os.path.join(self.directory, name)))
+            self.assertTrue(os.path.isfile(os.path.join(self.directory, name.replace('.txt', '.prof'))))
+
+            listing = self.client.get(reverse('profile_list'))
+            self.assertContains(listing, name)
+            report = self.client.get(reverse('profile_detail', args=[name]))
+            self.assertContains(report, 'View: category_list')
+
+    def test_other_users_are_neither_profiled_nor_shown_reports(self):
+        self.client.force_login(self.member)
+        with self.settings(PROFILING_DIR=self.directory):
+            response = self.client.get(reverse('category_list'), HTTP_X_PROFILE='1')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Profile-Report', response)
+            self.assertEqual(os.listdir(self.directory), [])
+
+            self.assertEqual(self.client.get(reverse('profile_list')).status_code, 302)
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='benchmarked', password='x')
+        Category.objects.create_defaults([self.user])
+        category = Category.objects.for_user(self.user).expense_categories().first()
+        Transaction.objects.create(
+            user=self.user, category=category, description='x', amount='10.00', transaction_type='expense',
+            date=timezone.now().date(),
+        )
+        self.baseline = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+
+    def benchmark(self, **options):
+        output = StringIO()
+        call_command(
+            'benchmark', user='benchmarked', scenario=['category_api_list_expense'], iterations=2, warmup=0,
+            baseline=self.baseline, stdout=output, **options,
+        )
+        return output.getvalue()
+
+    def rewrite_baseline(self, **changes):
+        with open(self.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        baseline['scenarios']['category_api_list_expense'].update(changes)
+        with open(self.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(baseline, baseline_file)
+
+    def test_regressions_against_the_baseline_are_detected(self):
+        self.benchmark(save_baseline=True)
+        self.rewrite_baseline(p95_ms=1e6, peak_memory_kb=1e6)
+        self.assertIn('No regressions against the baseline', self.benchmark(fail_on_regression=True))
+
+        self.rewrite_baseline(queries=0, p95_ms=0.001)
+        with self.assertRaisesMessage(CommandError, '2 performance regression(s)'):
+            self.benchmark(fail_on_regression=True)
+        # Without --fail-on-regression the same run only reports them
+        output = self.benchmark()
+        self.assertIn('category_api_list_expense: queries 0 ->', output)
+        self.assertIn('category_api_list_expense: p95_ms 0.001 ->', output)
+
+
+    def test_create_scenario_must_save_its_transaction(self):
+        output = StringIO()
+        call_command(
+            'benchmark', user='benchmarked', scenario=['transaction_create'], iterations=2, warmup=0,
+            baseline=self.baseline, stdout=output,
+        )
+        self.assertIn('transaction_create', output.getvalue())
+        self.assertEqual(Transaction.objects.for_user(self.user).count(), 1)
+
+        # A foreign base currency without any rate makes the form reject the POST
+        User.objects.filter(pk=self.user.pk).update(base_currency='USD')
+        with self.assertRaisesMessage(CommandError, 'did not redirect (200)'):
+            call_command(
+                'benchmark', user='benchmarked', scenario=['transaction_create'], iterations=1, warmup=0,
+                baseline=self.baseline, stdout=StringIO(),
+            )
+
+    def test_loadtest_counts_rejected_writes_as_errors(self):
+        self.assertFalse(is_error('create', 302))
+        self.assertTrue(is_error('create', 200))
+        self.assertTrue(is_error('edit', 200))
+        self.assertFalse(is_error('browse', 200))
+        self.assertTrue(is_error('browse', 500))
+
+class VendorStaticTests(SimpleTestCase):
+    def test_templates_load_front_end_libraries_from_statics(self):
+        referenced = set()
+        for template_dir in settings.TEMPLATES[0]['DIRS']:
+            for path in Path(template_dir).rglob('*.html'):
+                source = path.read_text(encoding='utf-8')
+                self.assertNotRegex(source, r'cdn\.jsdelivr\.net|cdnjs\.cloudflare\.com', path.name)
+                referenced.update(re.findall(r"{% static '(vendor/[^']+)' %}", source))
+        self.assertTrue(referenced)
+        self.assertLessEqual(referenced, set(VENDOR_ASSETS))
+
+
+class MinifyTests(SimpleTestCase):
+    def test_js_keeps_string_template_and_regex_literals(self):
+        source = (
+            '// header\n'
+            'function describe(name) {\n'
+            '    /* block */\n'
+            '    const url = "https://example.com//path"; // trailing\n'
+            '    const text = `line one\n'
+            '        // not a comment\n'
+            '    ${name + `/* nested */`} three`;\n'
+            '    const slashes = /\\/\\/[/]+/g;\n'
+            '    return url.replace(slashes, \'/\') / 2;\n'
+            '}\n'
+        )
+        self.assertEqual(minify_js(source), (
+            'function describe(name) {\n'
+            'const url = "https://example.com//path";\n'
+            'const text = `line one\n'
+            '        // not a comment\n'
+            '    ${name + `/* nested */`} three`;\n'
+            'const slashes = /\\/\\/[/]+/g;\n'
+            'return url.replace(slashes, \'/\') / 2;\n'
+            '}'
+        ))
+        self.assertEqual(minify_js(minify_js(source)), minify_js(source))
+
+    def test_css_keeps_strings(self):
+        source = '/* header */\n.card  >  .title {\n    content: "/* kept */  a";\n    font-family: \'Sarabun\',  sans-serif;\n}\n'
+        self.assertEqual(
+            minify_css(source), '.card>.title{content: "/* kept */  a";font-family: \'Sarabun\',sans-serif;}',
+        )
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='compressed', password='x')
+        Category.objects.create_defaults([self.user])
+        self.client.force_login(self.user)
+
+    def test_json_and_html_are_gzipped(self):
+        for path in (reverse('category_api_list'), reverse('transaction_list')):
+            response = self.client.get(path, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip', path)
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_login_page_is_never_compressed(self):
+        self.client.logout()
+        response = self.client.get(reverse('login'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class BackfillAggregatesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='backfill', password='x')
+        Category.objects.create_defaults([self.user])
+        today = timezone.now().date()
+        for category in Category.objects.for_user(self.user)[:4]:
+            Transaction.objects.create(
+                user=self.user, category=category, description=category.name, amount='125.50',
+                transaction_type=category.category_type, date=today,
+            )
+        self.suffix = f"dashboard_{today.strftime('%Y%m%d')}"
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+
+    def backfill(self, **options):
+        output = StringIO()
+        call_command('backfill_aggregates', checkpoint=self.checkpoint, stdout=output, **options)
+        with open(self.checkpoint, encoding='utf-8') as checkpoint:
+            return output.getvalue(), json.load(checkpoint)
+
+    def test_recomputed_numbers_match_the_views(self):
+        output, state = self.backfill()
+        self.assertEqual(state['mismatched_user_ids'], [])
+        self.assertTrue(state['finished'])
+        self.assertIn('0 with mismatches', output)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_stale_cached_stats_are_reported_and_repaired(self):
+        stats = get_dashboard_stats(self.user, self.suffix)
+        stale_key = dashboard_stats_cache_key(self.user.pk, self.suffix, stats['data_version'])
+        cache.set(stale_key, {**stats, 'total_income': stats['total_income'] + 1})
+
+        output, state = self.backfill(repair=True)
+
+        self.assertIn('total_income', output)
+        self.assertEqual(state['mismatched_user_ids'], [self.user.pk])
+        self.assertEqual(state['repaired'], 1)
+        fresh = cache.get(dashboard_stats_cache_key(self.user.pk, self.suffix, get_data_version(self.user.pk)))
+        self.assertEqual(fresh['total_income'], stats['total_income'])
+
+    def test_cache_steps_need_a_shared_cache(self):
+        stats = get_dashboard_stats(self.user, self.suffix)
+        stale_key = dashboard_stats_cache_key(self.user.pk, self.suffix, stats['data_version'])
+        cache.set(stale_key, {**stats, 'total_income': stats['total_income'] + 1})
+
+        output, state = self.backfill(repair=True)
+        self.assertIn('skipping the cached stats comparison', output)
+        self.assertEqual(state['mismatched_user_ids'], [])
+        with self.assertRaisesMessage(CommandError, '--warm needs a cache shared'):
+            self.backfill(warm=True, restart=True)
+
+    def test_unfinished_run_resumes_after_the_checkpoint(self):
+        with open(self.checkpoint, 'w', encoding='utf-8') as checkpoint:
+            json.dump({'year': timezone.now().year, 'last_user_id': self.user.pk, 'checked': 7, 'repaired': 0,
+                       'mismatched_user_ids': [], 'finished': False}, checkpoint)
+        _output, state = self.backfill()
+        self.assertEqual(state['checked'], 7)
+
+
+@skipUnless(connection.settings_dict['OPTIONS'].get('pool'), 'Needs PostgreSQL with DB_POOL=True')
+class ConnectionPoolTests(TestCase):
+    def test_connections_come_from_the_pool(self):
+        self.assertEqual(connection.settings_dict['CONN_MAX_AGE'], 0)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        stats = connection.pool.get_stats()
+        self.assertGreaterEqual(stats['pool_size'], 1)
+
+    def test_pool_stats_are_exported(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        metrics = render_metrics()
+        self.assertIn('cashflow_db_pool_pool_size{database="default"}', metrics)
+        self.assertIn('cashflow_db_pool_requests_wait_ms{database="default"}', metrics)
+
+
+class AsyncViewTests(TransactionTestCase):
+    # Committed rows, so the async views' worker threads (own connections) can see them
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='async-test', password='x')
+        Category.objects.create_defaults([self.user])
+        expense = Category.objects.for_user(self.user).expense_categories().first()
+        income = Category.objects.for_user(self.user).income_categories().first()
+        today = timezone.now().date()
+        for index, (category, amount, transaction_type) in enumerate((
+            (income, '30000.00', 'income'), (expense, '120.00', 'expense'), (expense, '85.50', 'expense'),
+        )):
+            Transaction.objects.create(
+                user=self.user, category=category, description=f'รายการ {index}', amount=amount,
+                transaction_type=transaction_type, date=today - timedelta(days=index),
+            )
+        self.factory = RequestFactory()
+
+    def call(self, view, path, data=None):
+        """Call a view directly and return (response, queries it ran on any thread)"""
+        request = self.factory.get(path, data or {})
+        request.user = self.user
+
+        async def auser():
+            return self.user
+        request.auser = auser
+        request_metrics = RequestMetrics()
+        cache.clear()
+        with request_execute_wrapper(request_metrics):
+            response = async_to_sync(view)(request) if iscoroutinefunction(view) else view(request)
+        return response, request_metrics.queries
+
+    def test_dashboard_matches_the_sync_view(self):
+        sync_response, sync_queries = self.call(views.dashboard, '/')
+        async_response, async_queries = self.call(views.dashboard_async, '/')
+        csrf_token = re.compile(r'name="csrfmiddlewaretoken" value="[^"]+"')
+        self.assertEqual(
+            csrf_token.sub('', async_response.content.decode()), csrf_token.sub('', sync_response.content.decode()),
+        )
+        self.assertEqual(async_queries, sync_queries)
+
+    def test_cashflow_matches_the_sync_view_in_one_aggregate(self):
+        for period in ('year', '6months', '3months', 'month', 'week'):
+            sync_response, sync_queries = self.call(views.get_cashflow_data, '/', {'period': period})
+            async_response, async_queries = self.call(views.get_cashflow_data_async, '/', {'period': period})
+            self.assertEqual(async_response.content, sync_response.content, period)
+            self.assertEqual(async_queries, sync_queries, period)
+            # The aggregate, and on a cold cache the check for rows needing conversion
+            self.assertEqual(async_queries, 2, period)
+
+    def test_concurrent_queries_are_bounded(self):
+        lock = threading.Lock()
+        running = []
+        peak = []
+
+        def slow_query(execute, sql, params, many, context):
+            with lock:
+                running.append(sql)
+                peak.append(len(running))
+            try:
+                time.sleep(0.02)
+                return execute(sql, params, many, context)
+            finally:
+                with lock:
+                    running.remove(sql)
+
+        with request_execute_wrapper(slow_query):
+            self.call(views.dashboard_async, '/')
+        self.assertGreater(max(peak), 1)
+        self.assertLessEqual(max(peak), settings.ASYNC_QUERY_CONCURRENCY)
+
+
+@skipUnless(settings.REPLICA_DATABASE, 'Needs DB_REPLICA_NAME or DB_REPLICA_HOST')
+class ReplicaRoutingTests(TransactionTestCase):
+    # Committed rows, so the replica connection (a test mirror of default) can see them
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='replica-test', password='x')
+        Category.objects.create_defaults([self.user])
+        self.client.force_login(self.user)
+
+    def request_databases(self, method, path, data=None):
+        """Issue a request and return (response, primary query count, replica query count)"""
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[settings.REPLICA_DATABASE]) as replica:
+            response = getattr(self.client, method)(path, data or {})
+        return response, len(primary), len(replica)
+
+    def test_reporting_reads_use_the_replica(self):
+        for path in (reverse('dashboard'), reverse('get_cashflow_data'), reverse('transaction_list')):
+            response, _primary, replica = self.request_databases('get', path)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(replica, 0, path)
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        category = Category.objects.for_user(self.user).expense_categories().first()
+        response, _primary, replica = self.request_databases('post', reverse('transaction_create'), {
+            'transaction_type': 'expense', 'category': category.id, 'description': 'Lunch',
+            'amount': '50.00', 'currency': 'THB', 'date': '2026-01-15', 'notes': '',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(replica, 0)
+        self.assertIn(PRIMARY_STICKY_COOKIE, response.cookies)
+
+        _response, primary, replica = self.request_databases('get', reverse('transaction_list'))
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+
+@skipUnless(len(settings.SHARD_DATABASES) > 1, 'Needs DB_SHARDS with at least one extra database')
+class ShardingTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shard-test', password='x')
+        Category.objects.create_defaults([self.user])
+        self.client.force_login(self.user)
+
+    def test_new_users_get_a_directory_entry(self):
+        alias = shard_for_user(self.user)
+        self.assertEqual(UserShard.objects.get(user=self.user).database, alias)
+        self.assertEqual(Category.objects.using(alias).filter(user=self.user).count(), 15)
+
+    def test_move_user_keeps_data_and_routes_requests(self):
+        source = shard_for_user(self.user)
+        target = next(alias for alias in settings.SHARD_DATABASES if alias != source)
+        category = Category.objects.for_user(self.user).expense_categories().first()
+        self.client.post(reverse('transaction_create'), {
+            'transaction_type': 'expense', 'category': category.id, 'description': 'Lunch',
+            'amount': '50.00', 'currency': 'THB', 'date': '2026-01-15', 'notes': '',
+        })
+
+        call_command('move_user_shard', self.user.username, target, grace=0, stdout=StringIO())
+
+        self.assertEqual(shard_for_user(self.user), target)
+        self.assertFalse(Transaction.objects.using(source).filter(user=self.user).exists())
+        moved = Transaction.objects.for_user(self.user).get()
+        self.assertEqual(moved._state.db, target)
+        self.assertEqual(moved.category_id, category.id)
+        self.assertEqual(moved.category.name, category.name)
+        response = self.client.get(reverse('transaction_list'))
+        self.assertContains(response, 'Lunch')
+
+    def test_move_refuses_ids_already_used_on_the_target(self):
+        source = shard_for_user(self.user)
+        target = next(alias for alias in settings.SHARD_DATABASES if alias != source)
+        other = User.objects.create_user(username='shard-other', email='other@example.com', password='x')
+        copy_users_to_shard([other], target)
+        category = Category.objects.for_user(self.user).first()
+        Category.objects.using(target).filter(pk=category.pk).delete()
+        Category.objects.using(target).create(pk=category.pk, user=other, name='Pets', category_type='expense')
+
+        with self.assertRaisesMessage(CommandError, 'disjoint id ranges'):
+            call_command('move_user_shard', self.user.username, target, grace=0, stdout=StringIO())
+
+        self.assertEqual(shard_for_user(self.user), source)
+        self.assertEqual(UserShard.objects.get(user=self.user).status, UserShard.STATUS_ACTIVE)
+        self.assertEqual(Category.objects.for_user(self.user).count(), 15)
+
+    def test_writes_are_refused_while_moving(self):
+        UserShard.objects.filter(user=self.user).update(status=UserShard.STATUS_MOVING)
+        response = self.client.post(reverse('category_create'), {'name': 'Pets', 'category_type': 'expense'})
+        self.assertEqual(response.status_code, 503)
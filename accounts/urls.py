@@ -1,8 +1,17 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
 from . import views
 from .forms import CustomLoginForm
 
+# Under ASGI the async views run their independent queries concurrently
+if settings.ASYNC_VIEWS:
+    dashboard_view = views.dashboard_async
+    cashflow_data_view = views.get_cashflow_data_async
+else:
+    dashboard_view = views.dashboard
+    cashflow_data_view = views.get_cashflow_data
+
 urlpatterns = [
     path('login/', auth_views.LoginView.as_view(
         template_name='accounts/login.html',
@@ -10,6 +19,8 @@ urlpatterns = [
     ), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('register/', views.register, name='register'),
-    path('', views.dashboard, name='dashboard'),
-    path('api/cashflow-data/', views.get_cashflow_data, name='get_cashflow_data'),
+    path('settings/currency/', views.currency_settings, name='currency_settings'),
+    path('', dashboard_view, name='dashboard'),
+    path('api/cashflow-data/', cashflow_data_view, name='get_cashflow_data'),
+    path('api/cashflow-forecast/', views.get_cashflow_forecast, name='get_cashflow_forecast'),
 ]
@@ -1,55 +1,83 @@
+import asyncio
+import calendar
+import operator
+import threading
+from functools import reduce
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
 from django.contrib import messages
 from django.core.cache import cache
 from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db.models import Sum, Count, Q
-from .forms import CustomUserCreationForm
+from .caching import bump_data_version, get_data_version
+from .forms import CurrencySettingsForm, CustomUserCreationForm
+from CashFlow_Tracker.db_routers import use_replica
+from CashFlow_Tracker.metrics import inherited_execute_wrappers
+from CashFlow_Tracker.sharding import shard_for_user
+from transactions.currency import CURRENCY_CHOICES, PIVOT_CURRENCY, converted_amount, currency_symbol
+
+# Longest cash-flow forecast the API computes, in months
+FORECAST_MAX_MONTHS = 24
+
+def dashboard_stats_cache_key(user_id, cache_key_suffix, data_version):
+    return f"dashboard_stats_{user_id}_{cache_key_suffix}_{data_version}"
+
+def compute_dashboard_stats(user, data_version=None):
+    """Dashboard statistics straight from the database"""
+    from transactions.models import Transaction, conversion_currency
+    
+    # Get user's transactions with optimized queries
+    transactions = Transaction.objects.for_user(user)
+    
+    # Calculate total income and expenses using optimized manager method, converted to the user's currency in SQL
+    currency = conversion_currency(user)
+    totals = transactions.totals_summary(currency)
+    
+    total_income = totals['total_income'] or 0
+    total_expenses = totals['total_expense'] or 0
+    net_balance = total_income - total_expenses
+    
+    # Calculate current month balance
+    today = timezone.now().date()
+    current_month_start = today.replace(day=1)
+    current_month_transactions = transactions.for_period(start_date=current_month_start)
+    current_month_totals = current_month_transactions.totals_summary(currency)
+    current_month_balance = (current_month_totals['total_income'] or 0) - (current_month_totals['total_expense'] or 0)
+    
+    # Additional stats
+    additional_stats = {
+        'total_transactions': transactions.count(),
+        'income_transactions': transactions.income().count(),
+        'expense_transactions': transactions.expenses().count(),
+        'categories_used': transactions.values('category').distinct().count(),
+    }
+    
+    return {
+        'total_income': total_income,
+        'total_expenses': total_expenses,
+        'net_balance': net_balance,
+        'current_month_balance': current_month_balance,
+        'stats': additional_stats,
+        'data_version': data_version,
+    }
 
 def get_dashboard_stats(user, cache_key_suffix=""):
     """Get cached dashboard statistics for a user"""
-    cache_key = f"dashboard_stats_{user.id}_{cache_key_suffix}"
+    # Keyed by the data version so any change to the user's data gets fresh numbers
+    data_version = get_data_version(user.id)
+    cache_key = dashboard_stats_cache_key(user.id, cache_key_suffix, data_version)
     stats = cache.get(cache_key)
     
     if stats is None:
-        from transactions.models import Transaction
-        
-        # Get user's transactions with optimized queries
-        transactions = Transaction.objects.for_user(user)
-        
-        # Calculate total income and expenses using optimized manager method
-        totals = transactions.totals_summary()
-        
-        total_income = totals['total_income'] or 0
-        total_expenses = totals['total_expense'] or 0
-        net_balance = total_income - total_expenses
-        
-        # Calculate current month balance
-        today = timezone.now().date()
-        current_month_start = today.replace(day=1)
-        current_month_transactions = transactions.for_period(start_date=current_month_start)
-        current_month_totals = current_month_transactions.totals_summary()
-        current_month_balance = (current_month_totals['total_income'] or 0) - (current_month_totals['total_expense'] or 0)
-        
-        # Additional stats
-        additional_stats = {
-            'total_transactions': transactions.count(),
-            'income_transactions': transactions.income().count(),
-            'expense_transactions': transactions.expenses().count(),
-            'categories_used': transactions.values('category').distinct().count(),
-        }
-        
-        stats = {
-            'total_income': total_income,
-            'total_expenses': total_expenses,
-            'net_balance': net_balance,
-            'current_month_balance': current_month_balance,
-            'stats': additional_stats,
-            'transactions_queryset': transactions,  # For other calculations
-        }
+        stats = compute_dashboard_stats(user, data_version)
         
         # Cache for 5 minutes by default
         cache.set(cache_key, stats, getattr(settings, 'CACHE_TTL', 300))
@@ -70,48 +98,73 @@ def register(request):
     return render(request, 'accounts/register.html', {'form': form})
 
 @login_required
-def dashboard(request):
-    from transactions.models import Transaction
-    from categories.models import Category
+def currency_settings(request):
+    from categories.models import Budget, CategoryStats
+    from transactions.models import ExchangeRate
     
-    # Get current date and calculate date ranges
-    today = timezone.now().date()
-    current_year = today.year
-    
-    # Get cached dashboard statistics
-    cached_stats = get_dashboard_stats(request.user, f"dashboard_{today.strftime('%Y%m%d')}")
-    transactions = cached_stats['transactions_queryset']
-    
-    # Get recent transactions (last 5)
-    recent_transactions = transactions.order_by('-date', '-created_at')[:5]
-    
-    # Generate monthly data for the current year
-    monthly_labels = []
-    monthly_income = []
-    monthly_expenses = []
+    if request.method == 'POST':
+        form = CurrencySettingsForm(request.POST, instance=request.user)
+        if form.is_valid():
+            form.save()
+            if 'base_currency' in form.changed_data:
+                # Budget spending and anomaly stats count every row in the base currency
+                Budget.objects.for_user(request.user).recalculate_spent()
+                CategoryStats.objects.using(shard_for_user(request.user)).rebuild([request.user.pk])
+            # Every cached total was in the old currency
+            bump_data_version(request.user.id)
+            messages.success(request, f'เปลี่ยนสกุลเงินหลักเป็น {request.user.get_base_currency_display()} เรียบร้อยแล้ว')
+            return redirect('currency_settings')
+    else:
+        form = CurrencySettingsForm(instance=request.user)
     
+    # Rates are the same on every shard; the default one is enough for display
+    latest_rates = [
+        ExchangeRate.objects.using(DEFAULT_DB_ALIAS).filter(currency=code).first()
+        for code, _label in CURRENCY_CHOICES if code != PIVOT_CURRENCY
+    ]
+    context = {
+        'form': form,
+        'latest_rates': [rate for rate in latest_rates if rate],
+        'pivot_currency': PIVOT_CURRENCY,
+    }
+    return render(request, 'accounts/currency_settings.html', context)
+
+def _dashboard_month_ranges(year):
+    """(label, start, end) for every month of the year shown on the dashboard"""
+    month_ranges = []
     for month in range(1, 13):
-        month_name = datetime(current_year, month, 1).strftime('%b')
-        monthly_labels.append(month_name)
-        
-        month_start = datetime(current_year, month, 1).date()
+        month_start = datetime(year, month, 1).date()
         if month < 12:
-            month_end = datetime(current_year, month + 1, 1).date() - timedelta(days=1)
+            month_end = datetime(year, month + 1, 1).date() - timedelta(days=1)
         else:
-            month_end = datetime(current_year, 12, 31).date()
-        
-        month_transactions = transactions.for_period(start_date=month_start, end_date=month_end)
-        month_totals = month_transactions.totals_summary()
-        
-        monthly_income.append(float(month_totals['total_income'] or 0))
-        monthly_expenses.append(float(month_totals['total_expense'] or 0))
-    
-    # Generate expense categories data for pie chart
-    expense_categories_data = transactions.expenses().values(
+            month_end = datetime(year, 12, 31).date()
+        month_ranges.append((month_start.strftime('%b'), month_start, month_end))
+    return month_ranges
+
+def _expense_categories_queryset(transactions, currency):
+    # Top 10 expense categories for the pie chart
+    return transactions.expenses().values(
         'category__name', 'category__color', 'category__icon'
     ).annotate(
-        total=Sum('amount')
-    ).order_by('-total')[:10]  # Top 10 expense categories
+        total=Sum(converted_amount(currency) if currency else 'amount')
+    ).filter(total__isnull=False).order_by('-total')[:10]
+
+def _budgets_queryset(user, today):
+    from categories.models import Budget
+    
+    # spent is maintained by the transaction signals: one indexed read, however long the history
+    return Budget.objects.for_user(user).for_month(today).select_related('category').order_by('category__name')
+
+def _anomalies_queryset(transactions, today, currency):
+    # Stats are kept per write, so flagging is a join and a comparison per row
+    return transactions.for_period(start_date=today.replace(day=1)).anomalies(currency).with_stats(currency).order_by('-date')[:5]
+
+def _dashboard_context(user, cached_stats, recent_transactions, month_ranges, month_totals, expense_categories_data,
+                       budgets, anomalies):
+    """Build the dashboard template context from already evaluated query results"""
+    monthly_labels = [label for label, _start, _end in month_ranges]
+    monthly_income = [float(totals['income'] or 0) for totals in month_totals]
+    monthly_expenses = [float(totals['expenses'] or 0) for totals in month_totals]
     
     if expense_categories_data:
         category_labels = []
@@ -135,17 +188,20 @@ def dashboard(request):
             'colors': ['#e3e6f0']
         }
     
-    # Use cached stats
-    stats = cached_stats['stats']
-    
-    context = {
-        'user': request.user,
+    return {
+        'user': user,
+        'currency_symbol': currency_symbol(user.base_currency),
         'total_income': cached_stats['total_income'],
         'total_expenses': cached_stats['total_expenses'],
         'net_balance': cached_stats['net_balance'],
         'current_month_balance': cached_stats['current_month_balance'],
         'recent_transactions': recent_transactions,
-        'stats': stats,
+        'budgets': budgets,
+        'anomalies': anomalies,
+        'stats': cached_stats['stats'],
+        # Template fragments are cached per data version (see {% cache %} in dashboard.html)
+        'data_version': cached_stats['data_version'],
+        'fragment_cache_ttl': getattr(settings, 'CACHE_TTL', 300),
         'monthly_data': {
             'labels': monthly_labels,
             'income_data': monthly_income,
@@ -153,169 +209,199 @@ def dashboard(request):
         },
         'expense_categories': expense_categories
     }
-    
-    return render(request, 'dashboard.html', context)
 
 @login_required
-def get_cashflow_data(request):
-    """API endpoint for dynamic cash flow chart data"""
-    from transactions.models import Transaction
-    from django.http import JsonResponse
+@use_replica
+def dashboard(request):
+    from transactions.models import Transaction, conversion_currency
     
-    # Get parameters
-    period = request.GET.get('period', 'year')  # year, 6months, 3months, month, week
-    year = request.GET.get('year', timezone.now().year)
+    # Get current date and calculate date ranges
+    today = timezone.now().date()
     
-    try:
-        year = int(year)
-    except (ValueError, TypeError):
-        year = timezone.now().year
+    # Get cached dashboard statistics
+    cached_stats = get_dashboard_stats(request.user, f"dashboard_{today.strftime('%Y%m%d')}")
+    transactions = Transaction.objects.for_user(request.user)
+    
+    currency = conversion_currency(request.user)
+    
+    # Get recent transactions (last 5); left lazy so a cached fragment skips the query
+    recent_transactions = transactions.with_stats(currency).order_by('-date', '-created_at')[:5]
+    
+    # Generate monthly data for the current year
+    month_ranges = _dashboard_month_ranges(today.year)
+    month_totals = _month_totals(transactions, month_ranges, currency)
+    
+    # Generate expense categories data for pie chart
+    expense_categories_data = _expense_categories_queryset(transactions, currency)
+    
+    context = _dashboard_context(
+        request.user, cached_stats, recent_transactions, month_ranges, month_totals, expense_categories_data,
+        _budgets_queryset(request.user, today), _anomalies_queryset(transactions, today, currency),
+    )
+    return render(request, 'dashboard.html', context)
+
+def _month_totals(transactions, month_ranges, currency):
+    return _cashflow_totals(
+        transactions, [{'date__range': (month_start, month_end)} for _label, month_start, month_end in month_ranges],
+        currency,
+    )
+
+# Worker threads (and so database connections) the async views may hold at once, per process
+_query_slots = threading.BoundedSemaphore(getattr(settings, 'ASYNC_QUERY_CONCURRENCY', 3))
+
+def _run_concurrently(func, *args):
+    """
+    Run a blocking ORM call in its own worker thread and database connection.
+    
+    Django's async ORM methods (aaggregate, acount, ...) all hop onto the same
+    thread-sensitive executor, so gathering them still runs the queries one
+    after another. Running them outside that executor is what lets
+    independent queries overlap. At most ASYNC_QUERY_CONCURRENCY calls run at
+    once so a burst of requests cannot drain the connection pool, and the
+    request's execute wrappers (metrics, profiling) see the worker's queries.
+    """
+    def run():
+        with _query_slots:
+            close_old_connections()
+            try:
+                with inherited_execute_wrappers():
+                    return func(*args)
+            finally:
+                close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)()
+
+@login_required
+@use_replica
+async def dashboard_async(request):
+    """Async dashboard that issues its independent queries concurrently"""
+    from transactions.models import Transaction, conversion_currency
     
+    user = await request.auser()
+    # Templates and context processors read request.user synchronously
+    request.user = user
     today = timezone.now().date()
-    transactions = Transaction.objects.for_user(request.user)
+    transactions = Transaction.objects.for_user(user)
+    month_ranges = _dashboard_month_ranges(today.year)
     
-    labels = []
-    income_data = []
-    expense_data = []
-    net_flow_data = []
-    running_balance_data = []
+    # Usually a cache hit; resolved first so the workers below do not each run the check
+    currency = await _run_concurrently(conversion_currency, user)
     
-    running_balance = 0
+    cached_stats, recent_transactions, expense_categories_data, budgets, anomalies, month_totals = await asyncio.gather(
+        _run_concurrently(get_dashboard_stats, user, f"dashboard_{today.strftime('%Y%m%d')}"),
+        _run_concurrently(lambda: list(transactions.with_stats(currency).order_by('-date', '-created_at')[:5])),
+        _run_concurrently(lambda: list(_expense_categories_queryset(transactions, currency))),
+        _run_concurrently(lambda: list(_budgets_queryset(user, today))),
+        _run_concurrently(lambda: list(_anomalies_queryset(transactions, today, currency))),
+        _run_concurrently(_month_totals, transactions, month_ranges, currency),
+    )
+    
+    context = _dashboard_context(
+        user, cached_stats, recent_transactions, month_ranges, month_totals, expense_categories_data, budgets,
+        anomalies,
+    )
+    # Rendering may still touch the session (messages), so it stays on the sync thread
+    return await sync_to_async(render)(request, 'dashboard.html', context)
+
+def _month_filter(year, month):
+    # A date range rather than __month, which SQLite evaluates with a function call per row and bucket
+    last_day = calendar.monthrange(year, month)[1]
+    return {'date__range': (datetime(year, month, 1).date(), datetime(year, month, last_day).date())}
+
+def _cashflow_buckets(period, year, today):
+    """(label, filter kwargs) for every data point of a cash flow chart period"""
+    buckets = []
     
     if period == 'year':
         # Monthly data for the specified year
         for month in range(1, 13):
             month_name = datetime(year, month, 1).strftime('%b %Y')
-            labels.append(month_name)
-            
-            month_transactions = transactions.filter(date__year=year, date__month=month)
-            month_totals = month_transactions.aggregate(
-                income=Sum('amount', filter=Q(transaction_type='income')) or 0,
-                expenses=Sum('amount', filter=Q(transaction_type='expense')) or 0
-            )
-            
-            income = float(month_totals['income'] or 0)
-            expenses = float(month_totals['expenses'] or 0)
-            net_flow = income - expenses
-            running_balance += net_flow
-            
-            income_data.append(income)
-            expense_data.append(expenses)
-            net_flow_data.append(net_flow)
-            running_balance_data.append(running_balance)
+            buckets.append((month_name, _month_filter(year, month)))
     
     elif period == '6months':
         # Last 6 months
         start_date = today.replace(day=1) - timedelta(days=150)  # Approximate
         for i in range(6):
             month_date = start_date + timedelta(days=30*i)
-            month_name = month_date.strftime('%b %Y')
-            labels.append(month_name)
-            
-            month_transactions = transactions.filter(
-                date__year=month_date.year, 
-                date__month=month_date.month
-            )
-            month_totals = month_transactions.aggregate(
-                income=Sum('amount', filter=Q(transaction_type='income')) or 0,
-                expenses=Sum('amount', filter=Q(transaction_type='expense')) or 0
-            )
-            
-            income = float(month_totals['income'] or 0)
-            expenses = float(month_totals['expenses'] or 0)
-            net_flow = income - expenses
-            running_balance += net_flow
-            
-            income_data.append(income)
-            expense_data.append(expenses)
-            net_flow_data.append(net_flow)
-            running_balance_data.append(running_balance)
+            buckets.append((
+                month_date.strftime('%b %Y'),
+                _month_filter(month_date.year, month_date.month),
+            ))
     
     elif period == '3months':
-        # Last 3 months
+        # Last 3 months, oldest first
         for i in range(3):
             month_date = (today.replace(day=1) - timedelta(days=32*i))
-            month_name = month_date.strftime('%b %Y')
-            labels.insert(0, month_name)
-            
-            month_transactions = transactions.filter(
-                date__year=month_date.year, 
-                date__month=month_date.month
-            )
-            month_totals = month_transactions.aggregate(
-                income=Sum('amount', filter=Q(transaction_type='income')) or 0,
-                expenses=Sum('amount', filter=Q(transaction_type='expense')) or 0
-            )
-            
-            income = float(month_totals['income'] or 0)
-            expenses = float(month_totals['expenses'] or 0)
-            net_flow = income - expenses
-            
-            income_data.insert(0, income)
-            expense_data.insert(0, expenses)
-            net_flow_data.insert(0, net_flow)
-        
-        # Calculate running balance properly for 3 months
-        running_balance = 0
-        running_balance_data = []
-        for net in net_flow_data:
-            running_balance += net
-            running_balance_data.append(running_balance)
+            buckets.insert(0, (
+                month_date.strftime('%b %Y'),
+                _month_filter(month_date.year, month_date.month),
+            ))
     
     elif period == 'month':
         # Current month by weeks
-        month_start = today.replace(day=1)
-        weeks = []
-        current_date = month_start
+        current_date = today.replace(day=1)
+        week_number = 1
         
-        while current_date.month == today.month:
+        while current_date <= today:
             week_end = min(current_date + timedelta(days=6), today)
-            weeks.append((current_date, week_end))
+            buckets.append((f'สัปดาห์ {week_number}', {'date__gte': current_date, 'date__lte': week_end}))
             current_date = week_end + timedelta(days=1)
-        
-        for i, (week_start, week_end) in enumerate(weeks):
-            labels.append(f'สัปดาห์ {i+1}')
-            
-            week_transactions = transactions.filter(
-                date__gte=week_start,
-                date__lte=week_end
-            )
-            week_totals = week_transactions.aggregate(
-                income=Sum('amount', filter=Q(transaction_type='income')) or 0,
-                expenses=Sum('amount', filter=Q(transaction_type='expense')) or 0
-            )
-            
-            income = float(week_totals['income'] or 0)
-            expenses = float(week_totals['expenses'] or 0)
-            net_flow = income - expenses
-            running_balance += net_flow
-            
-            income_data.append(income)
-            expense_data.append(expenses)
-            net_flow_data.append(net_flow)
-            running_balance_data.append(running_balance)
+            week_number += 1
     
     elif period == 'week':
         # Last 7 days
         for i in range(7):
             date = today - timedelta(days=6-i)
-            labels.append(date.strftime('%d %b'))
-            
-            day_transactions = transactions.filter(date=date)
-            day_totals = day_transactions.aggregate(
-                income=Sum('amount', filter=Q(transaction_type='income')) or 0,
-                expenses=Sum('amount', filter=Q(transaction_type='expense')) or 0
-            )
-            
-            income = float(day_totals['income'] or 0)
-            expenses = float(day_totals['expenses'] or 0)
-            net_flow = income - expenses
-            running_balance += net_flow
-            
-            income_data.append(income)
-            expense_data.append(expenses)
-            net_flow_data.append(net_flow)
-            running_balance_data.append(running_balance)
+            buckets.append((date.strftime('%d %b'), {'date': date}))
+    
+    return buckets
+
+def _cashflow_totals(transactions, bucket_filters, currency):
+    """Income and expense totals of every bucket, all in one aggregate query"""
+    if not bucket_filters:
+        return []
+    # Rates are joined per row inside the aggregate, so mixed currencies still take one query
+    amount = converted_amount(currency) if currency else 'amount'
+    aggregates = {}
+    for index, filters in enumerate(bucket_filters):
+        aggregates[f'income_{index}'] = Sum(amount, filter=Q(transaction_type='income', **filters))
+        aggregates[f'expenses_{index}'] = Sum(amount, filter=Q(transaction_type='expense', **filters))
+    totals = transactions.filter(
+        reduce(operator.or_, (Q(**filters) for filters in bucket_filters))
+    ).aggregate(**aggregates)
+    return [
+        {'income': totals[f'income_{index}'], 'expenses': totals[f'expenses_{index}']}
+        for index in range(len(bucket_filters))
+    ]
+
+def _cashflow_params(request):
+    period = request.GET.get('period', 'year')  # year, 6months, 3months, month, week
+    year = request.GET.get('year', timezone.now().year)
+    
+    try:
+        year = int(year)
+    except (ValueError, TypeError):
+        year = timezone.now().year
+    
+    return period, year
+
+def _cashflow_response(period, buckets, bucket_totals, currency):
+    labels = [label for label, _filters in buckets]
+    income_data = []
+    expense_data = []
+    net_flow_data = []
+    running_balance_data = []
+    
+    running_balance = 0
+    for totals in bucket_totals:
+        income = float(totals['income'] or 0)
+        expenses = float(totals['expenses'] or 0)
+        net_flow = income - expenses
+        running_balance += net_flow
+        
+        income_data.append(income)
+        expense_data.append(expenses)
+        net_flow_data.append(net_flow)
+        running_balance_data.append(running_balance)
     
     # Calculate summary statistics
     total_income = sum(income_data)
@@ -337,6 +423,56 @@ def get_cashflow_data(request):
             'net_flow': total_net_flow,
             'final_balance': final_balance,
             'period': period,
-            'data_points': len(labels)
+            'data_points': len(labels),
+            'currency': currency,
         }
     })
+
+@login_required
+@use_replica
+def get_cashflow_data(request):
+    """API endpoint for dynamic cash flow chart data"""
+    from transactions.models import Transaction, conversion_currency
+    
+    period, year = _cashflow_params(request)
+    buckets = _cashflow_buckets(period, year, timezone.now().date())
+    transactions = Transaction.objects.for_user(request.user)
+    
+    bucket_totals = _cashflow_totals(
+        transactions, [filters for _label, filters in buckets], conversion_currency(request.user),
+    )
+    return _cashflow_response(period, buckets, bucket_totals, request.user.base_currency)
+
+@login_required
+@use_replica
+async def get_cashflow_data_async(request):
+    """Async cash flow chart data; the aggregate runs off the event loop"""
+    from transactions.models import Transaction, conversion_currency
+    
+    period, year = _cashflow_params(request)
+    buckets = _cashflow_buckets(period, year, timezone.now().date())
+    user = await request.auser()
+    transactions = Transaction.objects.for_user(user)
+    
+    bucket_totals = await _run_concurrently(
+        lambda: _cashflow_totals(transactions, [filters for _label, filters in buckets], conversion_currency(user)),
+    )
+    return _cashflow_response(period, buckets, bucket_totals, user.base_currency)
+
+@login_required
+@use_replica
+def get_cashflow_forecast(request):
+    """API endpoint projecting income, expenses and balance for the next months, in the cash flow chart's shape"""
+    # NumPy is only imported once the API is used, keeping it out of the cold start
+    from transactions.analytics import get_forecast
+    
+    try:
+        months = int(request.GET.get('months', 6))
+    except (TypeError, ValueError):
+        months = 0
+    if not 1 <= months <= FORECAST_MAX_MONTHS:
+        return JsonResponse({'error': f'จำนวนเดือนต้องอยู่ระหว่าง 1 ถึง {FORECAST_MAX_MONTHS}'}, status=400)
+    
+    response = JsonResponse(get_forecast(request.user, months))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -1,5 +1,11 @@
 echo "Building the project..."
 python3.12 -m pip install -r requirements.txt
 
+echo "Check vendored static files..."
+# Fetches only files missing from statics/vendor (none once they are committed), then fails the build if any still are
+python3.12 manage.py vendor_static || exit 1
+python3.12 manage.py vendor_static --check || exit 1
+
 echo "Collect Static..."
-python3.12 manage.py collectstatic --noinput --clear
+# Hashed file names plus .gz/.br copies (CompressedManifestStaticFilesStorage)
+DJANGO_PROFILE=production python3.12 manage.py collectstatic --noinput --clear
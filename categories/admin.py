@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category
+from .models import Budget, Category, CategoryStats
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -7,3 +7,18 @@ class CategoryAdmin(admin.ModelAdmin):
     list_filter = ['category_type', 'is_default', 'created_at']
     search_fields = ['name', 'user__username', 'user__email']
     ordering = ['category_type', 'name']
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ['category', 'month', 'amount', 'spent', 'user', 'updated_at']
+    list_filter = ['month']
+    search_fields = ['category__name', 'user__username']
+    readonly_fields = ['spent']
+    ordering = ['-month']
+
+@admin.register(CategoryStats)
+class CategoryStatsAdmin(admin.ModelAdmin):
+    list_display = ['category', 'user', 'count', 'mean', 'stddev']
+    search_fields = ['category__name', 'user__username']
+    # Maintained by the transaction signals; fix drift with backfill_aggregates --repair
+    readonly_fields = ['count', 'mean', 'm2']
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django import forms
 from .models import Category
 
@@ -72,4 +74,34 @@ class CategoryFilterForm(forms.Form):
             'class': 'form-control',
             'placeholder': 'ค้นหาหมวดหมู่...'
         })
-    )
\ No newline at end of file
+    )
+class BudgetForm(forms.Form):
+    """One optional amount per expense category for a month; leaving it blank removes the budget"""
+
+    def __init__(self, *args, categories=(), budgets=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        budgets = budgets or {}
+        self.categories = list(categories)
+        for category in self.categories:
+            budget = budgets.get(category.pk)
+            self.fields[self.field_name(category)] = forms.DecimalField(
+                label=category.display_name,
+                required=False,
+                min_value=Decimal('0.01'),
+                max_digits=12,
+                decimal_places=2,
+                initial=budget.amount if budget else None,
+                widget=forms.NumberInput(attrs={
+                    'class': 'form-control',
+                    'placeholder': 'ไม่กำหนด',
+                    'step': '0.01',
+                }),
+            )
+
+    @staticmethod
+    def field_name(category):
+        return f'category_{category.pk}'
+
+    def amounts(self):
+        """(category, amount or None) for every category"""
+        return [(category, self.cleaned_data.get(self.field_name(category))) for category in self.categories]
@@ -22,36 +22,13 @@ class Command(BaseCommand):
         else:
             users = User.objects.all()
 
-        # Default income categories
-        income_categories = [
-            {'name': 'เงินเดือน', 'icon': '💰', 'color': '#28a745'},
-            {'name': 'โบนัส', 'icon': '🎁', 'color': '#17a2b8'},
-            {'name': 'ธุรกิจส่วนตัว', 'icon': '💼', 'color': '#6f42c1'},
-            {'name': 'การลงทุน', 'icon': '📈', 'color': '#20c997'},
-            {'name': 'อื่นๆ', 'icon': '💳', 'color': '#6c757d'},
-        ]
-
-        # Default expense categories
-        expense_categories = [
-            {'name': 'อาหาร', 'icon': '🍕', 'color': '#fd7e14'},
-            {'name': 'ที่อยู่อาศัย', 'icon': '🏠', 'color': '#e83e8c'},
-            {'name': 'การเดินทาง', 'icon': '🚗', 'color': '#20c997'},
-            {'name': 'ความบันเทิง', 'icon': '🎬', 'color': '#6f42c1'},
-            {'name': 'เสื้อผ้า', 'icon': '👕', 'color': '#dc3545'},
-            {'name': 'สุขภาพ', 'icon': '💊', 'color': '#198754'},
-            {'name': 'การศึกษา', 'icon': '📚', 'color': '#0dcaf0'},
-            {'name': 'ช้อปปิ้ง', 'icon': '🛍️', 'color': '#ffc107'},
-            {'name': 'สาธารณูปโภค', 'icon': '⚡', 'color': '#6c757d'},
-            {'name': 'อื่นๆ', 'icon': '💳', 'color': '#adb5bd'},
-        ]
-
         created_count = 0
         
         for user in users:
             self.stdout.write(f'Creating categories for user: {user.email}')
             
             # Create income categories
-            for cat_data in income_categories:
+            for cat_data in Category.DEFAULT_CATEGORIES['income']:
                 category, created = Category.objects.get_or_create(
                     user=user,
                     name=cat_data['name'],
@@ -67,7 +44,7 @@ class Command(BaseCommand):
                     self.stdout.write(f'  Created income category: {category.name}')
 
             # Create expense categories
-            for cat_data in expense_categories:
+            for cat_data in Category.DEFAULT_CATEGORIES['expense']:
                 category, created = Category.objects.get_or_create(
                     user=user,
                     name=cat_data['name'],
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Budget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='เดือน')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='งบประมาณ')),
+                ('spent', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='ใช้ไปแล้ว')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='วันที่สร้าง')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='วันที่แก้ไขล่าสุด')),
+            ],
+            options={
+                'verbose_name': 'งบประมาณ',
+                'verbose_name_plural': 'งบประมาณ',
+                'ordering': ['-month', '-amount'],
+            },
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to='categories.category', verbose_name='หมวดหมู่'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='budget',
+            index=models.Index(fields=['user', 'month'], name='categories__user_id_2c796f_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='budget',
+            unique_together={('category', 'month')},
+        ),
+    ]
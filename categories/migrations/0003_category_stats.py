@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_category_stats(apps, schema_editor):
+    """Start the running statistics from the existing transactions"""
+    CategoryStats = apps.get_model('categories', 'CategoryStats')
+    Transaction = apps.get_model('transactions', 'Transaction')
+    alias = schema_editor.connection.alias
+    rows = (
+        Transaction.objects.using(alias).order_by().values('category_id', 'user_id')
+        .annotate(count=models.Count('id'), mean=models.Avg('amount'), variance=models.Variance('amount'))
+    )
+    CategoryStats.objects.using(alias).bulk_create([
+        CategoryStats(
+            category_id=row['category_id'], user_id=row['user_id'], count=row['count'],
+            mean=float(row['mean']), m2=float(row['variance'] or 0) * row['count'],
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0002_budget'),
+        ('transactions', '0002_recurring_transaction'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='จำนวนรายการ')),
+                ('mean', models.FloatField(default=0, verbose_name='ค่าเฉลี่ย')),
+                ('m2', models.FloatField(default=0)),
+            ],
+            options={
+                'verbose_name': 'สถิติหมวดหมู่',
+                'verbose_name_plural': 'สถิติหมวดหมู่',
+            },
+        ),
+        migrations.AddField(
+            model_name='categorystats',
+            name='category',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='categories.category', verbose_name='หมวดหมู่'),
+        ),
+        migrations.AddField(
+            model_name='categorystats',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_stats', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(fill_category_stats, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,19 @@
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
+from CashFlow_Tracker.sharding import for_user_shard, group_by_shard
+from transactions.currency import converted_cents, group_by_base_currency
 
 User = get_user_model()
 
 class CategoryQuerySet(models.QuerySet):
     def for_user(self, user):
-        return self.filter(user=user)
+        return for_user_shard(self.filter(user=user), user)
     
     def income_categories(self):
         return self.filter(category_type='income')
@@ -31,6 +39,26 @@ class CategoryManager(models.Manager):
     
     def expense_categories(self):
         return self.get_queryset().expense_categories()
+    
+    def create_defaults(self, users):
+        """Bulk create the default categories for the given users, skipping existing ones"""
+        created = []
+        for alias, shard_users in group_by_shard(list(users)).items():
+            categories = [
+                self.model(
+                    user=user,
+                    name=cat_data['name'],
+                    category_type=category_type,
+                    icon=cat_data['icon'],
+                    color=cat_data['color'],
+                    is_default=True,
+                )
+                for user in shard_users
+                for category_type, defaults in self.model.DEFAULT_CATEGORIES.items()
+                for cat_data in defaults
+            ]
+            created += self.using(alias).bulk_create(categories, ignore_conflicts=True)
+        return created
 
 class Category(models.Model):
     CATEGORY_TYPES = [
@@ -79,6 +107,28 @@ class Category(models.Model):
         ('🍽️', 'ร้านอาหาร'),
     ]
     
+    DEFAULT_CATEGORIES = {
+        'income': [
+            {'name': 'เงินเดือน', 'icon': '💰', 'color': '#28a745'},
+            {'name': 'โบนัส', 'icon': '🎁', 'color': '#17a2b8'},
+            {'name': 'ธุรกิจส่วนตัว', 'icon': '💼', 'color': '#6f42c1'},
+            {'name': 'การลงทุน', 'icon': '📈', 'color': '#20c997'},
+            {'name': 'อื่นๆ', 'icon': '💳', 'color': '#6c757d'},
+        ],
+        'expense': [
+            {'name': 'อาหาร', 'icon': '🍕', 'color': '#fd7e14'},
+            {'name': 'ที่อยู่อาศัย', 'icon': '🏠', 'color': '#e83e8c'},
+            {'name': 'การเดินทาง', 'icon': '🚗', 'color': '#20c997'},
+            {'name': 'ความบันเทิง', 'icon': '🎬', 'color': '#6f42c1'},
+            {'name': 'เสื้อผ้า', 'icon': '👕', 'color': '#dc3545'},
+            {'name': 'สุขภาพ', 'icon': '💊', 'color': '#198754'},
+            {'name': 'การศึกษา', 'icon': '📚', 'color': '#0dcaf0'},
+            {'name': 'ช้อปปิ้ง', 'icon': '🛍️', 'color': '#ffc107'},
+            {'name': 'สาธารณูปโภค', 'icon': '⚡', 'color': '#6c757d'},
+            {'name': 'อื่นๆ', 'icon': '💳', 'color': '#adb5bd'},
+        ],
+    }
+    
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='categories')
     name = models.CharField(max_length=100, verbose_name='ชื่อหมวดหมู่')
     category_type = models.CharField(max_length=10, choices=CATEGORY_TYPES, verbose_name='ประเภท')
@@ -107,3 +157,180 @@ class Category(models.Model):
     @property
     def display_name(self):
         return f"{self.icon} {self.name}"
+
+class BudgetQuerySet(models.QuerySet):
+    def for_user(self, user):
+        return for_user_shard(self.filter(user=user), user)
+    
+    def for_month(self, day):
+        return self.filter(month=day.replace(day=1))
+    
+    def recalculate_spent(self):
+        """Set spent from the transactions in the user's base currency, one UPDATE per budget (new budgets, repairs)"""
+        from transactions.models import Transaction
+        
+        budgets = list(self.values_list('pk', 'user_id', 'category_id', 'month'))
+        currencies = {
+            user_id: currency
+            for currency, user_ids in group_by_base_currency({budget[1] for budget in budgets}).items()
+            for user_id in user_ids
+        }
+        for pk, user_id, category_id, month in budgets:
+            spent = Transaction.objects.filter(
+                category_id=category_id, date__gte=month, date__lt=next_month(month),
+            ).order_by().values('category').annotate(
+                total=models.Sum(converted_cents(currencies[user_id])),
+            ).values('total')
+            # A subquery keeps the read and the write in one statement
+            self.filter(pk=pk).update(spent=Coalesce(models.Subquery(spent), Decimal('0')))
+
+def next_month(day):
+    """First day of the month after ``day``"""
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+class Budget(models.Model):
+    """Monthly spending limit for an expense category; spent is kept up to date by transaction signals"""
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='budgets', verbose_name='หมวดหมู่')
+    month = models.DateField(verbose_name='เดือน')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='งบประมาณ')
+    spent = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='ใช้ไปแล้ว')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='วันที่สร้าง')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='วันที่แก้ไขล่าสุด')
+    
+    objects = BudgetQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'งบประมาณ'
+        verbose_name_plural = 'งบประมาณ'
+        ordering = ['-month', '-amount']
+        unique_together = ['category', 'month']
+        indexes = [
+            models.Index(fields=['user', 'month']),
+        ]
+    
+    def __str__(self):
+        return f"{self.category.name} {self.month:%m/%Y}: {self.spent}/{self.amount}"
+    
+    @property
+    def remaining(self):
+        return self.amount - self.spent
+    
+    @property
+    def percent_used(self):
+        return float(self.spent / self.amount * 100) if self.amount else 0.0
+    
+    @property
+    def is_over_budget(self):
+        return self.spent > self.amount
+    
+    @property
+    def progress_width(self):
+        """Percent used capped at 100, for progress bars"""
+        return min(round(self.percent_used), 100)
+
+
+class CategoryStatsQuerySet(models.QuerySet):
+    def merge(self, count, mean, m2=0.0):
+        """
+        Fold a group of ``count`` amounts with this ``mean`` and ``m2`` into the stats, in one UPDATE
+        
+        This is Welford's update generalised to groups (Chan et al.): one new
+        transaction is ``merge(1, amount)``, a removed one ``merge(-1, amount)``.
+        Every right-hand side reads the row's old values, which is what
+        PostgreSQL and SQLite do, so concurrent writes never lose updates.
+        """
+        total = models.F('count') + count
+        delta = models.Value(float(mean)) - models.F('mean')
+        emptied = models.Q(count__lte=-count)
+        return self.update(
+            count=models.Case(models.When(emptied, then=0), default=total, output_field=models.IntegerField()),
+            mean=models.Case(
+                models.When(emptied, then=0.0), default=models.F('mean') + delta * count / total,
+                output_field=models.FloatField(),
+            ),
+            m2=models.Case(
+                models.When(emptied, then=0.0),
+                default=models.F('m2') + float(m2) + delta * delta * models.F('count') * count / total,
+                output_field=models.FloatField(),
+            ),
+        )
+
+    def recompute(self, user_ids, category_ids=None):
+        """{category id: (user id, count, mean, m2)} straight from the transactions of these users, in their base currencies"""
+        from transactions.models import Transaction
+        
+        found = {}
+        for currency, currency_user_ids in group_by_base_currency(user_ids).items():
+            transactions = Transaction.objects.using(self.db).filter(user_id__in=currency_user_ids)
+            if category_ids is not None:
+                transactions = transactions.filter(category_id__in=category_ids)
+            # Rows without a rate convert to NULL and are left out, as the transaction signals leave them out
+            rows = transactions.order_by().alias(amount_in_base=converted_cents(currency)).filter(
+                amount_in_base__isnull=False,
+            ).values(
+                'category_id', 'user_id',
+            ).annotate(
+                count=models.Count('amount_in_base'), mean=models.Avg('amount_in_base'),
+                variance=models.Variance('amount_in_base'),
+            )
+            found.update({
+                row['category_id']: (
+                    row['user_id'], row['count'], float(row['mean'] or 0), float(row['variance'] or 0) * row['count'],
+                )
+                for row in rows
+            })
+        return found
+    
+    def rebuild(self, user_ids, category_ids=None):
+        """Recompute the stats of these users (or just these categories) with one GROUP BY, e.g. after bulk inserts"""
+        found = self.recompute(user_ids, category_ids)
+        self.bulk_create(
+            [
+                CategoryStats(category_id=category_id, user_id=user_id, count=count, mean=mean, m2=m2)
+                for category_id, (user_id, count, mean, m2) in found.items()
+            ],
+            update_conflicts=True, unique_fields=['category'], update_fields=['count', 'mean', 'm2'],
+        )
+        emptied = self.filter(user_id__in=user_ids).exclude(category_id__in=found)
+        if category_ids is not None:
+            emptied = emptied.filter(category_id__in=category_ids)
+        emptied.update(count=0, mean=0, m2=0)
+
+class CategoryStats(models.Model):
+    """Running count, mean and squared deviations of a category's transaction amounts, for anomaly flags"""
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='category_stats')
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, related_name='stats', verbose_name='หมวดหมู่')
+    count = models.PositiveIntegerField(default=0, verbose_name='จำนวนรายการ')
+    mean = models.FloatField(default=0, verbose_name='ค่าเฉลี่ย')
+    # Sum of squared deviations from the mean; the variance is m2 / count
+    m2 = models.FloatField(default=0)
+    
+    objects = CategoryStatsQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'สถิติหมวดหมู่'
+        verbose_name_plural = 'สถิติหมวดหมู่'
+    
+    def __str__(self):
+        return f"{self.category.name}: {self.mean:.2f} ± {self.stddev:.2f} ({self.count})"
+    
+    @property
+    def stddev(self):
+        # m2 can drift a hair below zero after many float removals
+        return math.sqrt(max(self.m2, 0) / self.count) if self.count else 0.0
+    
+    def is_unusual(self, amount):
+        """
+        Whether ``amount`` (already counted in these stats) is unusually large
+        
+        It is compared with the mean and standard deviation of the category's
+        other transactions: counted in, a single outlier among n amounts can
+        never be more than (n - 1) / sqrt(n) deviations out.
+        """
+        n, k2 = self.count, settings.ANOMALY_STDDEV_THRESHOLD ** 2
+        deviation = float(amount) - self.mean
+        # (x - mean') > k * stddev' for the stats without x, rearranged to need no division or root
+        return n >= settings.ANOMALY_MIN_COUNT and deviation > 0 and deviation ** 2 * n * (n + k2) > k2 * (n - 1) * self.m2
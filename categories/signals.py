@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from accounts.caching import bump_data_version
+from .models import Category
+
+@receiver(post_save, sender=Category)
+def bump_data_version_on_save(sender, instance, **kwargs):
+    """Invalidate cached category payloads when a category is saved"""
+    bump_data_version(instance.user_id)
+
+@receiver(post_delete, sender=Category)
+def bump_data_version_on_delete(sender, instance, **kwargs):
+    """Invalidate cached category payloads when a category is deleted"""
+    bump_data_version(instance.user_id)
@@ -1,3 +1,211 @@
-from django.test import TestCase
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from jobs.models import Job
+from transactions.models import Transaction
+
+from .models import Budget, Category, CategoryStats
+
+User = get_user_model()
+
+
+class BudgetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='budget', password='x')
+        Category.objects.create_defaults([self.user])
+        self.food = Category.objects.for_user(self.user).get(name='อาหาร', category_type='expense')
+        self.travel = Category.objects.for_user(self.user).get(name='การเดินทาง')
+        self.month = timezone.now().date().replace(day=1)
+        self.client.force_login(self.user)
+
+    def add(self, category, amount, day=None, currency='THB'):
+        return Transaction.objects.create(
+            user=self.user, category=category, description='x', amount=amount, currency=currency,
+            transaction_type='expense', date=day or self.month,
+        )
+
+    def spent(self, category):
+        return Budget.objects.get(category=category, month=self.month).spent
+
+    def test_new_budget_starts_from_the_month_history(self):
+        self.add(self.food, '120.00')
+        self.add(self.food, '30.00', self.month.replace(year=self.month.year - 1))
+        response = self.client.post(
+            f"{reverse('budget_list')}?month={self.month:%Y-%m}", {f'category_{self.food.pk}': '100.00'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.spent(self.food), 120)
+
+    def test_spent_follows_create_edit_and_delete(self):
+        for category in (self.food, self.travel):
+            Budget.objects.create(user=self.user, category=category, month=self.month, amount=500)
+        transaction = self.add(self.food, '100.00')
+        self.add(self.food, '50.00')
+        self.assertEqual(self.spent(self.food), 150)
+
+        transaction.amount = 80
+        transaction.save()
+        self.assertEqual(self.spent(self.food), 130)
+
+        transaction.category = self.travel
+        transaction.save()
+        self.assertEqual((self.spent(self.food), self.spent(self.travel)), (50, 80))
+
+        transaction.date = self.month.replace(year=self.month.year - 1)
+        transaction.save()
+        self.assertEqual(self.spent(self.travel), 0)
+
+        transaction.date = self.month
+        transaction.save()
+        transaction.delete()
+        self.assertEqual(self.spent(self.travel), 0)
+
+    def test_spent_and_stats_are_in_the_base_currency(self):
+        call_command('load_exchange_rates', '--set', 'USD=36', '--date', '2000-01-01', stdout=StringIO())
+        Budget.objects.create(user=self.user, category=self.food, month=self.month, amount=1000)
+        self.add(self.food, '100.00')
+        foreign = self.add(self.food, '10.00', currency='USD')
+        self.assertEqual(self.spent(self.food), 460)
+
+        foreign.amount = 20
+        foreign.save()
+        self.assertEqual(self.spent(self.food), 820)
+        foreign.currency = 'THB'
+        foreign.save()
+        self.assertEqual(self.spent(self.food), 120)
+        foreign.currency = 'USD'
+        foreign.save()
+
+        stats = CategoryStats.objects.get(category=self.food)
+        self.assertEqual((stats.count, stats.mean), (2, 410))
+        _user_id, count, mean, m2 = CategoryStats.objects.recompute([self.user.pk])[self.food.pk]
+        self.assertEqual((count, mean), (2, 410))
+        self.assertAlmostEqual(stats.m2, m2, places=4)
+        Budget.objects.filter(category=self.food).recalculate_spent()
+        self.assertEqual(self.spent(self.food), 820)
+        output = StringIO()
+        checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+        call_command('backfill_aggregates', checkpoint=checkpoint, stdout=output)
+        self.assertIn('0 with mismatches', output.getvalue())
+
+        # Switching the base currency recounts budgets and stats in the new one
+        self.client.post(reverse('currency_settings'), {'base_currency': 'USD'})
+        self.assertEqual(self.spent(self.food), Decimal('22.78'))
+        self.assertContains(self.client.get(f"{reverse('budget_list')}?month={self.month:%Y-%m}"), 'ใช้ไป 22.78 $')
+        self.assertContains(self.client.get(reverse('dashboard')), '22.78 / 1000.00 $')
+        self.assertAlmostEqual(CategoryStats.objects.get(category=self.food).mean, (2.78 + 20) / 2)
+
+        Transaction.objects.get(pk=foreign.pk).delete()
+        self.assertEqual(self.spent(self.food), Decimal('2.78'))
+
+    def test_dashboard_reads_budgets_without_aggregating(self):
+        Budget.objects.create(user=self.user, category=self.food, month=self.month, amount=100)
+        self.add(self.food, '150.00')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'เกินงบ')
+        budget_queries = [query['sql'] for query in queries if 'categories_budget' in query['sql']]
+        self.assertEqual(len(budget_queries), 1)
+        self.assertNotIn('SUM', budget_queries[0].upper())
+
+
+@override_settings(ANOMALY_MIN_COUNT=5, ANOMALY_STDDEV_THRESHOLD=3)
+class AnomalyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='anomaly', password='x')
+        Category.objects.create_defaults([self.user])
+        self.food = Category.objects.for_user(self.user).get(name='อาหาร', category_type='expense')
+        self.travel = Category.objects.for_user(self.user).get(name='การเดินทาง')
+
+    def add(self, category, amount):
+        return Transaction.objects.create(
+            user=self.user, category=category, description='x', amount=amount,
+            transaction_type='expense', date=timezone.now().date(),
+        )
+
+    def assertStatsMatchHistory(self):
+        expected = CategoryStats.objects.recompute([self.user.pk])
+        for stats in CategoryStats.objects.filter(user=self.user):
+            _user_id, count, mean, m2 = expected.get(stats.category_id, (None, 0, 0.0, 0.0))
+            self.assertEqual(stats.count, count)
+            self.assertAlmostEqual(stats.mean, mean)
+            self.assertAlmostEqual(stats.m2, m2, places=4)
+
+    def test_running_stats_follow_every_write_without_scanning(self):
+        transactions = [self.add(self.food, amount) for amount in ('80.00', '95.50', '120.00', '60.25')]
+        with CaptureQueriesContext(connection) as queries:
+            transactions[0].amount = 300
+            transactions[0].save()
+        self.assertFalse([query for query in queries if 'AVG' in query['sql'].upper()])
+        self.assertStatsMatchHistory()
+
+        transactions[1].category = self.travel
+        transactions[1].save()
+        self.assertStatsMatchHistory()
+        transactions[2].delete()
+        transactions[1].delete()
+        self.assertStatsMatchHistory()
+        self.assertEqual(CategoryStats.objects.get(category=self.travel).count, 0)
+
+    def test_unusual_expenses_are_flagged(self):
+        for amount in ('100.00', '110.00', '90.00', '105.00', '95.00', '100.00'):
+            self.add(self.food, amount)
+        unusual = self.add(self.food, '400.00')
+        self.assertEqual(list(Transaction.objects.for_user(self.user).anomalies()), [unusual])
+
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('transaction_list'))
+        self.assertContains(response, 'ผิดปกติ', count=1)
+        self.assertFalse([query for query in queries if 'categories_categorystats' in query['sql'] and 'JOIN' not in query['sql']])
+        self.assertContains(self.client.get(reverse('dashboard')), 'รายจ่ายที่สูงผิดปกติเดือนนี้')
+
+
+class CategoryDeleteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='category-delete', password='x')
+        self.category = Category.objects.create(
+            user=self.user, name='Moving', category_type='expense', icon='💼', color='#FF6B6B',
+        )
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, category=self.category, description='Box', amount=10,
+                transaction_type='expense', date=timezone.now().date(),
+            )
+            for _ in range(3)
+        ])
+        self.client.force_login(self.user)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_large_category_is_deleted_by_a_worker(self):
+        with mock.patch('categories.views.DELETE_BATCH_SIZE', 2):
+            self.client.post(reverse('category_delete', args=[self.category.pk]))
+            self.client.post(reverse('category_delete', args=[self.category.pk]))
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'delete_category')
+        self.assertEqual(job.payload, {'category_id': self.category.pk, 'user_id': self.user.pk})
+        self.assertTrue(Category.objects.filter(pk=self.category.pk).exists())
+
+    @override_settings(SHARED_CACHE=True)
+    def test_small_category_is_deleted_inline(self):
+        self.client.post(reverse('category_delete', args=[self.category.pk]))
+        self.assertFalse(Category.objects.filter(pk=self.category.pk).exists())
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(SHARED_CACHE=False)
+    def test_without_a_shared_cache_the_view_deletes_inline(self):
+        with mock.patch('categories.views.DELETE_BATCH_SIZE', 2):
+            self.client.post(reverse('category_delete', args=[self.category.pk]))
+        self.assertFalse(Category.objects.filter(pk=self.category.pk).exists())
+        self.assertFalse(Job.objects.exists())
@@ -6,6 +6,7 @@ urlpatterns = [
     path('create/', views.category_create, name='category_create'),
     path('edit/<int:pk>/', views.category_edit, name='category_edit'),
     path('delete/<int:pk>/', views.category_delete, name='category_delete'),
+    path('budgets/', views.budget_list, name='budget_list'),
     path('api/list/', views.category_api_list, name='category_api_list'),
     path('api/create/', views.category_create_ajax, name='category_create_ajax'),
 ]
\ No newline at end of file
@@ -1,13 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
 from django.http import JsonResponse
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q
-from .models import Category
-from .forms import CategoryForm, CategoryFilterForm
+from django.urls import reverse
+from django.utils import timezone
+from datetime import datetime, timedelta
+from .models import Budget, Category, next_month
+from .forms import BudgetForm, CategoryForm, CategoryFilterForm
+from CashFlow_Tracker.db_routers import use_replica
+from jobs.handlers import DELETE_BATCH_SIZE
+from jobs.queue import enqueue_once
+from transactions.currency import currency_symbol
+from transactions.models import Transaction
 
 @login_required
+@use_replica
 def category_list(request):
     categories = Category.objects.for_user(request.user)
     filter_form = CategoryFilterForm(request.GET)
@@ -92,6 +102,18 @@ def category_delete(request, pk):
     
     if request.method == 'POST':
         category_name = category.name
+        # Categories with more than one batch of transactions are deleted by a worker, in batches
+        if settings.SHARED_CACHE and Transaction.objects.for_user(request.user).filter(
+                category=category).count() > DELETE_BATCH_SIZE:
+            job = enqueue_once(
+                'delete_category', {'category_id': category.pk, 'user_id': request.user.pk}, user=request.user,
+            )
+            messages.info(
+                request,
+                f'กำลังลบหมวดหมู่ "{category_name}" ในเบื้องหลัง ติดตามความคืบหน้าได้ที่ '
+                f'{reverse("job_status", args=[job.pk])}',
+            )
+            return redirect('category_list')
         category.delete()
         messages.success(request, f'ลบหมวดหมู่ "{category_name}" เรียบร้อยแล้ว')
         return redirect('category_list')
@@ -188,3 +210,51 @@ def category_create_ajax(request):
         'success': False,
         'error': 'Method not allowed'
     }, status=405)
+
+def _budget_month(value):
+    """First day of the month given as YYYY-MM, or of the current month"""
+    try:
+        return datetime.strptime(value or '', '%Y-%m').date()
+    except ValueError:
+        return timezone.now().date().replace(day=1)
+
+@login_required
+def budget_list(request):
+    month = _budget_month(request.GET.get('month'))
+    categories = list(Category.objects.for_user(request.user).expense_categories())
+    budgets = {budget.category_id: budget for budget in Budget.objects.for_user(request.user).for_month(month)}
+    
+    if request.method == 'POST':
+        form = BudgetForm(request.POST, categories=categories, budgets=budgets)
+        if form.is_valid():
+            created = []
+            for category, amount in form.amounts():
+                budget = budgets.get(category.pk)
+                if amount is None:
+                    if budget is not None:
+                        budget.delete()
+                elif budget is None:
+                    budget = Budget.objects.create(user=request.user, category=category, month=month, amount=amount)
+                    created.append(budget.pk)
+                elif budget.amount != amount:
+                    budget.amount = amount
+                    budget.save(update_fields=['amount', 'updated_at'])
+            # From here on transaction signals keep spent current; new budgets start from the month's history
+            Budget.objects.for_user(request.user).filter(pk__in=created).recalculate_spent()
+            messages.success(request, f'บันทึกงบประมาณเดือน {month:%m/%Y} เรียบร้อยแล้ว')
+            return redirect(f"{reverse('budget_list')}?month={month:%Y-%m}")
+    else:
+        form = BudgetForm(categories=categories, budgets=budgets)
+    
+    context = {
+        'form': form,
+        'rows': [(form[form.field_name(category)], budgets.get(category.pk)) for category in categories],
+        'month': month,
+        'previous_month': (month - timedelta(days=1)).replace(day=1),
+        'next_month': next_month(month),
+        'total_budget': sum(budget.amount for budget in budgets.values()),
+        'total_spent': sum(budget.spent for budget in budgets.values()),
+        # Budgets and their spending are in the user's base currency
+        'currency_symbol': currency_symbol(request.user.base_currency),
+    }
+    return render(request, 'categories/budget_list.html', context)
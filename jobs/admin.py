@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import Job
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'status', 'user', 'progress', 'attempts', 'run_at', 'created_at', 'finished_at']
+    list_filter = ['status', 'name', 'created_at']
+    search_fields = ['name', 'user__username', 'error']
+    ordering = ['-created_at']
+    readonly_fields = ['locked_by', 'locked_at', 'created_at', 'finished_at']
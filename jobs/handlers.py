@@ -0,0 +1,77 @@
+"""Built-in job handlers; each receives the Job and its payload as keyword arguments"""
+
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from accounts.caching import bump_data_version
+from CashFlow_Tracker.sharding import use_shard
+from categories.models import Category
+from transactions.models import RecurringTransaction, Transaction
+from transactions.recurring import materialize
+
+from .queue import job_handler
+
+User = get_user_model()
+
+# Transactions removed per DELETE when a category is deleted in the background
+DELETE_BATCH_SIZE = 1000
+
+
+@job_handler('provision_default_categories')
+def provision_default_categories(job, user_ids):
+    """Create the default categories for many users at once"""
+    users = list(User.objects.filter(pk__in=user_ids))
+    created = Category.objects.create_defaults(users)
+    return {'users': len(users), 'categories_created': len(created)}
+
+
+@job_handler('delete_category', shared_cache=True)
+def delete_category(job, category_id, user_id):
+    """Delete a category and its transactions in batches, reporting progress"""
+    with use_shard(user_id):
+        category = Category.objects.filter(pk=category_id, user_id=user_id).first()
+        if category is None:
+            return {'deleted_transactions': 0}
+        transactions = Transaction.objects.filter(category_id=category_id, user_id=user_id)
+        total = transactions.count()
+        deleted = 0
+        while True:
+            batch = list(transactions.values_list('pk', flat=True)[:DELETE_BATCH_SIZE])
+            if not batch:
+                break
+            # Through the ORM so the signals keep the category's budgets and stats in step with each batch
+            Transaction.objects.filter(pk__in=batch).delete()
+            deleted += len(batch)
+            job.set_progress(deleted * 100 // max(total, 1), f'{deleted}/{total} transactions')
+        category.delete()
+    bump_data_version(user_id)
+    return {'deleted_transactions': deleted, 'category': category.name}
+
+
+@job_handler('warm_dashboard_cache', shared_cache=True)
+def warm_dashboard_cache(job, user_ids):
+    """Fill the dashboard stats cache, e.g. after a deploy or a bulk import"""
+    from accounts.views import get_dashboard_stats
+
+    suffix = f"dashboard_{timezone.now().date().strftime('%Y%m%d')}"
+    users = User.objects.filter(pk__in=user_ids)
+    for index, user in enumerate(users, start=1):
+        get_dashboard_stats(user, suffix)
+        job.set_progress(index * 100 // len(user_ids), f'{index}/{len(user_ids)} users')
+    return {'users': len(user_ids)}
+
+
+@job_handler('materialize_recurring')
+def materialize_recurring(job, until=None):
+    """Create the due occurrences of every recurring rule (the same work as the materialize_recurring command)"""
+    until = date.fromisoformat(until) if until else timezone.now().date()
+    total_rules = total_occurrences = 0
+    for index, alias in enumerate(settings.SHARD_DATABASES, start=1):
+        rules, occurrences = materialize(RecurringTransaction.objects.using(alias), until)
+        total_rules += rules
+        total_occurrences += occurrences
+        job.set_progress(index * 100 // len(settings.SHARD_DATABASES), f'{index}/{len(settings.SHARD_DATABASES)} shards')
+    return {'rules': total_rules, 'occurrences': total_occurrences, 'until': until.isoformat()}
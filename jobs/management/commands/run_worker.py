@@ -0,0 +1,81 @@
+import os
+import signal
+import socket
+import time
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from jobs.queue import claim_jobs, requeue_stale_jobs, run_job
+
+# How often (in polls) stale running jobs are looked for
+STALE_CHECK_EVERY = 60
+
+
+class Command(BaseCommand):
+    help = 'Claim queued background jobs from the database and run them in a thread or process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at the same time')
+        parser.add_argument('--mode', choices=('thread', 'process'), default='thread',
+                            help='thread for I/O-bound jobs, process for CPU-bound ones')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty or the pool is full')
+        parser.add_argument('--once', action='store_true', help='Exit when no job is queued or running')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+
+        # Forked processes must not share the parent's database connections
+        connections.close_all()
+        pool = (Pool if options['mode'] == 'process' else ThreadPool)(concurrency)
+        self.stdout.write(f'Worker {worker_id} running {concurrency} {options["mode"]}(s)')
+
+        running = {}
+        polls = 0
+        try:
+            while True:
+                for job_id, result in list(running.items()):
+                    if result.ready():
+                        del running[job_id]
+                        self.report(job_id, result)
+
+                if not self.stopping:
+                    if polls % STALE_CHECK_EVERY == 0:
+                        requeued = requeue_stale_jobs()
+                        if requeued:
+                            self.stdout.write(self.style.WARNING(f'Recovered {requeued} job(s) from stopped workers'))
+                    polls += 1
+                    for job_id in claim_jobs(worker_id, concurrency - len(running)):
+                        running[job_id] = pool.apply_async(run_job, (job_id,))
+
+                if not running and (self.stopping or options['once']):
+                    break
+                time.sleep(options['poll_interval'] if not running else min(options['poll_interval'], 0.1))
+        except KeyboardInterrupt:
+            self.stdout.write('Interrupted; waiting for running jobs to finish')
+            for job_id, result in running.items():
+                result.wait()
+                self.report(job_id, result)
+        finally:
+            pool.close()
+            pool.join()
+            connections.close_all()
+
+    def stop(self, signum, frame):
+        self.stdout.write('Stopping after the running jobs finish')
+        self.stopping = True
+
+    def report(self, job_id, result):
+        try:
+            status = result.get()
+        except Exception as exc:
+            # run_job records handler errors itself; this is a failure of the bookkeeping
+            self.stderr.write(f'Job #{job_id} crashed the worker slot: {exc!r}')
+        else:
+            self.stdout.write(f'Job #{job_id} {status}')
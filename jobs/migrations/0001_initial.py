@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='งาน')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='ข้อมูลนำเข้า')),
+                ('status', models.CharField(choices=[('queued', 'รอดำเนินการ'), ('running', 'กำลังทำงาน'), ('succeeded', 'สำเร็จ'), ('failed', 'ล้มเหลว')], default='queued', max_length=10, verbose_name='สถานะ')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='เริ่มได้ตั้งแต่')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='จำนวนครั้งที่รัน')),
+                ('max_attempts', models.PositiveIntegerField(default=3, verbose_name='จำนวนครั้งสูงสุด')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='ความคืบหน้า (%)')),
+                ('progress_message', models.CharField(blank=True, max_length=255, verbose_name='ข้อความความคืบหน้า')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='ผลลัพธ์')),
+                ('error', models.TextField(blank=True, verbose_name='ข้อผิดพลาดล่าสุด')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='worker')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='เริ่มรันเมื่อ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='วันที่สร้าง')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='เสร็จเมื่อ')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to=settings.AUTH_USER_MODEL, verbose_name='ผู้ใช้')),
+            ],
+            options={
+                'verbose_name': 'งานเบื้องหลัง',
+                'verbose_name_plural': 'งานเบื้องหลัง',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_at'], name='jobs_job_status_f5c023_idx'), models.Index(fields=['user', 'created_at'], name='jobs_job_user_id_303f66_idx')],
+            },
+        ),
+    ]
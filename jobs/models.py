@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by ``manage.py run_worker``"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'รอดำเนินการ'),
+        (STATUS_RUNNING, 'กำลังทำงาน'),
+        (STATUS_SUCCEEDED, 'สำเร็จ'),
+        (STATUS_FAILED, 'ล้มเหลว'),
+    ]
+
+    name = models.CharField(max_length=100, verbose_name='งาน')
+    payload = models.JSONField(default=dict, blank=True, verbose_name='ข้อมูลนำเข้า')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='jobs', verbose_name='ผู้ใช้',
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, verbose_name='สถานะ')
+    run_at = models.DateTimeField(default=timezone.now, verbose_name='เริ่มได้ตั้งแต่')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='จำนวนครั้งที่รัน')
+    max_attempts = models.PositiveIntegerField(default=3, verbose_name='จำนวนครั้งสูงสุด')
+    progress = models.PositiveSmallIntegerField(default=0, verbose_name='ความคืบหน้า (%)')
+    progress_message = models.CharField(max_length=255, blank=True, verbose_name='ข้อความความคืบหน้า')
+    result = models.JSONField(null=True, blank=True, verbose_name='ผลลัพธ์')
+    error = models.TextField(blank=True, verbose_name='ข้อผิดพลาดล่าสุด')
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name='worker')
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name='เริ่มรันเมื่อ')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='วันที่สร้าง')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='เสร็จเมื่อ')
+
+    class Meta:
+        verbose_name = 'งานเบื้องหลัง'
+        verbose_name_plural = 'งานเบื้องหลัง'
+        ordering = ['-created_at']
+        indexes = [
+            # The worker's claim query: queued jobs that are due, oldest first
+            models.Index(fields=['status', 'run_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+    def set_progress(self, progress, message=''):
+        """Record progress from inside a handler; only these two columns are written"""
+        self.progress = max(0, min(100, int(progress)))
+        self.progress_message = message[:255]
+        Job.objects.filter(pk=self.pk).update(progress=self.progress, progress_message=self.progress_message)
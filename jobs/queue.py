@@ -0,0 +1,142 @@
+"""
+A small job queue stored in the primary database.
+
+Handlers register with ``@job_handler('name')`` and are called as
+``handler(job, **job.payload)``; whatever they return (JSON-serialisable) is
+stored as the job's result. ``enqueue()`` adds a job, ``manage.py run_worker``
+claims and runs them.
+
+Handlers registered with ``shared_cache=True`` change what the web processes
+have cached (they bump a user's data version or fill the dashboard cache), so
+they can only be queued when ``CACHE_URL`` points at a cache the worker shares
+with the web processes; otherwise their work would land in the worker's own
+memory.
+
+Claiming uses ``SELECT ... FOR UPDATE SKIP LOCKED`` where the database
+supports it (PostgreSQL), so concurrent workers never wait on each other. On
+SQLite each job is claimed with a conditional UPDATE (queued -> running)
+instead: only one worker's UPDATE matches, the others move on.
+"""
+
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+_handlers = {}
+_shared_cache_jobs = set()
+
+
+def job_handler(name, *, shared_cache=False):
+    """Register ``func`` as the handler for jobs called ``name``"""
+    def register(func):
+        if name in _handlers:
+            raise ValueError(f'A handler for job "{name}" is already registered')
+        _handlers[name] = func
+        if shared_cache:
+            _shared_cache_jobs.add(name)
+        return func
+    return register
+
+
+def get_handler(name):
+    try:
+        return _handlers[name]
+    except KeyError:
+        raise LookupError(f'No handler registered for job "{name}"')
+
+
+def needs_shared_cache(name):
+    return name in _shared_cache_jobs
+
+
+def enqueue(name, payload=None, *, user=None, max_attempts=3, run_at=None):
+    get_handler(name)
+    if needs_shared_cache(name) and not settings.SHARED_CACHE:
+        raise ImproperlyConfigured(
+            f'Job "{name}" updates the cache the web processes read; set CACHE_URL to a shared cache'
+        )
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        user=user,
+        max_attempts=max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def enqueue_once(name, payload=None, *, user=None, **options):
+    """``enqueue()`` unless the same job is still waiting in the queue; returns the waiting or the new job"""
+    waiting = Job.objects.filter(
+        name=name, payload=payload or {}, user=user, status=Job.STATUS_QUEUED,
+    ).order_by('pk').first()
+    return waiting or enqueue(name, payload, user=user, **options)
+
+
+def claim_jobs(worker_id, limit):
+    """Mark up to ``limit`` due jobs as running for this worker; returns their ids"""
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.STATUS_QUEUED, run_at__lte=now).order_by('run_at', 'pk')
+    claim = {'status': Job.STATUS_RUNNING, 'locked_by': worker_id, 'locked_at': now, 'attempts': F('attempts') + 1}
+
+    if connections[DEFAULT_DB_ALIAS].features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job_ids = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            Job.objects.filter(pk__in=job_ids).update(**claim)
+        return job_ids
+
+    job_ids = []
+    for job_id in due.values_list('pk', flat=True)[:limit * 2]:
+        if Job.objects.filter(pk=job_id, status=Job.STATUS_QUEUED).update(**claim):
+            job_ids.append(job_id)
+            if len(job_ids) == limit:
+                break
+    return job_ids
+
+
+def requeue_stale_jobs():
+    """Put running jobs whose worker stopped answering back in the queue; returns how many"""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    stale = Job.objects.filter(status=Job.STATUS_RUNNING, locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.STATUS_FAILED, error='Worker stopped before the job finished', finished_at=timezone.now(),
+    )
+    return failed + stale.update(status=Job.STATUS_QUEUED, locked_by='', locked_at=None)
+
+
+def run_job(job_id):
+    """Run a claimed job and record its result, or schedule a retry; returns the final status"""
+    job = Job.objects.get(pk=job_id)
+    try:
+        result = get_handler(job.name)(job, **job.payload)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            # Exponential backoff: JOB_RETRY_DELAY, then twice that, ...
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            job.status = Job.STATUS_QUEUED
+            job.run_at = timezone.now() + timedelta(seconds=delay)
+        else:
+            job.status = Job.STATUS_FAILED
+            job.finished_at = timezone.now()
+        job.locked_by, job.locked_at = '', None
+        job.save(update_fields=['status', 'run_at', 'error', 'locked_by', 'locked_at', 'finished_at'])
+    else:
+        job.status = Job.STATUS_SUCCEEDED
+        job.result = result
+        job.progress = 100
+        job.error = ''
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'progress', 'error', 'finished_at'])
+    finally:
+        # Pool threads and processes are long-lived; don't keep a connection per idle slot
+        connections.close_all()
+    return job.status
@@ -0,0 +1,84 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from categories.models import Category
+from transactions.models import Transaction
+
+from .models import Job
+from .queue import claim_jobs, enqueue, enqueue_once, run_job
+
+User = get_user_model()
+
+
+@override_settings(SHARED_CACHE=True)
+class JobQueueTests(TransactionTestCase):
+    # run_job closes its connection after every job, which a TestCase transaction would not survive
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='jobs-test', password='x')
+        self.category = Category.objects.create(
+            user=self.user, name='Moving', category_type='expense', icon='💼', color='#FF6B6B',
+        )
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, category=self.category, description='Box', amount=10,
+                transaction_type='expense', date=date(2026, 1, 1),
+            )
+            for _ in range(5)
+        ])
+
+    def test_claimed_job_runs_once_and_stores_its_result(self):
+        job = enqueue('delete_category', {'category_id': self.category.pk, 'user_id': self.user.pk}, user=self.user)
+        self.assertEqual(claim_jobs('test-worker', 10), [job.pk])
+        self.assertEqual(claim_jobs('other-worker', 10), [])
+
+        self.assertEqual(run_job(job.pk), Job.STATUS_SUCCEEDED)
+        job.refresh_from_db()
+        self.assertEqual(job.result['deleted_transactions'], 5)
+        self.assertEqual(job.progress, 100)
+        self.assertFalse(Category.objects.filter(pk=self.category.pk).exists())
+
+    def test_failed_job_is_retried_then_marked_failed(self):
+        job = enqueue('delete_category', {'unexpected': True}, user=self.user, max_attempts=2)
+        claim_jobs('test-worker', 1)
+        self.assertEqual(run_job(job.pk), Job.STATUS_QUEUED)
+        Job.objects.filter(pk=job.pk).update(run_at=job.created_at)
+        claim_jobs('test-worker', 1)
+        self.assertEqual(run_job(job.pk), Job.STATUS_FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('TypeError', job.error)
+
+    def test_status_endpoint_only_shows_own_jobs(self):
+        job = enqueue('warm_dashboard_cache', {'user_ids': [self.user.pk]}, user=self.user)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('job_status', args=[job.pk]))
+        self.assertEqual(response.json()['status'], Job.STATUS_QUEUED)
+
+        self.client.force_login(User.objects.create_user(username='someone-else', email='else@example.com', password='x'))
+        self.assertEqual(self.client.get(reverse('job_status', args=[job.pk])).status_code, 404)
+
+
+class EnqueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='enqueue-test', password='x')
+
+    @override_settings(SHARED_CACHE=False)
+    def test_cache_jobs_need_a_shared_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            enqueue('warm_dashboard_cache', {'user_ids': [self.user.pk]}, user=self.user)
+        enqueue('provision_default_categories', {'user_ids': [self.user.pk]}, user=self.user)
+        self.assertEqual(Job.objects.count(), 1)
+
+    @override_settings(SHARED_CACHE=True)
+    def test_enqueue_once_reuses_the_waiting_job(self):
+        payload = {'user_ids': [self.user.pk]}
+        first = enqueue_once('warm_dashboard_cache', payload, user=self.user)
+        self.assertEqual(enqueue_once('warm_dashboard_cache', payload, user=self.user), first)
+
+        Job.objects.filter(pk=first.pk).update(status=Job.STATUS_RUNNING)
+        self.assertNotEqual(enqueue_once('warm_dashboard_cache', payload, user=self.user), first)
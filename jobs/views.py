@@ -0,0 +1,30 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from .models import Job
+
+@login_required
+@require_GET
+def job_status(request, pk):
+    """Poll a background job of the signed-in user"""
+    job = get_object_or_404(Job, pk=pk, user=request.user)
+    data = {
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'progress_message': job.progress_message,
+        'attempts': job.attempts,
+        'result': job.result,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == Job.STATUS_FAILED:
+        # The traceback stays in the admin; the UI only needs to know the job gave up
+        data['error'] = 'งานนี้ล้มเหลว กรุณาลองใหม่อีกครั้ง'
+    response = JsonResponse(data)
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,303 @@
+// Enhanced Charts with dynamic data loading
+document.addEventListener('DOMContentLoaded', function() {
+    let cashFlowChart;
+
+    // Page data rendered by dashboard.html through json_script
+    const cashflowDataUrl = JSON.parse(document.getElementById('cashflow-data-url').textContent);
+    const cashflowForecastUrl = JSON.parse(document.getElementById('cashflow-forecast-url').textContent);
+    const currencySymbol = JSON.parse(document.getElementById('currency-symbol').textContent);
+    const expenseCategories = JSON.parse(document.getElementById('expense-categories-data').textContent);
+
+    // Initialize selectors
+    const periodSelector = document.getElementById('periodSelector');
+    const yearSelector = document.getElementById('yearSelector');
+    const chartLoading = document.getElementById('chartLoading');
+    const chartContainer = document.getElementById('chartContainer');
+
+    // Stats elements
+    const statsIncome = document.getElementById('statsIncome');
+    const statsExpenses = document.getElementById('statsExpenses');
+    const statsNetFlow = document.getElementById('statsNetFlow');
+
+    // Set current year as default
+    const currentYear = new Date().getFullYear();
+    if (yearSelector) {
+        // Add current year option if not present
+        if (![...yearSelector.options].find(opt => opt.value == currentYear)) {
+            const currentYearOption = new Option(currentYear.toString(), currentYear.toString());
+            yearSelector.insertBefore(currentYearOption, yearSelector.firstChild);
+        }
+        yearSelector.value = currentYear;
+    }
+
+    // Function to format currency
+    function formatCurrency(value) {
+        return new Intl.NumberFormat('th-TH', {
+            minimumFractionDigits: 2,
+            maximumFractionDigits: 2
+        }).format(value) + ' ' + currencySymbol;
+    }
+
+    // Function to update statistics
+    function updateStats(summary) {
+        if (statsIncome) statsIncome.textContent = formatCurrency(summary.total_income);
+        if (statsExpenses) statsExpenses.textContent = formatCurrency(summary.total_expenses);
+
+        if (statsNetFlow) {
+            const netFlow = summary.net_flow;
+            statsNetFlow.textContent = formatCurrency(netFlow);
+            statsNetFlow.className = `fw-bold small ${netFlow >= 0 ? 'text-success' : 'text-danger'}`;
+        }
+    }
+
+    // Function to load chart data
+    async function loadChartData(period = 'year', year = currentYear) {
+        try {
+            // Show loading
+            chartLoading.style.display = 'block';
+            chartContainer.style.opacity = '0.3';
+
+            const response = await fetch(`${cashflowDataUrl}?period=${period}&year=${year}`);
+            const data = await response.json();
+
+            // Update statistics
+            updateStats(data.summary);
+
+            // The rest of the current year is overlaid with the forecast
+            const remainingMonths = 11 - new Date().getMonth();
+            let forecast = null;
+            if (period === 'year' && year == currentYear && remainingMonths > 0) {
+                const forecastResponse = await fetch(`${cashflowForecastUrl}?months=${remainingMonths}`);
+                if (forecastResponse.ok) forecast = await forecastResponse.json();
+            }
+
+            // Update chart
+            updateChart(data, forecast);
+
+        } catch (error) {
+            console.error('Error loading chart data:', error);
+        } finally {
+            // Hide loading
+            chartLoading.style.display = 'none';
+            chartContainer.style.opacity = '1';
+        }
+    }
+
+    // Function to update chart
+    // Forecast values placed on the chart's matching month labels, null elsewhere
+    function forecastSeries(labels, forecast, key) {
+        return labels.map(label => {
+            const index = forecast.labels.indexOf(label);
+            return index === -1 ? null : forecast.datasets[key][index];
+        });
+    }
+
+    function updateChart(data, forecast = null) {
+        const areaCtx = document.getElementById('myAreaChart');
+        if (!areaCtx) return;
+
+        const forecastDatasets = forecast ? [
+            {
+                label: 'คาดการณ์รายรับ',
+                data: forecastSeries(data.labels, forecast, 'income'),
+                borderColor: '#1cc88a',
+                borderDash: [3, 3],
+                fill: false,
+                tension: 0.3,
+                yAxisID: 'y'
+            },
+            {
+                label: 'คาดการณ์รายจ่าย',
+                data: forecastSeries(data.labels, forecast, 'expenses'),
+                borderColor: '#e74a3b',
+                borderDash: [3, 3],
+                fill: false,
+                tension: 0.3,
+                yAxisID: 'y'
+            }
+        ] : [];
+
+        // Destroy existing chart
+        if (cashFlowChart) {
+            cashFlowChart.destroy();
+        }
+
+        cashFlowChart = new Chart(areaCtx, {
+            type: 'line',
+            data: {
+                labels: data.labels,
+                datasets: [
+                    {
+                        label: 'รายรับ',
+                        data: data.datasets.income,
+                        borderColor: '#1cc88a',
+                        backgroundColor: 'rgba(28, 200, 138, 0.1)',
+                        fill: true,
+                        tension: 0.3,
+                        yAxisID: 'y'
+                    },
+                    {
+                        label: 'รายจ่าย',
+                        data: data.datasets.expenses,
+                        borderColor: '#e74a3b',
+                        backgroundColor: 'rgba(231, 74, 59, 0.1)',
+                        fill: true,
+                        tension: 0.3,
+                        yAxisID: 'y'
+                    },
+                    {
+                        label: 'กำไรสุทธิ',
+                        data: data.datasets.net_flow,
+                        borderColor: '#4e73df',
+                        backgroundColor: 'rgba(78, 115, 223, 0.1)',
+                        fill: false,
+                        tension: 0.3,
+                        borderWidth: 3,
+                        pointRadius: 4,
+                        yAxisID: 'y'
+                    },
+                    {
+                        label: 'ยอดสะสม',
+                        data: data.datasets.running_balance,
+                        borderColor: '#f6c23e',
+                        backgroundColor: 'rgba(246, 194, 62, 0.1)',
+                        fill: false,
+                        tension: 0.3,
+                        borderWidth: 2,
+                        borderDash: [5, 5],
+                        yAxisID: 'y1'
+                    },
+                    ...forecastDatasets
+                ]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: {
+                    legend: {
+                        display: true,
+                        position: 'top',
+                        labels: {
+                            usePointStyle: true,
+                            pointStyle: 'circle'
+                        }
+                    },
+                    tooltip: {
+                        mode: 'index',
+                        intersect: false,
+                        callbacks: {
+                            label: function(context) {
+                                const label = context.dataset.label || '';
+                                const value = context.parsed.y;
+                                return label + ': ' + formatCurrency(value);
+                            }
+                        }
+                    }
+                },
+                scales: {
+                    x: {
+                        display: true,
+                        grid: {
+                            display: true,
+                            color: 'rgba(0,0,0,0.1)'
+                        }
+                    },
+                    y: {
+                        type: 'linear',
+                        display: true,
+                        position: 'left',
+                        beginAtZero: true,
+                        grid: {
+                            display: true,
+                            color: 'rgba(0,0,0,0.1)'
+                        },
+                        ticks: {
+                            callback: function(value) {
+                                return formatCurrency(value);
+                            }
+                        }
+                    },
+                    y1: {
+                        type: 'linear',
+                        display: true,
+                        position: 'right',
+                        grid: {
+                            drawOnChartArea: false,
+                        },
+                        ticks: {
+                            callback: function(value) {
+                                return formatCurrency(value);
+                            }
+                        }
+                    }
+                },
+                interaction: {
+                    intersect: false,
+                    mode: 'index'
+                }
+            }
+        });
+    }
+
+    // Event listeners for selectors
+    if (periodSelector) {
+        periodSelector.addEventListener('change', function() {
+            const period = this.value;
+            const year = yearSelector ? yearSelector.value : currentYear;
+
+            // Hide year selector for non-year periods
+            if (yearSelector) {
+                yearSelector.style.display = period === 'year' ? 'block' : 'none';
+            }
+
+            loadChartData(period, year);
+        });
+    }
+
+    if (yearSelector) {
+        yearSelector.addEventListener('change', function() {
+            const period = periodSelector ? periodSelector.value : 'year';
+            const year = this.value;
+            loadChartData(period, year);
+        });
+    }
+
+    // Initial load
+    loadChartData();
+
+    // Pie Chart - Expense Categories (unchanged)
+    const pieCtx = document.getElementById('myPieChart');
+    if (pieCtx) {
+        new Chart(pieCtx, {
+            type: 'pie',
+            data: {
+                labels: expenseCategories.labels,
+                datasets: [{
+                    data: expenseCategories.data,
+                    backgroundColor: expenseCategories.colors
+                }]
+            },
+            options: {
+                responsive: true,
+                maintainAspectRatio: false,
+                plugins: {
+                    legend: {
+                        display: true,
+                        position: 'bottom'
+                    },
+                    tooltip: {
+                        callbacks: {
+                            label: function(context) {
+                                const label = context.label || '';
+                                const value = context.parsed;
+                                const total = context.dataset.data.reduce((a, b) => a + b, 0);
+                                const percentage = ((value / total) * 100).toFixed(1);
+                                return label + ': ' + formatCurrency(value) + ' (' + percentage + '%)';
+                            }
+                        }
+                    }
+                }
+            }
+        });
+    }
+});
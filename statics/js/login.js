@@ -0,0 +1,35 @@
+// Form submission with loading state
+document.getElementById('loginForm').addEventListener('submit', function() {
+    const btn = document.getElementById('loginBtn');
+    btn.classList.add('loading');
+    btn.innerHTML = '<i class="fas fa-sign-in-alt me-2"></i>Signing in...';
+});
+
+// Input field focus effects
+document.querySelectorAll('.form-control').forEach(input => {
+    input.addEventListener('focus', function() {
+        this.parentElement.style.transform = 'scale(1.02)';
+    });
+
+    input.addEventListener('blur', function() {
+        this.parentElement.style.transform = 'scale(1)';
+    });
+});
+
+// Auto-dismiss alerts after 5 seconds
+document.querySelectorAll('.alert').forEach(alert => {
+    if (!alert.querySelector('.btn-close')) {
+        setTimeout(() => {
+            alert.style.opacity = '0';
+            alert.style.transform = 'translateY(-20px)';
+            setTimeout(() => alert.remove(), 300);
+        }, 5000);
+    }
+});
+
+// Keyboard shortcuts
+document.addEventListener('keydown', function(e) {
+    if (e.ctrlKey && e.key === 'Enter') {
+        document.getElementById('loginForm').submit();
+    }
+});
@@ -0,0 +1,342 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const typeField = document.getElementById('id_transaction_type');
+    const categoryField = document.getElementById('id_category');
+    const descriptionField = document.getElementById('id_description');
+    const amountField = document.getElementById('id_amount');
+    const currencyField = document.getElementById('id_currency');
+    const dateField = document.getElementById('id_date');
+
+    const typePreview = document.getElementById('typePreview');
+    const iconPreview = document.getElementById('iconPreview');
+    const descriptionPreview = document.getElementById('descriptionPreview');
+    const amountPreview = document.getElementById('amountPreview');
+    const transactionPreview = document.getElementById('transactionPreview');
+
+    // Everything the form needs (categories of both types, recent descriptions,
+    // defaults) is fetched once; switching types afterwards needs no network call
+    // Page data rendered by transaction_form.html through json_script
+    const formBootstrapUrl = JSON.parse(document.getElementById('transaction-form-bootstrap-url').textContent);
+    const initialCategoryData = document.getElementById('transaction-initial-category');
+    const isEditing = initialCategoryData !== null;
+    let initialCategoryId = isEditing ? String(JSON.parse(initialCategoryData.textContent)) : categoryField.value;
+    let formBootstrap = null;
+
+    const descriptionSuggestions = document.createElement('datalist');
+    descriptionSuggestions.id = 'descriptionSuggestions';
+    descriptionField.setAttribute('list', descriptionSuggestions.id);
+    descriptionField.parentNode.appendChild(descriptionSuggestions);
+
+    const bootstrapLoaded = fetch(formBootstrapUrl, {credentials: 'same-origin'})
+        .then(response => response.json())
+        .then(data => {
+            formBootstrap = data;
+
+            // Set the default date if no date is set
+            if (!dateField.value) {
+                dateField.value = data.defaults.date;
+            }
+            return data;
+        })
+        .catch(error => {
+            console.error('Error loading form data:', error);
+        });
+
+    // Set today's date as default until the bootstrap payload arrives
+    if (!dateField.value) {
+        const today = new Date();
+        const formattedDate = today.getFullYear() + '-' +
+                             String(today.getMonth() + 1).padStart(2, '0') + '-' +
+                             String(today.getDate()).padStart(2, '0');
+        dateField.value = formattedDate;
+    }
+
+    // Function to render categories and suggestions for a transaction type
+    function renderCategories(transactionType) {
+        categoryField.innerHTML = '<option value="">เลือกหมวดหมู่</option>';
+        descriptionSuggestions.innerHTML = '';
+        if (!transactionType || !formBootstrap) {
+            return;
+        }
+
+        formBootstrap.categories[transactionType].forEach(category => {
+            const option = document.createElement('option');
+            option.value = category.id;
+            option.textContent = category.display_name;
+            option.dataset.icon = category.icon;
+            option.dataset.color = category.color;
+            categoryField.appendChild(option);
+        });
+
+        formBootstrap.recent_descriptions[transactionType].forEach(description => {
+            const option = document.createElement('option');
+            option.value = description;
+            descriptionSuggestions.appendChild(option);
+        });
+
+        // Keep the current category when editing, otherwise suggest the last one used
+        if (initialCategoryId) {
+            categoryField.value = initialCategoryId;
+            initialCategoryId = '';
+        } else if (!isEditing && formBootstrap.defaults.category[transactionType]) {
+            categoryField.value = formBootstrap.defaults.category[transactionType];
+        }
+    }
+
+    // Function to load categories based on transaction type
+    function loadCategories(transactionType) {
+        if (formBootstrap) {
+            renderCategories(transactionType);
+            updatePreview();
+            return;
+        }
+        bootstrapLoaded.then(() => {
+            renderCategories(transactionType);
+            updatePreview();
+        });
+    }
+
+    // Function to update preview
+    function updatePreview() {
+        const type = typeField.value;
+        const categoryOption = categoryField.options[categoryField.selectedIndex];
+        const description = descriptionField.value || 'รายละเอียดธุรกรรม';
+        const amount = amountField.value || '0.00';
+
+        // Update description
+        descriptionPreview.textContent = description;
+
+        // Update amount
+        const sign = type === 'income' ? '+' : type === 'expense' ? '-' : '';
+        const symbols = formBootstrap ? formBootstrap.currency_symbols : {};
+        amountPreview.textContent = `${sign}${amount} ${symbols[currencyField.value] || currencyField.value}`;
+
+        // Update type badge
+        if (type === 'income') {
+            typePreview.textContent = 'รายรับ';
+            typePreview.className = 'badge bg-success';
+        } else if (type === 'expense') {
+            typePreview.textContent = 'รายจ่าย';
+            typePreview.className = 'badge bg-danger';
+        } else {
+            typePreview.textContent = 'เลือกประเภท';
+            typePreview.className = 'badge bg-secondary';
+        }
+
+        // Update category icon and color
+        if (categoryOption && categoryOption.dataset.icon) {
+            iconPreview.textContent = categoryOption.dataset.icon;
+            transactionPreview.style.backgroundColor = categoryOption.dataset.color || '#6c757d';
+        } else {
+            iconPreview.textContent = '💰';
+            transactionPreview.style.backgroundColor = '#6c757d';
+        }
+    }
+
+    // Event listeners
+    typeField.addEventListener('change', function() {
+        loadCategories(this.value);
+        updatePreview();
+    });
+
+    categoryField.addEventListener('change', updatePreview);
+    descriptionField.addEventListener('input', updatePreview);
+    amountField.addEventListener('input', updatePreview);
+    currencyField.addEventListener('change', updatePreview);
+
+    // Initialize
+    if (typeField.value) {
+        loadCategories(typeField.value);
+    }
+    updatePreview();
+
+    // Inline Category Creation Functionality
+    const addCategoryBtn = document.getElementById('addCategoryBtn');
+    const quickCategoryForm = document.getElementById('quickCategoryForm');
+    const saveCategoryBtn = document.getElementById('saveCategoryBtn');
+    const cancelCategoryBtn = document.getElementById('cancelCategoryBtn');
+    const newCategoryName = document.getElementById('newCategoryName');
+    const newCategoryIcon = document.getElementById('newCategoryIcon');
+    const newCategoryColor = document.getElementById('newCategoryColor');
+    const categoryCreationError = document.getElementById('categoryCreationError');
+    const categoryCreationLoading = document.getElementById('categoryCreationLoading');
+    const categorySelect = document.getElementById('id_category');
+
+    // Show category creation form
+    addCategoryBtn.addEventListener('click', function() {
+        const transactionType = document.getElementById('id_transaction_type').value;
+
+        if (!transactionType) {
+            alert('กรุณาเลือกประเภทธุรกรรมก่อน');
+            return;
+        }
+
+        // Toggle form visibility
+        if (quickCategoryForm.style.display === 'none') {
+            quickCategoryForm.style.display = 'block';
+            addCategoryBtn.innerHTML = '<i class="fas fa-minus"></i>';
+            addCategoryBtn.title = 'ซ่อนฟอร์มเพิ่มหมวดหมู่';
+            newCategoryName.focus();
+        } else {
+            hideQuickCategoryForm();
+        }
+    });
+
+    // Hide category creation form
+    function hideQuickCategoryForm() {
+        quickCategoryForm.style.display = 'none';
+        addCategoryBtn.innerHTML = '<i class="fas fa-plus"></i>';
+        addCategoryBtn.title = 'เพิ่มหมวดหมู่ใหม่';
+        resetCategoryForm();
+    }
+
+    // Reset category form
+    function resetCategoryForm() {
+        newCategoryName.value = '';
+        newCategoryIcon.value = '💰';
+        newCategoryColor.value = '#FF6B6B';
+        categoryCreationError.style.display = 'none';
+        categoryCreationLoading.style.display = 'none';
+    }
+
+    // Cancel category creation
+    cancelCategoryBtn.addEventListener('click', hideQuickCategoryForm);
+
+    // Save new category
+    saveCategoryBtn.addEventListener('click', function() {
+        const name = newCategoryName.value.trim();
+        const transactionType = document.getElementById('id_transaction_type').value;
+        const icon = newCategoryIcon.value;
+        const color = newCategoryColor.value;
+
+        // Validation
+        if (!name) {
+            showCategoryError('กรุณาระบุชื่อหมวดหมู่');
+            return;
+        }
+
+        if (!transactionType) {
+            showCategoryError('กรุณาเลือกประเภทธุรกรรมก่อน');
+            return;
+        }
+
+        // Show loading
+        categoryCreationError.style.display = 'none';
+        categoryCreationLoading.style.display = 'block';
+        saveCategoryBtn.disabled = true;
+
+        // Create category via AJAX
+        fetch('/categories/api/create/', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCookie('csrftoken')
+            },
+            body: JSON.stringify({
+                name: name,
+                category_type: transactionType,
+                icon: icon,
+                color: color
+            })
+        })
+        .then(response => response.json())
+        .then(data => {
+            categoryCreationLoading.style.display = 'none';
+            saveCategoryBtn.disabled = false;
+
+            if (data.success) {
+                // Add new category to select
+                const option = new Option(
+                    `${data.category.icon} ${data.category.name}`,
+                    data.category.id,
+                    true,
+                    true
+                );
+                categorySelect.appendChild(option);
+
+                // Keep the local category list in sync so type switches still show it
+                if (formBootstrap) {
+                    const categoryType = data.category.category_type;
+                    formBootstrap.categories[categoryType].push({
+                        id: data.category.id,
+                        name: data.category.name,
+                        display_name: data.category.display_name,
+                        icon: data.category.icon,
+                        color: data.category.color
+                    });
+                    formBootstrap.categories[categoryType].sort((a, b) => a.name.localeCompare(b.name));
+                }
+                option.dataset.icon = data.category.icon;
+                option.dataset.color = data.category.color;
+                updatePreview();
+
+                // Hide form and show success message
+                hideQuickCategoryForm();
+
+                // Show success notification
+                showSuccessNotification(`สร้างหมวดหมู่ "${data.category.name}" เรียบร้อยแล้ว`);
+
+            } else {
+                showCategoryError(data.error);
+            }
+        })
+        .catch(error => {
+            categoryCreationLoading.style.display = 'none';
+            saveCategoryBtn.disabled = false;
+            showCategoryError('เกิดข้อผิดพลาดในการสร้างหมวดหมู่');
+            console.error('Error:', error);
+        });
+    });
+
+    // Show category creation error
+    function showCategoryError(message) {
+        categoryCreationError.textContent = message;
+        categoryCreationError.style.display = 'block';
+    }
+
+    // Show success notification
+    function showSuccessNotification(message) {
+        // Create temporary success alert
+        const alert = document.createElement('div');
+        alert.className = 'alert alert-success alert-dismissible fade show mt-2';
+        alert.innerHTML = `
+            <i class="fas fa-check-circle me-2"></i>
+            ${message}
+            <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+        `;
+
+        // Insert after category form
+        const container = document.querySelector('.category-selection-container');
+        container.appendChild(alert);
+
+        // Auto-hide after 3 seconds
+        setTimeout(() => {
+            if (alert.parentNode) {
+                alert.remove();
+            }
+        }, 3000);
+    }
+
+    // Get CSRF token
+    function getCookie(name) {
+        let cookieValue = null;
+        if (document.cookie && document.cookie !== '') {
+            const cookies = document.cookie.split(';');
+            for (let i = 0; i < cookies.length; i++) {
+                const cookie = cookies[i].trim();
+                if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                    cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                    break;
+                }
+            }
+        }
+        return cookieValue;
+    }
+
+    // Enter key support for category name input
+    newCategoryName.addEventListener('keypress', function(e) {
+        if (e.key === 'Enter') {
+            e.preventDefault();
+            saveCategoryBtn.click();
+        }
+    });
+});
@@ -1,10 +1,10 @@
 from django.contrib import admin
-from .models import Transaction
+from .models import ExchangeRate, RecurringTransaction, Transaction
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ['date', 'description', 'category_display', 'transaction_type', 'amount', 'user', 'created_at']
-    list_filter = ['transaction_type', 'category', 'date', 'created_at']
+    list_display = ['date', 'description', 'category_display', 'transaction_type', 'amount', 'currency', 'user', 'created_at']
+    list_filter = ['transaction_type', 'currency', 'category', 'date', 'created_at']
     search_fields = ['description', 'notes', 'user__username', 'user__email', 'category__name']
     ordering = ['-date', '-created_at']
     date_hierarchy = 'date'
@@ -14,7 +14,7 @@ class TransactionAdmin(admin.ModelAdmin):
             'fields': ('user', 'transaction_type', 'category')
         }),
         ('รายละเอียด', {
-            'fields': ('description', 'amount', 'date', 'notes')
+            'fields': ('description', 'amount', 'currency', 'date', 'notes')
         }),
         ('ข้อมูลระบบ', {
             'fields': ('created_at', 'updated_at'),
@@ -27,3 +27,21 @@ class TransactionAdmin(admin.ModelAdmin):
         return obj.category_display
     category_display.short_description = 'หมวดหมู่'
     category_display.admin_order_field = 'category__name'
+
+
+@admin.register(RecurringTransaction)
+class RecurringTransactionAdmin(admin.ModelAdmin):
+    list_display = ['description', 'category', 'transaction_type', 'amount', 'currency', 'frequency', 'interval', 'next_date', 'is_active', 'user']
+    list_filter = ['is_active', 'frequency', 'transaction_type']
+    search_fields = ['description', 'user__username', 'category__name']
+    ordering = ['next_date']
+    readonly_fields = ('occurrence_count', 'created_at', 'updated_at')
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    # Edits here reach the default database only; load_exchange_rates writes every shard
+    list_display = ['date', 'currency', 'rate']
+    list_filter = ['currency']
+    ordering = ['-date', 'currency']
+    date_hierarchy = 'date'
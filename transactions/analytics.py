@@ -0,0 +1,295 @@
+"""
+Per-user analytics cube for period comparisons.
+
+A user's transactions are loaded with one ``values_list`` scan, converted to
+the user's base currency in the query, into a NumPy array of hundredths
+(satang for baht, so sums stay exact) indexed by
+[day, category, type], and the cube is cached under the user's data version.
+Year-over-year, month-over-month, rolling averages and category shares are
+then array reductions over that cube instead of one aggregate query per
+period and category. The cash-flow forecast projects the same cube forward
+from category averages plus the user's recurring rules.
+
+NumPy adds noticeably to import time, so only import this module from the
+views that use it.
+"""
+
+import calendar
+from datetime import date, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from accounts.caching import get_data_version
+from categories.models import Category
+
+from .currency import converted_amount
+from .models import RecurringTransaction, Transaction
+from .recurring import occurrences_until
+
+TYPES = ('income', 'expense')
+INCOME, EXPENSE = range(2)
+
+# Complete months before the current one that category averages are taken over
+FORECAST_HISTORY_MONTHS = 6
+
+
+def _month_number(year, month):
+    return year * 12 + month - 1
+
+
+def _baht(satang):
+    """Satang array (or scalar) to rounded baht floats for JSON"""
+    return np.round(np.asarray(satang) / 100, 2).tolist()
+
+
+def _change_pct(current, previous):
+    """Percentage change, None where the previous value is zero"""
+    current = np.asarray(current, dtype=np.float64)
+    previous = np.asarray(previous, dtype=np.float64)
+    change = np.divide(current - previous, np.abs(previous), out=np.full_like(current, np.nan), where=previous != 0)
+    return [None if np.isnan(value) else round(float(value) * 100, 1) for value in change.ravel()]
+
+
+class TransactionCube:
+    """Daily amounts of one user by [day, category, type], covering whole calendar years"""
+
+    def __init__(self, start, amounts, categories):
+        self.start = start
+        self.amounts = amounts
+        self.categories = categories
+        # Month totals are what every comparison works on; precompute them once
+        days = np.arange(amounts.shape[0]).astype('timedelta64[D]') + np.datetime64(start, 'D')
+        month_of_day = days.astype('datetime64[M]').astype(np.int64)
+        month_starts = np.flatnonzero(np.diff(month_of_day, prepend=month_of_day[0] - 1))
+        self.first_month = _month_number(start.year, start.month)
+        self.monthly = np.add.reduceat(amounts, month_starts, axis=0) if len(amounts) else amounts
+
+    @classmethod
+    def from_rows(cls, rows, categories, today):
+        """Build from (date, category id, type, amount) rows and (id, name, type, color) categories"""
+        categories = [
+            {'id': pk, 'name': name, 'type': category_type, 'color': color}
+            for pk, name, category_type, color in categories
+        ]
+        category_ids = np.array([category['id'] for category in categories], dtype=np.int64)
+        if rows:
+            dates, row_category_ids, types, amounts = zip(*rows)
+            ordinals = np.fromiter((day.toordinal() for day in dates), dtype=np.int64, count=len(rows))
+            first_year = min(date.fromordinal(int(ordinals.min())).year, today.year)
+            last_year = max(date.fromordinal(int(ordinals.max())).year, today.year)
+        else:
+            ordinals = np.empty(0, dtype=np.int64)
+            first_year = last_year = today.year
+
+        start = date(first_year, 1, 1)
+        day_count = date(last_year, 12, 31).toordinal() - start.toordinal() + 1
+        cube = np.zeros((day_count, len(categories), len(TYPES)), dtype=np.int64)
+        if rows:
+            order = np.argsort(category_ids)
+            columns = order[np.searchsorted(category_ids, np.array(row_category_ids, dtype=np.int64), sorter=order)]
+            type_index = np.fromiter((t == 'expense' for t in types), dtype=np.int64, count=len(rows))
+            satang = np.fromiter((round(amount * 100) for amount in amounts), dtype=np.int64, count=len(rows))
+            # add.at sums repeated (day, category, type) cells instead of overwriting them
+            np.add.at(cube, (ordinals - start.toordinal(), columns, type_index), satang)
+        return cls(start, cube, categories)
+
+    def months(self, first, count):
+        """[month, category, type] totals for ``count`` months from month number ``first``; zero outside the data"""
+        result = np.zeros((count, *self.monthly.shape[1:]), dtype=np.int64)
+        low = max(first, self.first_month)
+        high = min(first + count, self.first_month + len(self.monthly))
+        if low < high:
+            result[low - first:high - first] = self.monthly[low - self.first_month:high - self.first_month]
+        return result
+
+    def _scatter(self, rows, first, count):
+        """Sum (date, category id, type, amount) rows into [month, category, type] satang from month ``first``"""
+        result = np.zeros((count, len(self.categories), len(TYPES)), dtype=np.int64)
+        columns = {category['id']: column for column, category in enumerate(self.categories)}
+        rows = [row for row in rows if 0 <= _month_number(row[0].year, row[0].month) - first < count]
+        if rows:
+            dates, category_ids, types, amounts = zip(*rows)
+            np.add.at(result, (
+                np.fromiter((_month_number(day.year, day.month) - first for day in dates), dtype=np.int64, count=len(rows)),
+                np.fromiter((columns[pk] for pk in category_ids), dtype=np.int64, count=len(rows)),
+                np.fromiter((t == 'expense' for t in types), dtype=np.int64, count=len(rows)),
+            ), np.fromiter((round(amount * 100) for amount in amounts), dtype=np.int64, count=len(rows)))
+        return result
+
+    def forecast(self, today, months, recurring_history, upcoming):
+        """
+        Projected income, expenses and balance for the ``months`` months after today's
+
+        Each month gets every category's average over the last complete months
+        (at most FORECAST_HISTORY_MONTHS, and none before the first
+        transaction), leaving out recurring occurrences, plus the recurring
+        occurrences actually scheduled in it. Both are (date, category id,
+        type, amount) rows.
+        """
+        current = _month_number(today.year, today.month)
+        active_days = np.flatnonzero(self.amounts.any(axis=(1, 2)))
+        if len(active_days):
+            first_day = date.fromordinal(self.start.toordinal() + int(active_days[0]))
+            history_count = min(max(current - _month_number(first_day.year, first_day.month), 0), FORECAST_HISTORY_MONTHS)
+        else:
+            history_count = 0
+        history = self.months(current - history_count, history_count)
+        history -= self._scatter(recurring_history, current - history_count, history_count)
+        averages = history.mean(axis=0) if history_count else np.zeros(history.shape[1:])
+
+        # Month 0 is the rest of this month; only its recurring part is added to the opening balance
+        scheduled = self._scatter(upcoming, current, months + 1)
+        projected = averages + scheduled[1:]
+        by_type = projected.sum(axis=1)
+        net = by_type[:, INCOME] - by_type[:, EXPENSE]
+
+        to_date = self.amounts[:today.toordinal() - self.start.toordinal() + 1].sum(axis=(0, 1))
+        pending = scheduled[0].sum(axis=0)
+        opening = to_date[INCOME] - to_date[EXPENSE] + pending[INCOME] - pending[EXPENSE]
+        balance = opening + np.cumsum(net)
+
+        labels = []
+        for offset in range(1, months + 1):
+            year, month = divmod(current + offset, 12)
+            labels.append(f'{calendar.month_abbr[month + 1]} {year}')
+
+        categories = [
+            {**category, 'monthly_average': _baht(averages[column, TYPES.index(category['type'])])}
+            for column, category in enumerate(self.categories)
+            if averages[column, TYPES.index(category['type'])]
+        ]
+        categories.sort(key=lambda category: (category['type'], -category['monthly_average']))
+
+        return {
+            'labels': labels,
+            'datasets': {
+                'income': _baht(by_type[:, INCOME]),
+                'expenses': _baht(by_type[:, EXPENSE]),
+                'net_flow': _baht(net),
+                'running_balance': _baht(balance),
+            },
+            'summary': {
+                'total_income': _baht(by_type[:, INCOME].sum()),
+                'total_expenses': _baht(by_type[:, EXPENSE].sum()),
+                'net_flow': _baht(net.sum()),
+                'opening_balance': _baht(opening),
+                'final_balance': _baht(balance[-1]) if months else _baht(opening),
+                'period': 'forecast',
+                'data_points': months,
+                'history_months': history_count,
+            },
+            'categories': categories,
+        }
+
+    def compare(self, year, window=3):
+        """Every comparison for ``year`` in one JSON-ready dict"""
+        first = _month_number(year, 1)
+        # The window - 1 months before the year feed January's rolling average
+        history = self.months(first - max(window, 13), max(window, 13) + 12)
+        by_type = history.sum(axis=1)
+        current, previous = by_type[-12:], by_type[-24:-12]
+        net = by_type[:, INCOME] - by_type[:, EXPENSE]
+
+        # Trailing mean over the last ``window`` months via cumulative sums
+        cumulative = np.cumsum(np.vstack([by_type.T, net]), axis=1)
+        padded = np.hstack([np.zeros((3, 1), dtype=np.int64), cumulative])
+        rolling = (padded[:, window:] - padded[:, :-window]) / window
+
+        year_by_category = self.months(first, 12)
+        category_totals = year_by_category.sum(axis=0)
+        type_totals = category_totals.sum(axis=0)
+        shares = np.divide(
+            category_totals, type_totals, out=np.zeros(category_totals.shape), where=type_totals != 0,
+        )
+
+        categories = []
+        for column, category in enumerate(self.categories):
+            type_index = TYPES.index(category['type'])
+            monthly = year_by_category[:, column, type_index]
+            if not monthly.any():
+                continue
+            categories.append({
+                **category,
+                'monthly': _baht(monthly),
+                'total': _baht(category_totals[column, type_index]),
+                'share_pct': round(float(shares[column, type_index]) * 100, 1),
+            })
+        categories.sort(key=lambda category: (category['type'], -category['total']))
+
+        return {
+            'year': year,
+            'labels': [f'{calendar.month_abbr[month]} {year}' for month in range(1, 13)],
+            'year_over_year': {
+                name: {
+                    'current': _baht(current[:, index]),
+                    'previous': _baht(previous[:, index]),
+                    'change_pct': _change_pct(current[:, index], previous[:, index]),
+                    'current_total': _baht(current[:, index].sum()),
+                    'previous_total': _baht(previous[:, index].sum()),
+                    'total_change_pct': _change_pct(current[:, index].sum(), previous[:, index].sum())[0],
+                }
+                for index, name in enumerate(TYPES)
+            },
+            'month_over_month': {
+                name: _change_pct(by_type[-12:, index], by_type[-13:-1, index])
+                for index, name in enumerate(TYPES)
+            },
+            'rolling_average': {
+                'window': window,
+                **{name: _baht(rolling[index, -12:]) for index, name in enumerate((*TYPES, 'net'))},
+            },
+            'category_shares': categories,
+        }
+
+
+def _converted_rows(transactions, currency):
+    """(date, category id, type, amount in ``currency``) rows; rows without a rate are left out, as the totals do"""
+    return list(
+        transactions.order_by().annotate(converted=converted_amount(currency)).filter(converted__isnull=False)
+        .values_list('date', 'category_id', 'transaction_type', 'converted')
+    )
+
+
+def get_cube(user):
+    """The user's cube in their base currency, rebuilt only after their data changes"""
+    cache_key = f"analytics_cube_{user.id}_{user.base_currency}_{get_data_version(user.id)}"
+    cube = cache.get(cache_key)
+    if cube is None:
+        rows = _converted_rows(Transaction.objects.for_user(user), user.base_currency)
+        categories = Category.objects.for_user(user).order_by('pk').values_list('pk', 'name', 'category_type', 'color')
+        cube = TransactionCube.from_rows(rows, list(categories), timezone.now().date())
+        cache.set(cache_key, cube, getattr(settings, 'CACHE_TTL', 300))
+    return cube
+
+
+def get_forecast(user, months):
+    """The user's cash-flow forecast for the next ``months`` months, cached by data version and day"""
+    today = timezone.now().date()
+    cache_key = f"cashflow_forecast_{user.id}_{user.base_currency}_{months}_{today:%Y%m%d}_{get_data_version(user.id)}"
+    forecast = cache.get(cache_key)
+    if forecast is None:
+        cube = get_cube(user)
+        current = _month_number(today.year, today.month)
+        year, month = divmod(current - FORECAST_HISTORY_MONTHS, 12)
+        history_start = date(year, month + 1, 1)
+        recurring_history = _converted_rows(
+            Transaction.objects.for_user(user)
+            .filter(recurring_rule__isnull=False, date__gte=history_start, date__lt=today.replace(day=1)),
+            user.base_currency,
+        )
+        year, month = divmod(current + months + 1, 12)
+        horizon = date(year, month + 1, 1) - timedelta(days=1)
+        upcoming = []
+        # Future occurrences are converted at the latest known rate
+        rules = RecurringTransaction.objects.for_user(user).filter(is_active=True).annotate(
+            converted=converted_amount(user.base_currency, day='next_date'),
+        ).filter(converted__isnull=False)
+        for rule in rules:
+            dates, _next_index = occurrences_until(rule, horizon)
+            upcoming += [(day, rule.category_id, rule.transaction_type, rule.converted) for day in dates]
+        forecast = cube.forecast(today, months, recurring_history, upcoming)
+        cache.set(cache_key, forecast, getattr(settings, 'CACHE_TTL', 300))
+    return forecast
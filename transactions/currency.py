@@ -0,0 +1,129 @@
+"""
+Currencies and conversion to a user's base currency.
+
+Exchange rates are stored per currency and day as the value of one unit in
+PIVOT_CURRENCY. Totals are converted inside the aggregate query: every row's
+amount is multiplied by a correlated subquery that picks the rate of its
+currency on its date, so a total stays one query however many currencies it
+covers. Rows already in the base currency skip the lookup.
+
+Budgets and category statistics store each row converted and rounded to
+cents (converted_cents); the transaction signals convert the one row they
+see with convert(), which rounds the same way.
+
+Kept free of model imports at module level so ``accounts.models`` can use
+the choices.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Func, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Round
+
+PIVOT_CURRENCY = 'THB'
+CURRENCY_CHOICES = [
+    ('THB', 'บาท (THB)'),
+    ('USD', 'ดอลลาร์สหรัฐ (USD)'),
+]
+CURRENCY_SYMBOLS = {
+    'THB': '฿',
+    'USD': '$',
+}
+
+# Converted amounts carry more places than stored ones until they are summed
+CONVERTED_FIELD = DecimalField(max_digits=20, decimal_places=6)
+CENT = Decimal('0.01')
+
+
+class Divide(Func):
+    """``numerator / denominator`` as a decimal division on every backend"""
+
+    arg_joiner = ' / '
+    template = '(%(expressions)s)'
+    output_field = CONVERTED_FIELD
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite keeps whole decimals as integers, and dividing two integers truncates
+        sql, params = self.as_sql(compiler, connection, template='(1.0 * %(expressions)s)', **extra_context)
+        return f'CAST({sql} AS NUMERIC)', params
+
+
+def currency_symbol(currency):
+    return CURRENCY_SYMBOLS.get(currency, currency)
+
+
+def exchange_rate(currency, day):
+    """
+    Expression for the value of one ``currency`` in PIVOT_CURRENCY on ``day``
+
+    The latest rate on or before the day is used, so weekends and holidays
+    take the last published one; days before the first rate take the first.
+    """
+    from .models import ExchangeRate
+
+    rates = ExchangeRate.objects.filter(currency=currency)
+    return Coalesce(
+        Subquery(rates.filter(date__lte=day).order_by('-date').values('rate')[:1]),
+        Subquery(rates.filter(date__gt=day).order_by('date').values('rate')[:1]),
+        output_field=CONVERTED_FIELD,
+    )
+
+
+def converted_amount(base_currency, amount='amount', currency='currency', day='date'):
+    """Expression for each row's ``amount`` in ``base_currency`` at the rates of the row's ``day``"""
+    to_pivot = Case(
+        When(**{currency: PIVOT_CURRENCY}, then=Value(Decimal(1))),
+        default=exchange_rate(OuterRef(currency), OuterRef(day)),
+        output_field=CONVERTED_FIELD,
+    )
+    value = F(amount) * to_pivot
+    if base_currency != PIVOT_CURRENCY:
+        value = Divide(value, exchange_rate(base_currency, OuterRef(day)))
+    return Case(
+        When(**{currency: base_currency}, then=F(amount)),
+        default=ExpressionWrapper(value, output_field=CONVERTED_FIELD),
+        output_field=CONVERTED_FIELD,
+    )
+
+
+def group_by_base_currency(user_ids):
+    """{base currency: [user ids]}, for converting many users' rows with one query per currency"""
+    from django.contrib.auth import get_user_model
+
+    groups = {}
+    for user_id, currency in get_user_model().objects.filter(pk__in=user_ids).values_list('pk', 'base_currency'):
+        groups.setdefault(currency, []).append(user_id)
+    return groups
+
+
+def converted_cents(base_currency, **fields):
+    """converted_amount() rounded to cents per row, the way budgets and category stats count it"""
+    return Round(converted_amount(base_currency, **fields), 2, output_field=CONVERTED_FIELD)
+
+
+def rate_on(currency, day, using=None):
+    """The value of one ``currency`` in PIVOT_CURRENCY on ``day``, picked like exchange_rate(); None without rates"""
+    from .models import ExchangeRate
+
+    if currency == PIVOT_CURRENCY:
+        return Decimal(1)
+    rates = ExchangeRate.objects.using(using).filter(currency=currency)
+    rate = rates.filter(date__lte=day).order_by('-date').values_list('rate', flat=True).first()
+    if rate is None:
+        rate = rates.filter(date__gt=day).order_by('date').values_list('rate', flat=True).first()
+    return rate
+
+
+def convert(amount, currency, base_currency, day, using=None):
+    """
+    One ``amount`` of ``currency`` in ``base_currency`` on ``day``, rounded like converted_cents()
+
+    None when a rate is missing, as the queries' NULL; amounts already in
+    the base currency need no query.
+    """
+    if currency == base_currency:
+        return amount
+    to_pivot, from_pivot = rate_on(currency, day, using), rate_on(base_currency, day, using)
+    if to_pivot is None or from_pivot is None:
+        return None
+    return (Decimal(amount) * to_pivot / from_pivot).quantize(CENT, rounding=ROUND_HALF_UP)
@@ -1,12 +1,13 @@
 from django import forms
 from django.forms.widgets import DateInput
-from .models import Transaction
+from django.utils import timezone
+from .models import RecurringTransaction, Transaction
 from categories.models import Category
 
 class TransactionForm(forms.ModelForm):
     class Meta:
         model = Transaction
-        fields = ['transaction_type', 'category', 'description', 'amount', 'date', 'notes']
+        fields = ['transaction_type', 'category', 'description', 'amount', 'currency', 'date', 'notes']
         widgets = {
             'transaction_type': forms.Select(attrs={
                 'class': 'form-control',
@@ -26,6 +27,7 @@ class TransactionForm(forms.ModelForm):
                 'step': '0.01',
                 'min': '0.01'
             }),
+            'currency': forms.Select(attrs={'class': 'form-select currency-select'}),
             'date': DateInput(attrs={
                 'class': 'form-control',
                 'type': 'date'
@@ -40,7 +42,8 @@ class TransactionForm(forms.ModelForm):
             'transaction_type': 'ประเภทธุรกรรม',
             'category': 'หมวดหมู่',
             'description': 'รายละเอียด',
-            'amount': 'จำนวนเงิน (บาท)',
+            'amount': 'จำนวนเงิน',
+            'currency': 'สกุลเงิน',
             'date': 'วันที่',
             'notes': 'หมายเหตุ',
         }
@@ -72,6 +75,10 @@ class TransactionForm(forms.ModelForm):
         
         # Make notes optional in UI
         self.fields['notes'].required = False
+        
+        # New transactions start in the user's base currency
+        if user and not self.instance.pk:
+            self.initial.setdefault('currency', user.base_currency)
 
     def clean(self):
         cleaned_data = super().clean()
@@ -110,6 +117,55 @@ class TransactionForm(forms.ModelForm):
         return transaction
 
 
+class RecurringTransactionForm(forms.ModelForm):
+    class Meta:
+        model = RecurringTransaction
+        fields = ['transaction_type', 'category', 'description', 'amount', 'currency', 'interval', 'frequency',
+                  'start_date', 'end_date', 'notes']
+        widgets = {
+            'transaction_type': forms.Select(attrs={'class': 'form-control'}),
+            'category': forms.Select(attrs={'class': 'form-control'}),
+            'description': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'เช่น ค่าเช่าห้อง, เงินเดือน, Netflix'
+            }),
+            'amount': forms.NumberInput(attrs={
+                'class': 'form-control',
+                'placeholder': '0.00',
+                'step': '0.01',
+                'min': '0.01'
+            }),
+            'currency': forms.Select(attrs={'class': 'form-control'}),
+            'interval': forms.NumberInput(attrs={'class': 'form-control', 'min': '1'}),
+            'frequency': forms.Select(attrs={'class': 'form-control'}),
+            'start_date': DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'end_date': DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'notes': forms.Textarea(attrs={
+                'class': 'form-control',
+                'rows': 2,
+                'placeholder': 'หมายเหตุเพิ่มเติม (ไม่บังคับ)'
+            }),
+        }
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user', None)
+        super().__init__(*args, **kwargs)
+        self.user = user
+        if user:
+            self.fields['category'].queryset = Category.objects.for_user(user)
+            self.initial.setdefault('currency', user.base_currency)
+        self.fields['category'].empty_label = "เลือกหมวดหมู่"
+        self.fields['end_date'].help_text = 'เว้นว่างไว้หากไม่มีกำหนดสิ้นสุด'
+
+    def save(self, commit=True):
+        rule = super().save(commit=False)
+        if self.user:
+            rule.user = self.user
+        if commit:
+            rule.save()
+        return rule
+
+
 class TransactionFilterForm(forms.Form):
     PERIOD_CHOICES = [
         ('', 'ทั้งหมด'),
@@ -168,4 +224,49 @@ class TransactionFilterForm(forms.Form):
         super().__init__(*args, **kwargs)
         
         if user:
-            self.fields['category'].queryset = Category.objects.filter(user=user).order_by('category_type', 'name')
\ No newline at end of file
+            self.fields['category'].queryset = Category.objects.filter(user=user).order_by('category_type', 'name')
+
+class PivotReportForm(forms.Form):
+    GRANULARITY_CHOICES = [
+        ('month', 'รายเดือน'),
+        ('week', 'รายสัปดาห์'),
+    ]
+    
+    start = forms.DateField(
+        required=False,
+        label='ตั้งแต่',
+        widget=DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    end = forms.DateField(
+        required=False,
+        label='ถึง',
+        widget=DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    granularity = forms.ChoiceField(
+        choices=GRANULARITY_CHOICES,
+        required=False,
+        label='แบ่งตาม',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    transaction_type = forms.ChoiceField(
+        choices=[('', 'ทุกประเภท')] + Transaction.TRANSACTION_TYPES,
+        required=False,
+        label='ประเภท',
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    
+    def clean(self):
+        from .reports import PIVOT_MAX_COLUMNS, period_count
+
+        cleaned_data = super().clean()
+        # Defaults to the current year by month
+        today = timezone.now().date()
+        start = cleaned_data.get('start') or today.replace(month=1, day=1)
+        end = cleaned_data.get('end') or today.replace(month=12, day=31)
+        granularity = cleaned_data.get('granularity') or 'month'
+        if end < start:
+            raise forms.ValidationError('วันสิ้นสุดต้องไม่ก่อนวันเริ่มต้น')
+        if period_count(start, end, granularity) > PIVOT_MAX_COLUMNS:
+            raise forms.ValidationError(f'ช่วงเวลายาวเกินไป (สูงสุด {PIVOT_MAX_COLUMNS} คอลัมน์)')
+        cleaned_data.update(start=start, end=end, granularity=granularity)
+        return cleaned_data
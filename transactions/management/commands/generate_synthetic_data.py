@@ -0,0 +1,291 @@
+import calendar
+import math
+import multiprocessing
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction as db_transaction
+from django.utils import timezone
+
+User = get_user_model()
+
+# Variable expenses: (category, share of daily transactions, median amount, spread, descriptions)
+EXPENSE_PROFILES = [
+    ('อาหาร', 0.52, 85, 0.55, [
+        'ข้าวมันไก่', 'กะเพราหมูสับ', 'ก๋วยเตี๋ยวเรือ', 'ส้มตำไก่ย่าง', 'ข้าวผัดกุ้ง', 'กาแฟเย็น',
+        'ชานมไข่มุก', 'ข้าวเหนียวหมูปิ้ง', 'ผัดไทย', 'โจ๊กหมู', 'ร้านสะดวกซื้อ', 'หมูกระทะ',
+        'สุกี้', 'ข้าวขาหมู', 'ขนมจีนน้ำยา', 'ซื้อกับข้าวตลาดนัด',
+    ]),
+    ('การเดินทาง', 0.20, 45, 0.7, [
+        'ค่ารถไฟฟ้า BTS', 'ค่ารถไฟฟ้า MRT', 'วินมอเตอร์ไซค์', 'ค่าแท็กซี่', 'เติมน้ำมัน',
+        'ค่าทางด่วน', 'Grab', 'รถเมล์', 'ค่าที่จอดรถ',
+    ]),
+    ('ช้อปปิ้ง', 0.08, 450, 0.9, [
+        'ซื้อของ Shopee', 'ซื้อของ Lazada', 'ของใช้ในบ้าน', 'ซูเปอร์มาร์เก็ต', 'เครื่องสำอาง',
+        'อุปกรณ์ไอที', 'ของฝาก',
+    ]),
+    ('ความบันเทิง', 0.07, 300, 0.8, [
+        'ดูหนัง', 'คาราโอเกะ', 'คอนเสิร์ต', 'สมัคร Netflix', 'เกมออนไลน์', 'ปาร์ตี้กับเพื่อน',
+    ]),
+    ('เสื้อผ้า', 0.04, 550, 0.7, [
+        'เสื้อยืด', 'กางเกงยีนส์', 'รองเท้าผ้าใบ', 'ชุดทำงาน', 'กระเป๋า',
+    ]),
+    ('สุขภาพ', 0.04, 350, 0.9, [
+        'ซื้อยา', 'ค่าหมอ', 'ทำฟัน', 'ฟิตเนส', 'วิตามิน',
+    ]),
+    ('การศึกษา', 0.02, 400, 0.8, [
+        'ซื้อหนังสือ', 'คอร์สออนไลน์', 'ค่าเรียนพิเศษ', 'อุปกรณ์การเรียน',
+    ]),
+    ('อื่นๆ', 0.03, 200, 1.0, [
+        'ทำบุญ', 'ซองงานแต่ง', 'ค่าตัดผม', 'ซักรีด', 'ค่าส่งของ',
+    ]),
+]
+
+# Seasonal multipliers on spending activity by month (Songkran, 11.11, year-end festivals)
+SEASONAL_ACTIVITY = {1: 1.1, 2: 0.9, 3: 0.95, 4: 1.3, 5: 1.05, 6: 0.95, 7: 0.95, 8: 1.0, 9: 0.9, 10: 1.0, 11: 1.2, 12: 1.45}
+SEASONAL_CATEGORY_BOOST = {
+    4: {'การเดินทาง': 1.8, 'ความบันเทิง': 1.5},
+    5: {'การศึกษา': 2.5},
+    11: {'ช้อปปิ้ง': 2.0},
+    12: {'ช้อปปิ้ง': 2.2, 'ความบันเทิง': 1.6, 'เสื้อผ้า': 1.5},
+}
+# Electricity bills peak in the hot season
+ELECTRICITY_SEASON = {3: 1.4, 4: 1.6, 5: 1.5, 6: 1.2}
+
+
+def _amount(rng, median, spread):
+    value = rng.lognormvariate(math.log(median), spread)
+    return Decimal(str(max(round(value, 2), 1))).quantize(Decimal('0.01'))
+
+
+def _month_day(year, month, day):
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def _iter_months(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+def build_user_transactions(rng, start, end, target_count):
+    """Return (category name, type, description, amount, date) tuples for one user"""
+    salary = Decimal(int(round(rng.lognormvariate(math.log(25000), 0.45), -2)))
+    rent = Decimal(int(round(float(salary) * rng.uniform(0.18, 0.35), -2)))
+    payday = rng.choice([25, 28, 30])
+    has_side_business = rng.random() < 0.3
+    invests = rng.random() < 0.4
+
+    fixed = []
+    for year, month in _iter_months(start, end):
+        entries = [
+            ('เงินเดือน', 'income', 'เงินเดือน', salary, _month_day(year, month, payday)),
+            ('ที่อยู่อาศัย', 'expense', 'ค่าเช่าห้อง', rent, _month_day(year, month, 1)),
+            ('สาธารณูปโภค', 'expense', 'ค่าไฟฟ้า',
+             _amount(rng, 900 * ELECTRICITY_SEASON.get(month, 1.0), 0.25), _month_day(year, month, 5)),
+            ('สาธารณูปโภค', 'expense', 'ค่าน้ำประปา', _amount(rng, 150, 0.2), _month_day(year, month, 5)),
+            ('สาธารณูปโภค', 'expense', 'ค่าโทรศัพท์และอินเทอร์เน็ต', _amount(rng, 599, 0.05), _month_day(year, month, 10)),
+        ]
+        if month == 12 and rng.random() < 0.6:
+            entries.append(('โบนัส', 'income', 'โบนัสประจำปี',
+                            (salary * Decimal(rng.choice([1, 1, 1.5, 2, 3]))).quantize(Decimal('0.01')),
+                            _month_day(year, month, payday)))
+        if has_side_business and rng.random() < 0.7:
+            entries.append(('ธุรกิจส่วนตัว', 'income', rng.choice(['ขายของออนไลน์', 'รับงานฟรีแลนซ์']),
+                            _amount(rng, 4000, 0.6), _month_day(year, month, rng.randint(1, 28))))
+        if invests and month in (3, 6, 9, 12):
+            entries.append(('การลงทุน', 'income', 'เงินปันผล', _amount(rng, 1500, 0.8), _month_day(year, month, 20)))
+        fixed.extend(entry for entry in entries if start <= entry[4] <= end)
+
+    if len(fixed) >= target_count:
+        return rng.sample(fixed, target_count)
+
+    # Spread the remaining transactions over days, weighted by weekday and season
+    days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+    weights = [
+        SEASONAL_ACTIVITY[day.month] * (1.3 if day.weekday() >= 5 else 1.0) * (1.2 if day.day >= payday else 1.0)
+        for day in days
+    ]
+    variable = []
+    for day in rng.choices(days, weights=weights, k=target_count - len(fixed)):
+        boosts = SEASONAL_CATEGORY_BOOST.get(day.month, {})
+        profile = rng.choices(
+            EXPENSE_PROFILES,
+            weights=[share * boosts.get(name, 1.0) for name, share, *_rest in EXPENSE_PROFILES],
+        )[0]
+        name, _share, median, spread, descriptions = profile
+        variable.append((name, 'expense', rng.choice(descriptions), _amount(rng, median, spread), day))
+
+    return fixed + variable
+
+
+def generate_users(options, user_indexes):
+    """Create users, their default categories and transactions; returns (users, transactions) created"""
+    from accounts.caching import bump_data_version
+    from CashFlow_Tracker.sharding import assign_shards, group_by_shard
+    from categories.models import Category, CategoryStats
+    from transactions.models import Transaction
+
+    prefix = options['prefix']
+    end = options['end_date']
+    start = end - timedelta(days=round(365.25 * options['years'])) + timedelta(days=1)
+    batch_size = options['batch_size']
+
+    usernames = [f'{prefix}{index:07d}' for index in user_indexes]
+    User.objects.bulk_create(
+        [
+            User(username=username, email=f'{username}@example.com', password=options['password_hash'])
+            for username in usernames
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+    users = {user.username: user for user in User.objects.filter(username__in=usernames)}
+    shards = assign_shards(users.values())
+
+    # Users that already have transactions were generated by an earlier run
+    done_user_ids = set()
+    for alias, shard_users in group_by_shard(list(users.values()), shards).items():
+        done_user_ids.update(
+            Transaction.objects.using(alias).filter(user__in=shard_users).values_list('user_id', flat=True).distinct()
+        )
+    pending = [(index, users[username]) for index, username in zip(user_indexes, usernames)
+               if users[username].id not in done_user_ids]
+
+    Category.objects.create_defaults([user for _index, user in pending])
+    categories = {}
+    for alias, shard_users in group_by_shard([user for _index, user in pending], shards).items():
+        categories.update(
+            ((category.user_id, category.category_type, category.name), category)
+            for category in Category.objects.using(alias).filter(user__in=shard_users)
+        )
+
+    created = 0
+    buffer = []
+
+    def flush(alias):
+        nonlocal created
+        with db_transaction.atomic(using=alias):
+            Transaction.objects.using(alias).bulk_create(buffer, batch_size=batch_size)
+        created += len(buffer)
+        buffer.clear()
+
+    for index, user in pending:
+        alias = shards[user.id]
+        rng = random.Random(f"{options['seed']}-{index}")
+        for category_name, transaction_type, description, amount, day in build_user_transactions(
+            rng, start, end, options['transactions']
+        ):
+            buffer.append(Transaction(
+                user=user,
+                category=categories[(user.id, transaction_type, category_name)],
+                description=description,
+                amount=amount,
+                transaction_type=transaction_type,
+                date=day,
+            ))
+            if len(buffer) >= batch_size:
+                flush(alias)
+        if buffer:
+            flush(alias)
+        # bulk_create skips the post_save signals that update category stats and invalidate cached data
+        CategoryStats.objects.using(alias).rebuild([user.id])
+        bump_data_version(user.id)
+
+    return len(pending), created
+
+
+def _generate_worker(args):
+    options, user_indexes = args
+    try:
+        return generate_users(options, user_indexes)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Generate users with default categories and realistic transactions for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Number of users to generate')
+        parser.add_argument('--transactions', type=int, default=1000, help='Transactions per user')
+        parser.add_argument('--years', type=int, default=2, help='Years of history per user')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for reproducible data')
+        parser.add_argument('--offset', type=int, default=0,
+                            help='Index of the first user, to split generation across separate invocations')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create batch')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes (use PostgreSQL; SQLite serializes writers)')
+        parser.add_argument('--prefix', default='synth', help='Username prefix of generated users')
+        parser.add_argument('--password', default='synthetic123', help='Password for generated users')
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                            help='Last day of generated history (YYYY-MM-DD, default today)')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['transactions'] < 1 or options['years'] < 1:
+            raise CommandError('--users, --transactions and --years must be positive')
+
+        # Only plain values are passed on to worker processes
+        options = {
+            'transactions': options['transactions'],
+            'years': options['years'],
+            'seed': options['seed'],
+            'batch_size': options['batch_size'],
+            'prefix': options['prefix'],
+            # Hash once; hashing per chunk would dominate the run time
+            'password_hash': make_password(options['password']),
+            'end_date': options['end_date'] or timezone.now().date(),
+            'users': options['users'],
+            'offset': options['offset'],
+            'workers': max(options['workers'], 1),
+        }
+
+        indexes = list(range(options['offset'], options['offset'] + options['users']))
+        # Small chunks keep all workers busy until the end
+        chunk_size = max(1, min(50, len(indexes) // (options['workers'] * 4) or 1))
+        chunks = [indexes[i:i + chunk_size] for i in range(0, len(indexes), chunk_size)]
+
+        self.stdout.write(
+            f"Generating {options['users']} user(s) x {options['transactions']} transaction(s) "
+            f"over {options['years']} year(s) with seed {options['seed']}"
+        )
+        started = time.perf_counter()
+        users_created = transactions_created = 0
+
+        if options['workers'] == 1:
+            results = (generate_users(options, chunk) for chunk in chunks)
+            pool = None
+        else:
+            # Child processes must open their own connections
+            connections.close_all()
+            pool = multiprocessing.Pool(options['workers'])
+            results = pool.imap_unordered(_generate_worker, [(options, chunk) for chunk in chunks])
+
+        try:
+            for users, created in results:
+                users_created += users
+                transactions_created += created
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'  {users_created} user(s), {transactions_created} transaction(s) '
+                    f'({transactions_created / elapsed:,.0f} rows/s)'
+                )
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully generated {transactions_created} transactions for {users_created} user(s) '
+                f'in {time.perf_counter() - started:.1f}s'
+            )
+        )
@@ -0,0 +1,69 @@
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transactions.currency import CURRENCY_CHOICES, PIVOT_CURRENCY
+from transactions.models import ExchangeRate
+
+INSERT_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        f'Load exchange rates (value of one unit in {PIVOT_CURRENCY}) from a CSV file with date,currency,rate '
+        'columns and/or --set, into every shard'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', nargs='?', help='CSV file with a date,currency,rate header')
+        parser.add_argument('--set', action='append', default=[], metavar='CURRENCY=RATE',
+                            help='A single rate, e.g. --set USD=36.5 (repeatable)')
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='Day of the --set rates (YYYY-MM-DD, default today)')
+
+    def handle(self, *args, **options):
+        rates = {}
+        if options['csv_file']:
+            with open(options['csv_file'], newline='', encoding='utf-8') as csv_file:
+                for line, row in enumerate(csv.DictReader(csv_file), start=2):
+                    try:
+                        day = date.fromisoformat(row['date'].strip())
+                    except (KeyError, AttributeError, ValueError):
+                        raise CommandError(f'Line {line}: expected a YYYY-MM-DD date column')
+                    self.add_rate(rates, row.get('currency'), day, row.get('rate'), f'Line {line}')
+        day = options['date'] or timezone.now().date()
+        for value in options['set']:
+            currency, _sep, rate = value.partition('=')
+            self.add_rate(rates, currency, day, rate, f'--set {value}')
+        if not rates:
+            raise CommandError('Give a CSV file or at least one --set CURRENCY=RATE')
+
+        objects = [ExchangeRate(currency=currency, date=day, rate=rate) for (currency, day), rate in rates.items()]
+        # Rates are joined inside every shard's aggregate queries, so each shard keeps a full copy
+        for alias in settings.SHARD_DATABASES:
+            ExchangeRate.objects.using(alias).bulk_create(
+                objects, batch_size=INSERT_BATCH_SIZE,
+                update_conflicts=True, unique_fields=['currency', 'date'], update_fields=['rate'],
+            )
+            for rate in objects:
+                rate.pk = None
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {len(objects)} rate(s) into {len(settings.SHARD_DATABASES)} database(s); '
+            f'cached totals pick them up within {getattr(settings, "CACHE_TTL", 300)}s'
+        ))
+
+    def add_rate(self, rates, currency, day, rate, where):
+        currency = (currency or '').strip().upper()
+        if currency == PIVOT_CURRENCY or currency not in dict(CURRENCY_CHOICES):
+            raise CommandError(f'{where}: unknown or pivot currency {currency!r}')
+        try:
+            rate = Decimal((rate or '').strip())
+        except InvalidOperation:
+            raise CommandError(f'{where}: invalid rate {rate!r}')
+        if rate <= 0:
+            raise CommandError(f'{where}: rate must be positive')
+        rates[currency, day] = rate
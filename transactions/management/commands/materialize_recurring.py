@@ -0,0 +1,37 @@
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transactions.models import RecurringTransaction
+from transactions.recurring import materialize
+
+
+class Command(BaseCommand):
+    help = 'Create the due occurrences of every recurring transaction rule, for all users, with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, default=None,
+                            help='Create occurrences up to this day (YYYY-MM-DD, default today)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Rules handled per database transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        until = options['date'] or timezone.now().date()
+        started = time.perf_counter()
+        total_rules = total_occurrences = 0
+        for alias in settings.SHARD_DATABASES:
+            rules, occurrences = materialize(
+                RecurringTransaction.objects.using(alias), until, batch_size=options['batch_size'],
+            )
+            if rules:
+                self.stdout.write(f'  {alias}: {rules} rule(s), {occurrences} occurrence(s)')
+            total_rules += rules
+            total_occurrences += occurrences
+        self.stdout.write(self.style.SUCCESS(
+            f'Materialized {total_occurrences} occurrence(s) of {total_rules} due rule(s) up to {until} '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0002_budget'),
+        ('transactions', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(max_length=255, verbose_name='รายละเอียด')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='จำนวนเงิน')),
+                ('transaction_type', models.CharField(choices=[('income', 'รายรับ'), ('expense', 'รายจ่าย')], max_length=10, verbose_name='ประเภท')),
+                ('notes', models.TextField(blank=True, verbose_name='หมายเหตุ')),
+                ('frequency', models.CharField(choices=[('daily', 'วัน'), ('weekly', 'สัปดาห์'), ('monthly', 'เดือน'), ('yearly', 'ปี')], default='monthly', max_length=10, verbose_name='ความถี่')),
+                ('interval', models.PositiveSmallIntegerField(default=1, verbose_name='ทุกๆ')),
+                ('start_date', models.DateField(verbose_name='เริ่มวันที่')),
+                ('end_date', models.DateField(blank=True, null=True, verbose_name='สิ้นสุดวันที่')),
+                ('occurrence_count', models.PositiveIntegerField(default=0, verbose_name='จำนวนครั้งที่สร้างแล้ว')),
+                ('next_date', models.DateField(verbose_name='ครั้งถัดไป')),
+                ('is_active', models.BooleanField(default=True, verbose_name='ใช้งานอยู่')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='วันที่สร้าง')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='วันที่แก้ไขล่าสุด')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_transactions', to='categories.category', verbose_name='หมวดหมู่')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_transactions', to=settings.AUTH_USER_MODEL, verbose_name='ผู้ใช้')),
+            ],
+            options={
+                'verbose_name': 'รายการประจำ',
+                'verbose_name_plural': 'รายการประจำ',
+                'ordering': ['next_date', 'description'],
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='recurring_rule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='transactions.recurringtransaction', verbose_name='รายการประจำ'),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(condition=models.Q(('recurring_rule__isnull', False)), fields=('recurring_rule', 'date'), name='unique_recurring_occurrence'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringtransaction',
+            index=models.Index(fields=['is_active', 'next_date'], name='transaction_is_acti_8e2939_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringtransaction',
+            index=models.Index(fields=['user', 'is_active'], name='transaction_user_id_9f5d7c_idx'),
+        ),
+    ]
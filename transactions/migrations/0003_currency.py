@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0002_recurring_transaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('THB', 'บาท (THB)'), ('USD', 'ดอลลาร์สหรัฐ (USD)')], max_length=3, verbose_name='สกุลเงิน')),
+                ('date', models.DateField(verbose_name='วันที่')),
+                ('rate', models.DecimalField(decimal_places=8, max_digits=18, verbose_name='อัตราแลกเปลี่ยน')),
+            ],
+            options={
+                'verbose_name': 'อัตราแลกเปลี่ยน',
+                'verbose_name_plural': 'อัตราแลกเปลี่ยน',
+                'ordering': ['-date', 'currency'],
+                'unique_together': {('currency', 'date')},
+            },
+        ),
+        migrations.AddField(
+            model_name='recurringtransaction',
+            name='currency',
+            field=models.CharField(choices=[('THB', 'บาท (THB)'), ('USD', 'ดอลลาร์สหรัฐ (USD)')], default='THB', max_length=3, verbose_name='สกุลเงิน'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='currency',
+            field=models.CharField(choices=[('THB', 'บาท (THB)'), ('USD', 'ดอลลาร์สหรัฐ (USD)')], default='THB', max_length=3, verbose_name='สกุลเงิน'),
+        ),
+    ]
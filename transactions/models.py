@@ -1,14 +1,23 @@
+import calendar
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.db.models import Sum, Q
+from CashFlow_Tracker.sharding import for_user_shard
+from django.db.models import F, FloatField, Sum, Q
+from django.db.models.functions import Cast
 from categories.models import Category
 from decimal import Decimal
+from accounts.caching import get_data_version
+from .currency import CURRENCY_CHOICES, PIVOT_CURRENCY, converted_amount, converted_cents, currency_symbol
 
 User = get_user_model()
 
 class TransactionQuerySet(models.QuerySet):
     def for_user(self, user):
-        return self.filter(user=user).select_related('category')
+        return for_user_shard(self.filter(user=user).select_related('category'), user)
     
     def income(self):
         return self.filter(transaction_type='income')
@@ -27,10 +36,12 @@ class TransactionQuerySet(models.QuerySet):
     def for_category(self, category):
         return self.filter(category=category)
     
-    def totals_summary(self):
+    def totals_summary(self, currency=None):
+        """Income and expense totals, converted to ``currency`` inside the query when given"""
+        amount = converted_amount(currency) if currency else 'amount'
         return self.aggregate(
-            total_income=Sum('amount', filter=Q(transaction_type='income')) or 0,
-            total_expense=Sum('amount', filter=Q(transaction_type='expense')) or 0
+            total_income=Sum(amount, filter=Q(transaction_type='income')) or 0,
+            total_expense=Sum(amount, filter=Q(transaction_type='expense')) or 0
         )
     
     def search(self, query):
@@ -38,6 +49,33 @@ class TransactionQuerySet(models.QuerySet):
             Q(description__icontains=query) | 
             Q(notes__icontains=query)
         )
+    
+    def with_stats(self, currency=None):
+        """
+        Join the category statistics so is_anomaly costs no query per row
+        
+        Stats are kept in the user's base currency; pass conversion_currency(user)
+        so rows in other currencies are compared converted.
+        """
+        queryset = self.select_related('category__stats')
+        if currency:
+            queryset = queryset.annotate(base_amount=converted_cents(currency))
+        return queryset
+    
+    def anomalies(self, currency=None):
+        """Expenses more than ANOMALY_STDDEV_THRESHOLD standard deviations above their category's other expenses"""
+        k2 = settings.ANOMALY_STDDEV_THRESHOLD ** 2
+        count = F('category__stats__count')
+        amount = converted_cents(currency) if currency else 'amount'
+        # The same comparison as CategoryStats.is_unusual(), as a filter
+        return self.expenses().alias(
+            deviation=Cast(amount, FloatField()) - F('category__stats__mean'),
+        ).filter(
+            category__stats__count__gte=settings.ANOMALY_MIN_COUNT,
+            deviation__gt=0,
+        ).alias(
+            spread=F('deviation') * F('deviation') * count * (count + k2),
+        ).filter(spread__gt=k2 * (count - 1) * F('category__stats__m2'))
 
 class TransactionManager(models.Manager):
     def get_queryset(self):
@@ -62,9 +100,14 @@ class Transaction(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='transactions', verbose_name='หมวดหมู่')
     description = models.CharField(max_length=255, verbose_name='รายละเอียด')
     amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='จำนวนเงิน')
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=PIVOT_CURRENCY, verbose_name='สกุลเงิน')
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES, verbose_name='ประเภท')
     date = models.DateField(verbose_name='วันที่')
     notes = models.TextField(blank=True, verbose_name='หมายเหตุ')
+    recurring_rule = models.ForeignKey(
+        'RecurringTransaction', null=True, blank=True, on_delete=models.SET_NULL,
+        related_name='occurrences', verbose_name='รายการประจำ',
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='วันที่สร้าง')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='วันที่แก้ไขล่าสุด')
     
@@ -83,6 +126,14 @@ class Transaction(models.Model):
             models.Index(fields=['date', 'created_at']),
             models.Index(fields=['user', 'amount']),
         ]
+        constraints = [
+            # One occurrence per rule and date makes materializing recurring rules idempotent
+            models.UniqueConstraint(
+                fields=['recurring_rule', 'date'],
+                condition=Q(recurring_rule__isnull=False),
+                name='unique_recurring_occurrence',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.get_transaction_type_display()} - {self.description} ({self.amount})"
@@ -103,6 +154,12 @@ class Transaction(models.Model):
             raise ValidationError({
                 'amount': 'จำนวนเงินต้องมากกว่า 0'
             })
+        
+        # Totals convert through the rate table, so a foreign currency needs at least one rate
+        if self.currency and self.currency != PIVOT_CURRENCY and not ExchangeRate.objects.filter(currency=self.currency).exists():
+            raise ValidationError({
+                'currency': 'ยังไม่มีอัตราแลกเปลี่ยนของสกุลเงินนี้'
+            })
     
     def save(self, *args, **kwargs):
         self.full_clean()
@@ -116,9 +173,142 @@ class Transaction(models.Model):
         else:
             return -self.amount
     
+    @property
+    def currency_symbol(self):
+        return currency_symbol(self.currency)
+    
+    @property
+    def is_anomaly(self):
+        """Whether this expense is unusually large for its category (use with_stats() for lists)"""
+        stats = getattr(self.category, 'stats', None)
+        amount = getattr(self, 'base_amount', self.amount)
+        return self.transaction_type == 'expense' and stats is not None and amount is not None and stats.is_unusual(amount)
+    
     @property
     def category_display(self):
         """Returns category with icon for display"""
         if self.category:
             return f"{self.category.icon} {self.category.name}"
         return ""
+
+def conversion_currency(user):
+    """
+    The currency to convert ``user``'s totals to, or None when all their rows are already in it
+    
+    Totals given None sum ``amount`` as stored and skip the per-row rate
+    lookup. The answer is cached until the user's data or base currency changes.
+    """
+    cache_key = f"needs_conversion_{user.id}_{user.base_currency}_{get_data_version(user.id)}"
+    needed = cache.get(cache_key)
+    if needed is None:
+        needed = Transaction.objects.for_user(user).exclude(currency=user.base_currency).exists()
+        cache.set(cache_key, needed, getattr(settings, 'CACHE_TTL', 300))
+    return user.base_currency if needed else None
+
+class RecurringTransactionQuerySet(models.QuerySet):
+    def for_user(self, user):
+        return for_user_shard(self.filter(user=user).select_related('category'), user)
+    
+    def due(self, day):
+        return self.filter(is_active=True, next_date__lte=day)
+
+class RecurringTransaction(models.Model):
+    """A rule that creates the same transaction every ``interval`` days, weeks, months or years"""
+    
+    FREQUENCY_CHOICES = [
+        ('daily', 'วัน'),
+        ('weekly', 'สัปดาห์'),
+        ('monthly', 'เดือน'),
+        ('yearly', 'ปี'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_transactions', verbose_name='ผู้ใช้')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='recurring_transactions', verbose_name='หมวดหมู่')
+    description = models.CharField(max_length=255, verbose_name='รายละเอียด')
+    amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='จำนวนเงิน')
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default=PIVOT_CURRENCY, verbose_name='สกุลเงิน')
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES, verbose_name='ประเภท')
+    notes = models.TextField(blank=True, verbose_name='หมายเหตุ')
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default='monthly', verbose_name='ความถี่')
+    interval = models.PositiveSmallIntegerField(default=1, verbose_name='ทุกๆ')
+    start_date = models.DateField(verbose_name='เริ่มวันที่')
+    end_date = models.DateField(null=True, blank=True, verbose_name='สิ้นสุดวันที่')
+    # Occurrences created so far; next_date is occurrence number ``occurrence_count``
+    occurrence_count = models.PositiveIntegerField(default=0, verbose_name='จำนวนครั้งที่สร้างแล้ว')
+    next_date = models.DateField(verbose_name='ครั้งถัดไป')
+    is_active = models.BooleanField(default=True, verbose_name='ใช้งานอยู่')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='วันที่สร้าง')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='วันที่แก้ไขล่าสุด')
+    
+    objects = RecurringTransactionQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'รายการประจำ'
+        verbose_name_plural = 'รายการประจำ'
+        ordering = ['next_date', 'description']
+        indexes = [
+            models.Index(fields=['is_active', 'next_date']),
+            models.Index(fields=['user', 'is_active']),
+        ]
+    
+    def __str__(self):
+        return f"{self.description} ทุก {self.interval} {self.get_frequency_display()}"
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        
+        if self.category_id and self.transaction_type and self.category.category_type != self.transaction_type:
+            raise ValidationError({'category': 'หมวดหมู่ที่เลือกไม่ตรงกับประเภทธุรกรรม'})
+        if self.amount is not None and self.amount <= 0:
+            raise ValidationError({'amount': 'จำนวนเงินต้องมากกว่า 0'})
+        if self.interval is not None and self.interval < 1:
+            raise ValidationError({'interval': 'ต้องมากกว่า 0'})
+        if self.end_date and self.start_date and self.end_date < self.start_date:
+            raise ValidationError({'end_date': 'วันสิ้นสุดต้องไม่ก่อนวันเริ่มต้น'})
+        # Occurrences are bulk-created without full_clean, so the rate check happens here
+        if self.currency and self.currency != PIVOT_CURRENCY and not ExchangeRate.objects.filter(currency=self.currency).exists():
+            raise ValidationError({'currency': 'ยังไม่มีอัตราแลกเปลี่ยนของสกุลเงินนี้'})
+    
+    @property
+    def currency_symbol(self):
+        return currency_symbol(self.currency)
+    
+    def occurrence_date(self, index):
+        """Date of occurrence ``index`` (0 is start_date); month ends clamp, e.g. the 31st becomes Feb 28"""
+        if self.frequency == 'daily':
+            return self.start_date + timedelta(days=index * self.interval)
+        if self.frequency == 'weekly':
+            return self.start_date + timedelta(weeks=index * self.interval)
+        months = index * self.interval * (12 if self.frequency == 'yearly' else 1)
+        year, month = divmod(self.start_date.month - 1 + months, 12)
+        year += self.start_date.year
+        return date(year, month + 1, min(self.start_date.day, calendar.monthrange(year, month + 1)[1]))
+    
+    def skip_until(self, day):
+        """Move past occurrences before ``day`` without creating them, e.g. when a paused rule is resumed"""
+        while self.next_date < day:
+            self.occurrence_count += 1
+            self.next_date = self.occurrence_date(self.occurrence_count)
+    
+    def save(self, *args, **kwargs):
+        if self.next_date is None:
+            self.next_date = self.occurrence_date(self.occurrence_count)
+        super().save(*args, **kwargs)
+
+
+class ExchangeRate(models.Model):
+    """Value of one unit of a currency in PIVOT_CURRENCY on a day; copied to every shard so totals can join it"""
+    
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, verbose_name='สกุลเงิน')
+    date = models.DateField(verbose_name='วันที่')
+    rate = models.DecimalField(max_digits=18, decimal_places=8, verbose_name='อัตราแลกเปลี่ยน')
+    
+    class Meta:
+        verbose_name = 'อัตราแลกเปลี่ยน'
+        verbose_name_plural = 'อัตราแลกเปลี่ยน'
+        ordering = ['-date', 'currency']
+        # Also the index behind the per-row rate lookups
+        unique_together = ['currency', 'date']
+    
+    def __str__(self):
+        return f"1 {self.currency} = {self.rate} {PIVOT_CURRENCY} ({self.date})"
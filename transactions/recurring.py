@@ -0,0 +1,89 @@
+"""
+Turning recurring rules into transactions.
+
+``materialize()`` creates every occurrence of the due rules up to a date with
+``bulk_create``, a batch of rules at a time, and moves each rule's
+``next_date`` on in the same database transaction. Occurrences are unique per
+(rule, date) and inserted with ``ignore_conflicts``, so a rerun -- after a
+crash, or by a second scheduler -- never creates duplicates. A rule that
+missed runs (downtime) gets all its missed occurrences in the next pass.
+"""
+
+from django.db import transaction as db_transaction
+
+from accounts.caching import bump_data_version
+from categories.models import Budget, CategoryStats
+
+from .models import RecurringTransaction, Transaction
+
+# Rows per INSERT statement
+INSERT_BATCH_SIZE = 1000
+
+
+def occurrences_until(rule, until):
+    """Dates of the rule's pending occurrences up to ``until`` (and its end date), and the next index"""
+    last = min(until, rule.end_date) if rule.end_date else until
+    dates = []
+    index = rule.occurrence_count
+    while (day := rule.occurrence_date(index)) <= last:
+        dates.append(day)
+        index += 1
+    return dates, index
+
+
+def materialize(rules, until, batch_size=500):
+    """Create the due occurrences of ``rules`` (a queryset on one database); returns (rules, occurrences)"""
+    alias = rules.db
+    rule_count = occurrence_count = 0
+    last_pk = 0
+    while True:
+        batch = list(rules.due(until).filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+
+        occurrences = []
+        budget_months = set()
+        for rule in batch:
+            dates, next_index = occurrences_until(rule, until)
+            occurrences += [
+                Transaction(
+                    user_id=rule.user_id,
+                    category_id=rule.category_id,
+                    description=rule.description,
+                    amount=rule.amount,
+                    currency=rule.currency,
+                    transaction_type=rule.transaction_type,
+                    notes=rule.notes,
+                    date=day,
+                    recurring_rule=rule,
+                )
+                for day in dates
+            ]
+            budget_months.update((rule.category_id, day.replace(day=1)) for day in dates)
+            rule.occurrence_count = next_index
+            rule.next_date = rule.occurrence_date(next_index)
+            if rule.end_date and rule.next_date > rule.end_date:
+                rule.is_active = False
+
+        with db_transaction.atomic(using=alias):
+            # bulk_create skips the transaction signals; budgets, stats and caches are updated below instead
+            Transaction.objects.using(alias).bulk_create(
+                occurrences, batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True,
+            )
+            RecurringTransaction.objects.using(alias).bulk_update(batch, ['occurrence_count', 'next_date', 'is_active'])
+            if budget_months:
+                Budget.objects.using(alias).filter(
+                    category_id__in={category_id for category_id, _month in budget_months},
+                    month__in={month for _category_id, month in budget_months},
+                ).recalculate_spent()
+                # Recomputed rather than merged: rows skipped as conflicts must not be counted
+                CategoryStats.objects.using(alias).rebuild(
+                    {rule.user_id for rule in batch}, {category_id for category_id, _month in budget_months},
+                )
+
+        for user_id in {rule.user_id for rule in batch}:
+            bump_data_version(user_id)
+        rule_count += len(batch)
+        occurrence_count += len(occurrences)
+    return rule_count, occurrence_count
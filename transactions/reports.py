@@ -0,0 +1,133 @@
+"""
+Category x period pivot reports.
+
+``build_pivot()`` sums a user's transactions by category and month (or week)
+with a single GROUP BY and lays the result out as a dense matrix: label arrays
+for the rows and columns plus one value array per row, with row and column
+totals. Cells without transactions are zero rather than missing, so clients
+can index the arrays directly. Amounts are converted to the user's base
+currency inside the same query.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from accounts.caching import get_data_version
+from categories.models import next_month
+
+from .currency import PIVOT_CURRENCY, converted_amount
+from .models import Transaction
+
+TYPES = ('income', 'expense')
+TRUNCATE = {'month': TruncMonth, 'week': TruncWeek}
+# Widest report accepted, e.g. three years of weeks or thirteen years of months
+PIVOT_MAX_COLUMNS = 160
+
+
+def period_starts(start, end, granularity):
+    """First day of every month (or Monday of every week) overlapping [start, end]"""
+    weekly = granularity == 'week'
+    day = start - timedelta(days=start.weekday()) if weekly else start.replace(day=1)
+    starts = []
+    while day <= end:
+        starts.append(day)
+        day = day + timedelta(weeks=1) if weekly else next_month(day)
+    return starts
+
+
+def period_count(start, end, granularity):
+    """len(period_starts(start, end, granularity)) without building the list"""
+    if granularity == 'week':
+        return (end - start + timedelta(days=start.weekday())).days // 7 + 1
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def period_label(day, granularity):
+    return f'{day:%d %b %Y}' if granularity == 'week' else f'{day:%b %Y}'
+
+
+def _baht(amount):
+    return float(round(amount, 2))
+
+
+def build_pivot(transactions, start, end, granularity='month', currency=PIVOT_CURRENCY):
+    """The pivot of ``transactions`` between start and end (inclusive) in ``currency``, in one query"""
+    starts = period_starts(start, end, granularity)
+    column_of = {day: column for column, day in enumerate(starts)}
+    rows = {}
+    cells = (
+        transactions.filter(date__gte=start, date__lte=end).order_by()
+        .values(
+            'category_id', 'category__name', 'category__icon', 'category__color', 'category__category_type',
+            period=TRUNCATE[granularity]('date'),
+        )
+        .annotate(total=Sum(converted_amount(currency)))
+        # Cells whose rows all lack a rate sum to NULL; they are left out like the rows themselves
+        .filter(total__isnull=False)
+    )
+    for cell in cells:
+        row = rows.get(cell['category_id'])
+        if row is None:
+            row = rows[cell['category_id']] = {
+                'id': cell['category_id'],
+                'name': cell['category__name'],
+                'icon': cell['category__icon'],
+                'color': cell['category__color'],
+                'type': cell['category__category_type'],
+                'values': [Decimal('0')] * len(starts),
+            }
+        row['values'][column_of[cell['period']]] += cell['total']
+
+    for row in rows.values():
+        row['total'] = sum(row['values'])
+    ordered = sorted(rows.values(), key=lambda row: (TYPES.index(row['type']), -row['total'], row['name']))
+
+    column_totals = {transaction_type: [Decimal('0')] * len(starts) for transaction_type in TYPES}
+    for row in ordered:
+        totals = column_totals[row['type']]
+        for column, value in enumerate(row['values']):
+            totals[column] += value
+
+    return {
+        'granularity': granularity,
+        'currency': currency,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'columns': {
+            'labels': [period_label(day, granularity) for day in starts],
+            'starts': [day.isoformat() for day in starts],
+        },
+        'rows': {
+            key: [row[key] for row in ordered]
+            for key in ('id', 'name', 'icon', 'color', 'type')
+        },
+        # values[row][column], dense
+        'values': [[_baht(value) for value in row['values']] for row in ordered],
+        'row_totals': [_baht(row['total']) for row in ordered],
+        'column_totals': {
+            transaction_type: [_baht(value) for value in totals]
+            for transaction_type, totals in column_totals.items()
+        },
+        'totals': {transaction_type: _baht(sum(totals)) for transaction_type, totals in column_totals.items()},
+    }
+
+
+def get_pivot(user, start, end, granularity='month', transaction_type=''):
+    """The user's pivot, cached until their data changes"""
+    cache_key = (
+        f"pivot_{user.id}_{get_data_version(user.id)}_{user.base_currency}_{start:%Y%m%d}_{end:%Y%m%d}_"
+        f"{granularity}_{transaction_type}"
+    )
+    pivot = cache.get(cache_key)
+    if pivot is None:
+        transactions = Transaction.objects.for_user(user)
+        if transaction_type:
+            transactions = transactions.filter(transaction_type=transaction_type)
+        pivot = build_pivot(transactions, start, end, granularity, user.base_currency)
+        cache.set(cache_key, pivot, getattr(settings, 'CACHE_TTL', 300))
+    return pivot
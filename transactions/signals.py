@@ -1,7 +1,86 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.core.cache import cache
-from .models import Transaction
+from accounts.caching import bump_data_version
+from categories.models import Budget, CategoryStats
+from .currency import convert
+from .models import RecurringTransaction, Transaction
+
+def _adjust_budget(alias, category_id, day, delta):
+    """Add delta to the spent of the budget covering this category and month, if there is one"""
+    if delta:
+        # F() makes the increment atomic; concurrent saves never overwrite each other's totals
+        Budget.objects.using(alias).filter(category_id=category_id, month=day.replace(day=1)).update(
+            spent=F('spent') + delta,
+        )
+
+def _merge_stats(alias, user_id, category_id, amount, count):
+    """Add (count 1) or remove (count -1) one amount from the category statistics"""
+    if amount is None:
+        # Rows without a rate are left out of the stats, as the recomputing queries leave out NULL
+        return
+    if count > 0:
+        CategoryStats.objects.using(alias).get_or_create(category_id=category_id, defaults={'user_id': user_id})
+    CategoryStats.objects.using(alias).filter(category_id=category_id).merge(count, amount)
+
+def _base_amount(alias, instance, amount=None, currency=None, day=None):
+    """The transaction's amount (or a previous one) in the user's base currency, as budgets and stats count it"""
+    return convert(
+        instance.amount if amount is None else amount, currency or instance.currency, instance.user.base_currency,
+        day or instance.date, using=alias,
+    )
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_fields(sender, instance, using, raw=False, **kwargs):
+    """Keep the stored category, date and base-currency amount so post_save can move it between budgets and stats"""
+    instance._previous = None
+    if instance.pk and not raw:
+        previous = Transaction.objects.using(using).filter(pk=instance.pk).values_list(
+            'category_id', 'date', 'amount', 'currency'
+        ).first()
+        if previous is not None:
+            category_id, date, amount, currency = previous
+            instance._previous = (category_id, date, _base_amount(using, instance, amount, currency, date))
+
+@receiver(post_save, sender=Transaction)
+def update_budget_spent_on_save(sender, instance, using, raw=False, **kwargs):
+    """Apply the change of this transaction to the budgets it counts toward"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    amount = _base_amount(using, instance) or 0
+    if previous is not None:
+        category_id, date, previous_amount = previous
+        if category_id == instance.category_id and date.replace(day=1) == instance.date.replace(day=1):
+            _adjust_budget(using, category_id, date, amount - (previous_amount or 0))
+            return
+        _adjust_budget(using, category_id, date, -(previous_amount or 0))
+    _adjust_budget(using, instance.category_id, instance.date, amount)
+
+@receiver(post_save, sender=Transaction)
+def update_category_stats_on_save(sender, instance, using, raw=False, **kwargs):
+    """Welford update of the category statistics: O(1) per write, whatever the history length"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    amount = _base_amount(using, instance)
+    if previous is not None:
+        category_id, _date, previous_amount = previous
+        if category_id == instance.category_id and previous_amount == amount:
+            return
+        _merge_stats(using, instance.user_id, category_id, previous_amount, -1)
+    _merge_stats(using, instance.user_id, instance.category_id, amount, 1)
+
+@receiver(post_delete, sender=Transaction)
+def update_category_stats_on_delete(sender, instance, using, **kwargs):
+    """Take a deleted transaction out of its category statistics"""
+    _merge_stats(using, instance.user_id, instance.category_id, _base_amount(using, instance), -1)
+
+@receiver(post_delete, sender=Transaction)
+def update_budget_spent_on_delete(sender, instance, using, **kwargs):
+    """Take a deleted transaction out of its budget"""
+    _adjust_budget(using, instance.category_id, instance.date, -(_base_amount(using, instance) or 0))
 
 @receiver(post_save, sender=Transaction)
 def invalidate_dashboard_cache_on_save(sender, instance, **kwargs):
@@ -12,6 +91,7 @@ def invalidate_dashboard_cache_on_save(sender, instance, **kwargs):
         f"dashboard_stats_{instance.user.id}_dashboard_{instance.date.strftime('%Y%m%d')}",
         f"dashboard_stats_{instance.user.id}_",
     ])
+    bump_data_version(instance.user_id)
 
 @receiver(post_delete, sender=Transaction)
 def invalidate_dashboard_cache_on_delete(sender, instance, **kwargs):
@@ -21,4 +101,11 @@ def invalidate_dashboard_cache_on_delete(sender, instance, **kwargs):
     cache.delete_many([
         f"dashboard_stats_{instance.user.id}_dashboard_{instance.date.strftime('%Y%m%d')}",
         f"dashboard_stats_{instance.user.id}_",
-    ])
\ No newline at end of file
+    ])
+    bump_data_version(instance.user_id)
+
+@receiver(post_save, sender=RecurringTransaction)
+@receiver(post_delete, sender=RecurringTransaction)
+def bump_data_version_on_recurring_change(sender, instance, **kwargs):
+    """Invalidate cached forecasts, which project the user's recurring rules"""
+    bump_data_version(instance.user_id)
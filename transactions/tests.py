@@ -1,3 +1,325 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.views import get_dashboard_stats
+from categories.models import Budget, Category, CategoryStats
+from jobs.models import Job
+
+from .models import ExchangeRate, RecurringTransaction, Transaction
+from .recurring import materialize
+
+User = get_user_model()
+
+
+class FormBootstrapTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='form-bootstrap', password='x')
+        Category.objects.create_defaults([self.user])
+        self.food = Category.objects.for_user(self.user).get(name='อาหาร')
+        Transaction.objects.create(
+            user=self.user, category=self.food, description='ข้าวกลางวัน', amount='60.00',
+            transaction_type='expense', date=timezone.now().date(),
+        )
+        self.client.force_login(self.user)
+
+    def test_unchanged_payload_is_revalidated_with_a_304(self):
+        response = self.client.get(reverse('transaction_form_bootstrap'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(reverse('transaction_form_bootstrap'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Any write bumps the data version, and with it the ETag
+        Transaction.objects.create(
+            user=self.user, category=self.food, description='กาแฟ', amount='45.00',
+            transaction_type='expense', date=timezone.now().date(),
+        )
+        response = self.client.get(reverse('transaction_form_bootstrap'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['recent_descriptions']['expense'], ['กาแฟ', 'ข้าวกลางวัน'])
+
+    def test_switching_type_needs_no_further_request(self):
+        payload = self.client.get(reverse('transaction_form_bootstrap')).json()
+        # Both types' categories arrive up front, so the form filters them locally
+        for category_type in ('income', 'expense'):
+            expected = Category.objects.for_user(self.user).filter(category_type=category_type).count()
+            self.assertEqual(len(payload['categories'][category_type]), expected)
+        self.assertEqual(payload['defaults']['category']['expense'], self.food.pk)
+        script = (settings.BASE_DIR / 'statics' / 'js' / 'transaction_form.js').read_text(encoding='utf-8')
+        self.assertEqual(script.count('fetch('), 2)  # the bootstrap and the quick-add category POST
+        self.assertNotIn(reverse('get_categories_by_type'), script)
+
+
+class RecurringTransactionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='recurring', password='x')
+        Category.objects.create_defaults([self.user])
+        self.rent = Category.objects.for_user(self.user).get(name='ที่อยู่อาศัย')
+
+    def rule(self, **kwargs):
+        return RecurringTransaction.objects.create(
+            user=self.user, category=self.rent, description='ค่าเช่า', transaction_type='expense',
+            **{'amount': '5000.00', 'frequency': 'monthly', 'start_date': date(2024, 1, 31), **kwargs},
+        )
+
+    def test_month_end_dates_clamp(self):
+        rule = self.rule()
+        self.assertEqual(
+            [rule.occurrence_date(index) for index in range(4)],
+            [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)],
+        )
+
+    def test_catch_up_creates_missed_occurrences_once(self):
+        rule = self.rule(end_date=date(2024, 5, 15))
+        Budget.objects.create(user=self.user, category=self.rent, month=date(2024, 3, 1), amount=6000)
+        rules = RecurringTransaction.objects.all()
+        self.assertEqual(materialize(rules, date(2024, 3, 31)), (1, 3))
+        # A rerun (e.g. a second scheduler) finds nothing due
+        self.assertEqual(materialize(rules, date(2024, 3, 31)), (0, 0))
+        self.assertEqual(Budget.objects.get(category=self.rent).spent, 5000)
+
+        materialize(rules, date(2025, 1, 1))
+        rule.refresh_from_db()
+        self.assertEqual(rule.occurrences.count(), 4)
+        self.assertFalse(rule.is_active)
+
+    def test_duplicate_occurrences_are_ignored(self):
+        rule = self.rule()
+        materialize(RecurringTransaction.objects.all(), date(2024, 2, 29))
+        # Simulate a crash after the insert but before next_date moved on
+        RecurringTransaction.objects.filter(pk=rule.pk).update(occurrence_count=0, next_date=rule.start_date)
+        materialize(RecurringTransaction.objects.all(), date(2024, 2, 29))
+        self.assertEqual(Transaction.objects.filter(recurring_rule=rule).count(), 2)
+
+    def test_forecast_adds_scheduled_occurrences_to_category_averages(self):
+        food = Category.objects.for_user(self.user).get(name='อาหาร')
+        month = timezone.now().date().replace(day=1)
+        two_months_ago = (month - timedelta(days=40)).replace(day=1)
+        for day in (two_months_ago, month - timedelta(days=1)):
+            Transaction.objects.create(
+                user=self.user, category=food, description='x', amount='300.00',
+                transaction_type='expense', date=day,
+            )
+        # Recurring rent is in the history too, but only counted through its schedule
+        self.rule(start_date=two_months_ago, amount='1000.00')
+        materialize(RecurringTransaction.objects.all(), month)
+
+        self.client.force_login(self.user)
+        forecast = self.client.get(reverse('get_cashflow_forecast'), {'months': 2}).json()
+        self.assertEqual(forecast['summary']['history_months'], 2)
+        self.assertEqual(forecast['datasets']['expenses'], [1300.0, 1300.0])
+        self.assertEqual(forecast['summary']['opening_balance'], -3600.0)
+        self.assertEqual(forecast['datasets']['running_balance'], [-4900.0, -6200.0])
+        self.assertEqual(self.client.get(reverse('get_cashflow_forecast'), {'months': 99}).status_code, 400)
+
+
+class AnalyticsCubeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='analytics', password='x')
+        Category.objects.create_defaults([self.user])
+        self.food = Category.objects.for_user(self.user).get(name='อาหาร')
+        self.salary = Category.objects.for_user(self.user).get(name='เงินเดือน')
+        for day, category, amount in (
+            ('2025-03-05', self.food, '100.10'), ('2025-03-20', self.food, '50.20'),
+            ('2025-03-25', self.salary, '1000.00'), ('2026-03-01', self.food, '300.60'),
+            ('2026-04-01', self.food, '99.99'),
+        ):
+            Transaction.objects.create(
+                user=self.user, category=category, description='x', amount=amount,
+                transaction_type=category.category_type, date=day,
+            )
+        self.client.force_login(self.user)
+
+    def test_comparisons_match_the_database_totals(self):
+        data = self.client.get(reverse('transaction_analytics'), {'year': 2026, 'window': 2}).json()
+        expenses = data['year_over_year']['expense']
+        self.assertEqual(expenses['current'][2], 300.60)
+        self.assertEqual(expenses['previous'][2], 150.30)
+        self.assertEqual(expenses['change_pct'][2], 100.0)
+        self.assertIsNone(expenses['change_pct'][0])
+        self.assertEqual(data['year_over_year']['income']['previous_total'], 1000.0)
+        self.assertEqual(data['rolling_average']['expense'][3], 200.30)
+        self.assertEqual(data['category_shares'][0]['name'], 'อาหาร')
+        self.assertEqual(data['category_shares'][0]['share_pct'], 100.0)
+
+    def test_cube_is_cached_until_the_data_changes(self):
+        self.client.get(reverse('transaction_analytics'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('transaction_analytics'))
+        self.assertFalse(any('transactions_transaction' in query['sql'] for query in queries))
+
+        Transaction.objects.create(
+            user=self.user, category=self.food, description='x', amount='10.00',
+            transaction_type='expense', date='2026-04-02',
+        )
+        data = self.client.get(reverse('transaction_analytics'), {'year': 2026}).json()
+        self.assertEqual(data['year_over_year']['expense']['current'][3], 109.99)
+
+
+class PivotReportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='pivot', password='x')
+        Category.objects.create_defaults([self.user])
+        categories = Category.objects.for_user(self.user)
+        for name, amount, day in (
+            ('อาหาร', '100.00', date(2025, 1, 6)), ('อาหาร', '50.00', date(2025, 1, 31)),
+            ('อาหาร', '25.00', date(2025, 3, 2)), ('การเดินทาง', '40.00', date(2025, 3, 3)),
+            ('อาหาร', '999.00', date(2025, 4, 1)),
+        ):
+            Transaction.objects.create(
+                user=self.user, category=categories.get(name=name), description='x', amount=amount,
+                transaction_type='expense', date=day,
+            )
+        Transaction.objects.create(
+            user=self.user, category=categories.get(name='เงินเดือน'), description='x', amount='1000.00',
+            transaction_type='income', date=date(2025, 2, 25),
+        )
+        self.client.force_login(self.user)
+
+    def test_month_pivot_is_one_group_by(self):
+        with CaptureQueriesContext(connection) as queries:
+            pivot = self.client.get(reverse('transaction_report_data'), {'start': '2025-01-01', 'end': '2025-03-31'}).json()
+        self.assertEqual(len([query for query in queries if 'transactions_transaction' in query['sql']]), 1)
+        self.assertEqual(pivot['columns']['labels'], ['Jan 2025', 'Feb 2025', 'Mar 2025'])
+        self.assertEqual(pivot['rows']['name'], ['เงินเดือน', 'อาหาร', 'การเดินทาง'])
+        self.assertEqual(pivot['values'], [[0, 1000, 0], [150, 0, 25], [0, 0, 40]])
+        self.assertEqual(pivot['row_totals'], [1000, 175, 40])
+        self.assertEqual(pivot['column_totals'], {'income': [0, 1000, 0], 'expense': [150, 0, 65]})
+        self.assertEqual(pivot['totals'], {'income': 1000, 'expense': 215})
+
+    def test_week_pivot_and_validation(self):
+        pivot = self.client.get(reverse('transaction_report_data'), {
+            'start': '2025-01-01', 'end': '2025-01-31', 'granularity': 'week', 'transaction_type': 'expense',
+        }).json()
+        # Weeks start on Monday; the first one begins before the range
+        self.assertEqual(pivot['columns']['starts'][:2], ['2024-12-30', '2025-01-06'])
+        self.assertEqual(pivot['values'], [[0, 100, 0, 0, 50]])
+        response = self.client.get(reverse('transaction_report_data'), {'start': '2025-02-01', 'end': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertContains(self.client.get(reverse('transaction_report'), {'start': '2025-01-01'}), 'อาหาร')
+
+
+class DashboardWarmupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='warmup', password='x')
+        Category.objects.create_defaults([self.user])
+        self.food = Category.objects.for_user(self.user).get(name='อาหาร')
+        self.client.force_login(self.user)
+
+    def create(self, description):
+        return self.client.post(reverse('transaction_create'), {
+            'transaction_type': 'expense', 'category': self.food.id, 'description': description,
+            'amount': '50.00', 'currency': 'THB', 'date': '2026-01-15', 'notes': '',
+        })
+
+    @override_settings(SHARED_CACHE=True, WARM_DASHBOARD_AFTER_WRITE=True)
+    def test_writes_queue_one_warmup_per_user(self):
+        self.assertEqual(self.create('Lunch').status_code, 302)
+        self.assertEqual(self.create('Dinner').status_code, 302)
+        transaction = Transaction.objects.get(description='Lunch')
+        self.client.post(reverse('transaction_delete', args=[transaction.pk]))
+
+        job = Job.objects.get()
+        self.assertEqual((job.name, job.payload, job.user), ('warm_dashboard_cache', {'user_ids': [self.user.pk]}, self.user))
+
+    @override_settings(SHARED_CACHE=False, WARM_DASHBOARD_AFTER_WRITE=False)
+    def test_no_warmup_without_a_shared_cache(self):
+        self.assertEqual(self.create('Lunch').status_code, 302)
+        self.assertFalse(Job.objects.exists())
+
+
+class CurrencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='currency', password='x')
+        Category.objects.create_defaults([self.user])
+        call_command('load_exchange_rates', '--set', 'USD=35', '--date', '2025-01-01', stdout=StringIO())
+        call_command('load_exchange_rates', '--set', 'USD=36', '--date', '2025-02-01', stdout=StringIO())
+        categories = Category.objects.for_user(self.user)
+        food, salary = categories.get(name='อาหาร'), categories.get(name='เงินเดือน')
+        Transaction.objects.create(
+            user=self.user, category=salary, description='x', amount='1000.00', transaction_type='income',
+            date=date(2025, 1, 10),
+        )
+        # Before the first rate (that rate applies), then at each rate
+        for amount, day in (('1.00', date(2024, 12, 1)), ('10.00', date(2025, 1, 15)), ('10.00', date(2025, 2, 3))):
+            Transaction.objects.create(
+                user=self.user, category=food, description='x', amount=amount, currency='USD',
+                transaction_type='expense', date=day,
+            )
+        self.client.force_login(self.user)
+
+    def test_totals_use_the_rate_of_each_day_in_one_query(self):
+        self.assertEqual(get_dashboard_stats(self.user)['total_expenses'], 35 + 350 + 360)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('get_cashflow_data'), {'period': 'year', 'year': 2025}).json()
+        # One aggregate for every data point, however many currencies the rows are in
+        self.assertEqual(len([query for query in queries if 'transactions_transaction' in query['sql']]), 1)
+        self.assertEqual(data['datasets']['expenses'][:3], [350, 360, 0])
+        self.assertIn('transactions_exchangerate', queries[-1]['sql'])
+
+    def test_base_currency_only_totals_skip_the_rate_lookup(self):
+        user = User.objects.create_user(username='baht-only', email='baht@example.com', password='x')
+        Category.objects.create_defaults([user])
+        Transaction.objects.create(
+            user=user, category=Category.objects.for_user(user).get(name='อาหาร'), description='x',
+            amount='40.00', transaction_type='expense', date=date(2025, 1, 10),
+        )
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse('get_cashflow_data'), {'period': 'year', 'year': 2025}).json()
+        self.assertEqual(data['datasets']['expenses'][0], 40)
+        self.assertFalse([query for query in queries if 'transactions_exchangerate' in query['sql']])
+        self.assertEqual(data['summary']['currency'], 'THB')
+
+    def test_base_currency_and_missing_rates(self):
+        response = self.client.post(reverse('currency_settings'), {'base_currency': 'USD'})
+        self.assertRedirects(response, reverse('currency_settings'))
+        self.user.refresh_from_db()
+        totals = get_dashboard_stats(self.user)
+        self.assertEqual(totals['total_expenses'], 21)
+        self.assertAlmostEqual(float(totals['total_income']), 1000 / 35, places=4)
+        pivot = self.client.get(reverse('transaction_report_data'), {'start': '2025-01-01', 'end': '2025-02-28'}).json()
+        self.assertEqual(pivot['currency'], 'USD')
+        self.assertEqual(pivot['column_totals']['expense'], [10, 10])
+
+        ExchangeRate.objects.all().delete()
+        with self.assertRaises(ValidationError):
+            Transaction.objects.create(
+                user=self.user, category=Category.objects.for_user(self.user).get(name='อาหาร'), description='x',
+                amount='5.00', currency='USD', transaction_type='expense', date=date(2025, 3, 1),
+            )
+
+    def test_base_currency_needs_a_rate(self):
+        ExchangeRate.objects.all().delete()
+        response = self.client.post(reverse('currency_settings'), {'base_currency': 'USD'})
+        self.assertContains(response, 'ยังไม่มีอัตราแลกเปลี่ยนของสกุลเงินนี้')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.base_currency, 'THB')
+
+    def test_rows_without_a_rate_are_left_out(self):
+        self.client.post(reverse('currency_settings'), {'base_currency': 'USD'})
+        # Rates removed after the fact: every USD total now converts to NULL
+        ExchangeRate.objects.all().delete()
+        cache.clear()
+        for name, params in (
+            ('dashboard', {}), ('get_cashflow_data', {'period': 'year', 'year': 2025}),
+            ('transaction_analytics', {'year': 2025}), ('get_cashflow_forecast', {}),
+            ('transaction_report_data', {'start': '2025-01-01', 'end': '2025-02-28'}),
+        ):
+            self.assertEqual(self.client.get(reverse(name), params).status_code, 200, name)
+        CategoryStats.objects.rebuild([self.user.pk])
+        counts = dict(CategoryStats.objects.filter(user=self.user).values_list('category__name', 'count'))
+        # USD rows are already in the base currency; the baht salary has no rate to convert with
+        self.assertEqual((counts['อาหาร'], counts['เงินเดือน']), (3, 0))
@@ -6,5 +6,12 @@ urlpatterns = [
     path('create/', views.transaction_create, name='transaction_create'),
     path('edit/<int:pk>/', views.transaction_edit, name='transaction_edit'),
     path('delete/<int:pk>/', views.transaction_delete, name='transaction_delete'),
+    path('report/', views.transaction_report, name='transaction_report'),
+    path('recurring/', views.recurring_list, name='recurring_list'),
+    path('recurring/<int:pk>/toggle/', views.recurring_toggle, name='recurring_toggle'),
+    path('recurring/<int:pk>/delete/', views.recurring_delete, name='recurring_delete'),
     path('api/categories/', views.get_categories_by_type, name='get_categories_by_type'),
+    path('api/form-bootstrap/', views.transaction_form_bootstrap, name='transaction_form_bootstrap'),
+    path('api/analytics/', views.transaction_analytics, name='transaction_analytics'),
+    path('api/report/', views.transaction_report_data, name='transaction_report_data'),
 ]
\ No newline at end of file
@@ -2,17 +2,34 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
+from django.core.cache import cache
+from django.conf import settings
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q, Sum
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import etag, require_GET, require_POST
 from datetime import datetime, timedelta
-from .models import Transaction
-from .forms import TransactionForm, TransactionFilterForm
+from .currency import CURRENCY_SYMBOLS, currency_symbol
+from .models import RecurringTransaction, Transaction, conversion_currency
+from .forms import PivotReportForm, RecurringTransactionForm, TransactionForm, TransactionFilterForm
+from .recurring import materialize
 from categories.models import Category
+from accounts.caching import get_data_version
+from CashFlow_Tracker.db_routers import use_replica
+from jobs.queue import enqueue_once
+
+# How many recent transactions are scanned for description suggestions
+FORM_BOOTSTRAP_RECENT_SCAN = 200
+FORM_BOOTSTRAP_DESCRIPTIONS = 10
+# Longest rolling-average window the analytics API accepts, in months
+ANALYTICS_MAX_WINDOW = 12
 
 @login_required
+@use_replica
 def transaction_list(request):
     transactions = Transaction.objects.for_user(request.user)
+    currency = conversion_currency(request.user)
     filter_form = TransactionFilterForm(request.GET, user=request.user)
     
     # Apply filters
@@ -51,13 +68,13 @@ def transaction_list(request):
         elif period == 'custom':
             transactions = transactions.for_period(start_date=date_from, end_date=date_to)
     
-    # Calculate statistics using optimized method
-    stats = transactions.totals_summary()
+    # Calculate statistics using optimized method, in the user's base currency
+    stats = transactions.totals_summary(currency)
     stats['net_balance'] = (stats['total_income'] or 0) - (stats['total_expense'] or 0)
     stats['transaction_count'] = transactions.count()
     
     # Optimized pagination with better error handling
-    paginator = Paginator(transactions, 20)  # 20 transactions per page
+    paginator = Paginator(transactions.with_stats(currency), 20)  # 20 transactions per page
     page_number = request.GET.get('page', 1)
     
     try:
@@ -71,16 +88,27 @@ def transaction_list(request):
         'transactions': transactions,
         'filter_form': filter_form,
         'stats': stats,
+        'currency_symbol': currency_symbol(request.user.base_currency),
+        # Rows are cached per data version, day, filters and page (see transaction_list.html)
+        'data_version': get_data_version(request.user.id),
+        'fragment_cache_day': timezone.now().date().isoformat(),
+        'fragment_cache_ttl': getattr(settings, 'CACHE_TTL', 300),
     }
     
     return render(request, 'transactions/transaction_list.html', context)
 
+def _warm_dashboard_later(user):
+    """Have a worker refill the dashboard stats a write just invalidated, so the next visit is a cache hit"""
+    if settings.SHARED_CACHE and settings.WARM_DASHBOARD_AFTER_WRITE:
+        enqueue_once('warm_dashboard_cache', {'user_ids': [user.pk]}, user=user)
+
 @login_required
 def transaction_create(request):
     if request.method == 'POST':
         form = TransactionForm(request.POST, user=request.user)
         if form.is_valid():
             transaction = form.save()
+            _warm_dashboard_later(request.user)
             messages.success(request, f'เพิ่มรายการ "{transaction.description}" เรียบร้อยแล้ว')
             return redirect('transaction_list')
     else:
@@ -100,6 +128,7 @@ def transaction_edit(request, pk):
         form = TransactionForm(request.POST, instance=transaction, user=request.user)
         if form.is_valid():
             form.save()
+            _warm_dashboard_later(request.user)
             messages.success(request, f'แก้ไขรายการ "{transaction.description}" เรียบร้อยแล้ว')
             return redirect('transaction_list')
     else:
@@ -119,6 +148,7 @@ def transaction_delete(request, pk):
     if request.method == 'POST':
         transaction_desc = transaction.description
         transaction.delete()
+        _warm_dashboard_later(request.user)
         messages.success(request, f'ลบรายการ "{transaction_desc}" เรียบร้อยแล้ว')
         return redirect('transaction_list')
     
@@ -127,6 +157,53 @@ def transaction_delete(request, pk):
     }
     return render(request, 'transactions/transaction_confirm_delete.html', context)
 
+@login_required
+def recurring_list(request):
+    rules = RecurringTransaction.objects.for_user(request.user)
+    
+    if request.method == 'POST':
+        form = RecurringTransactionForm(request.POST, user=request.user)
+        if form.is_valid():
+            rule = form.save()
+            # Occurrences already due (a start date in the past) are created right away
+            _rules, created = materialize(rules.filter(pk=rule.pk), timezone.now().date())
+            message = f'เพิ่มรายการประจำ "{rule.description}" เรียบร้อยแล้ว'
+            if created:
+                message += f' และสร้างรายการที่ถึงกำหนดแล้ว {created} รายการ'
+            messages.success(request, message)
+            return redirect('recurring_list')
+    else:
+        form = RecurringTransactionForm(user=request.user, initial={'start_date': timezone.now().date()})
+    
+    context = {
+        'form': form,
+        'rules': rules,
+    }
+    return render(request, 'transactions/recurring_list.html', context)
+
+@login_required
+@require_POST
+def recurring_toggle(request, pk):
+    rule = get_object_or_404(RecurringTransaction, pk=pk, user=request.user)
+    rule.is_active = not rule.is_active
+    if rule.is_active:
+        # Resuming does not back-fill the occurrences missed while paused
+        rule.skip_until(timezone.now().date())
+    rule.save(update_fields=['is_active', 'occurrence_count', 'next_date', 'updated_at'])
+    status = 'เปิดใช้งาน' if rule.is_active else 'หยุดชั่วคราว'
+    messages.success(request, f'{status}รายการประจำ "{rule.description}" แล้ว')
+    return redirect('recurring_list')
+
+@login_required
+@require_POST
+def recurring_delete(request, pk):
+    rule = get_object_or_404(RecurringTransaction, pk=pk, user=request.user)
+    description = rule.description
+    # Transactions already created stay; they only lose the link to the rule
+    rule.delete()
+    messages.success(request, f'ลบรายการประจำ "{description}" เรียบร้อยแล้ว')
+    return redirect('recurring_list')
+
 @login_required
 def get_categories_by_type(request):
     """API endpoint to get categories filtered by transaction type"""
@@ -150,3 +227,136 @@ def get_categories_by_type(request):
         })
     
     return JsonResponse({'categories': data})
+
+def _form_bootstrap_etag(request):
+    """ETag for the form bootstrap payload: changes with the user's data and the date"""
+    today = timezone.now().date()
+    return f'"{request.user.id}-{get_data_version(request.user.id)}-{today.strftime("%Y%m%d")}"'
+
+def build_form_bootstrap(user):
+    """Build categories, recent descriptions and defaults for the transaction form"""
+    today = timezone.now().date()
+    cache_key = f"form_bootstrap_{user.id}_{get_data_version(user.id)}_{today.strftime('%Y%m%d')}"
+    payload = cache.get(cache_key)
+
+    if payload is None:
+        categories = {'income': [], 'expense': []}
+        for category in Category.objects.for_user(user).order_by('name'):
+            categories[category.category_type].append({
+                'id': category.id,
+                'name': category.name,
+                'display_name': category.display_name,
+                'icon': category.icon,
+                'color': category.color,
+            })
+
+        # One scan over the latest transactions feeds both suggestions and defaults
+        recent = Transaction.objects.for_user(user).order_by('-date', '-created_at').values_list(
+            'transaction_type', 'category_id', 'description'
+        )[:FORM_BOOTSTRAP_RECENT_SCAN]
+
+        recent_descriptions = {'income': [], 'expense': []}
+        last_category = {'income': None, 'expense': None}
+        last_type = None
+        for transaction_type, category_id, description in recent:
+            if last_type is None:
+                last_type = transaction_type
+            if last_category[transaction_type] is None:
+                last_category[transaction_type] = category_id
+            descriptions = recent_descriptions[transaction_type]
+            if description not in descriptions and len(descriptions) < FORM_BOOTSTRAP_DESCRIPTIONS:
+                descriptions.append(description)
+
+        payload = {
+            'categories': categories,
+            'currency_symbols': CURRENCY_SYMBOLS,
+            'recent_descriptions': recent_descriptions,
+            'defaults': {
+                'transaction_type': last_type or 'expense',
+                'date': today.isoformat(),
+                'category': last_category,
+            },
+        }
+        cache.set(cache_key, payload, getattr(settings, 'CACHE_TTL', 300))
+
+    return payload
+
+@login_required
+@require_GET
+@etag(_form_bootstrap_etag)
+def transaction_form_bootstrap(request):
+    """API endpoint with everything the transaction form needs in one cacheable response"""
+    response = JsonResponse(build_form_bootstrap(request.user))
+    # Let the browser keep the payload but revalidate it with the ETag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+@require_GET
+@use_replica
+def transaction_analytics(request):
+    """API endpoint comparing a year with the previous one, month by month and by category"""
+    # NumPy is only imported once the API is used, keeping it out of the cold start
+    from .analytics import get_cube
+    
+    try:
+        year = int(request.GET.get('year', timezone.now().year))
+        window = int(request.GET.get('window', 3))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'ปีหรือช่วงเฉลี่ยไม่ถูกต้อง'}, status=400)
+    if not 1 <= window <= ANALYTICS_MAX_WINDOW or not 1900 <= year <= 9999:
+        return JsonResponse({'error': 'ปีหรือช่วงเฉลี่ยไม่ถูกต้อง'}, status=400)
+    
+    response = JsonResponse(get_cube(request.user).compare(year, window))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def _report_pivot(request, form):
+    data = form.cleaned_data
+    # Only the report pages need it, so it stays out of every cold start
+    from .reports import get_pivot
+
+    return get_pivot(request.user, data['start'], data['end'], data['granularity'], data['transaction_type'])
+
+@login_required
+@use_replica
+def transaction_report(request):
+    # Fill in the default range so the form shows what the table covers
+    today = timezone.now().date()
+    data = request.GET.copy()
+    data.setdefault('start', today.replace(month=1, day=1).isoformat())
+    data.setdefault('end', today.replace(month=12, day=31).isoformat())
+    form = PivotReportForm(data)
+    pivot = _report_pivot(request, form) if form.is_valid() else None
+    
+    table_rows = []
+    if pivot:
+        rows = pivot['rows']
+        for index, values in enumerate(pivot['values']):
+            table_rows.append({
+                'name': rows['name'][index],
+                'icon': rows['icon'][index],
+                'type': rows['type'][index],
+                'values': values,
+                'total': pivot['row_totals'][index],
+            })
+    
+    context = {
+        'form': form,
+        'pivot': pivot,
+        'table_rows': table_rows,
+    }
+    return render(request, 'transactions/report.html', context)
+
+@login_required
+@require_GET
+@use_replica
+def transaction_report_data(request):
+    """API endpoint with the category x period pivot in a columnar layout (label arrays, dense value rows)"""
+    form = PivotReportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'error': ' '.join(error for errors in form.errors.values() for error in errors)}, status=400)
+    
+    response = JsonResponse(_report_pivot(request, form))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response